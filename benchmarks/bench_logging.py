@@ -0,0 +1,73 @@
+"""Logging overhead benchmark for the calculation hot path.
+
+Times Calculator.calculate with the synchronous console+file handlers and
+per-operation messages at INFO (the previous behaviour), and with the
+queue-based pipeline, per-operation messages at DEBUG and hot-path sampling.
+Console output is sent to /dev/null so only the logging cost is measured.
+
+Usage:
+    python -m benchmarks.bench_logging [--calls 20000]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+from typing import Dict, List
+
+CONFIGURATIONS = [
+    ('sync, per-op INFO', {'CALCULATOR_LOG_ASYNC': '0', 'CALCULATOR_OP_LOG_LEVEL': 'INFO'}),
+    ('async, per-op INFO', {'CALCULATOR_LOG_ASYNC': '1', 'CALCULATOR_OP_LOG_LEVEL': 'INFO'}),
+    ('async, per-op INFO, 1% sampled', {'CALCULATOR_LOG_ASYNC': '1', 'CALCULATOR_OP_LOG_LEVEL': 'INFO',
+                                        'CALCULATOR_LOG_SAMPLE_RATE': '0.01'}),
+    ('sync, per-op DEBUG', {'CALCULATOR_LOG_ASYNC': '0', 'CALCULATOR_OP_LOG_LEVEL': 'DEBUG'}),
+]
+
+def time_calculations(calls: int, env: Dict[str, str], workdir: str) -> float:
+    """Return calculations per second for one logging configuration."""
+    from calculator.config import setup_logging, _stop_queue_listener
+    from calculator.core import Calculator
+    from calculator.history import CalculationHistory
+    
+    os.environ.update({'CALCULATOR_LOG_FILE': os.path.join(workdir, 'calculator.log'),
+                       'CALCULATOR_LOG_SAMPLE_RATE': '1.0', **env})
+    setup_logging()
+    calculator = Calculator()
+    calculator.history = CalculationHistory(os.path.join(workdir, 'history.csv'),
+                                            durability='on-exit')
+    start = time.perf_counter()
+    for i in range(calls):
+        calculator.calculate('+', i, 1.5)
+    elapsed = time.perf_counter() - start
+    _stop_queue_listener()
+    calculator.history.clear_history()
+    return calls / elapsed
+
+def run(calls: int) -> List[Dict]:
+    """Run every logging configuration and report throughput."""
+    results = []
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, 'w') as devnull:
+        for name, env in CONFIGURATIONS:
+            sys.stdout = devnull
+            try:
+                rate = time_calculations(calls, env, workdir)
+            finally:
+                sys.stdout = stdout
+                logging.getLogger().handlers.clear()
+            results.append({'benchmark': 'logging', 'configuration': name,
+                            'calls_per_s': rate})
+            print(f"{name:<32} {rate:>12,.0f} calls/s", file=sys.stderr)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.calls), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Cold-start latency benchmark for ``python -m calculator``.
+
+Generates history files of increasing size and times how long the REPL
+takes to start and exit (``quit`` on stdin), with the default tail-only
+history loading and with eager full loading for comparison.
+
+Usage:
+    python -m benchmarks.bench_startup [--sizes 1000 1000000 10000000] [--repeat 5]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+import numpy as np
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_history(path: str, rows: int, seed: int = 0, chunk_size: int = 1_000_000) -> None:
+    """Write a synthetic history CSV with the given number of rows."""
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2025-01-01T00:00:00', 'us')
+    written = 0
+    with open(path, 'w', newline='') as f:
+        f.write('timestamp,operation,x,y,result\n')
+        while written < rows:
+            n = min(chunk_size, rows - written)
+            x = rng.uniform(-1000, 1000, n)
+            y = rng.uniform(-1000, 1000, n)
+            frame = pd.DataFrame({
+                'timestamp': start + np.arange(written, written + n) * np.timedelta64(1, 'ms'),
+                'operation': rng.choice(['+', '-', '*', '/'], n),
+                'x': x,
+                'y': y,
+                'result': x + y,
+            })
+            frame.to_csv(f, header=False, index=False)
+            written += n
+
+def time_startup(workdir: str, repeat: int, env_overrides: Dict[str, str]) -> List[float]:
+    """Time repeated runs of ``python -m calculator`` that quit immediately."""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT,
+               CALCULATOR_LOG_FILE=os.path.join(workdir, 'calculator.log'), **env_overrides)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'calculator'], input='quit\n', text=True,
+                       cwd=workdir, env=env, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def run(sizes: List[int], repeat: int) -> List[Dict]:
+    """Run the startup benchmark for each history size."""
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            write_history(os.path.join(workdir, 'calculator_history.csv'), rows)
+            for mode, overrides in [('tail', {}), ('eager', {'CALCULATOR_HISTORY_TAIL_ROWS': '0'})]:
+                timings = time_startup(workdir, repeat, overrides)
+                results.append({
+                    'benchmark': 'startup',
+                    'history_rows': rows,
+                    'loading': mode,
+                    'min_s': min(timings),
+                    'median_s': statistics.median(timings),
+                })
+                print(f"{rows:>10} rows  {mode:<5}  median {statistics.median(timings):.3f}s",
+                      file=sys.stderr)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.repeat), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Multi-threaded calculation throughput benchmark.
+
+Runs Calculator.calculate from a growing number of threads sharing one
+calculator, with thread-safe history (per-thread buffers merged on read)
+and with the default history behind one global lock for comparison, and
+checks that every calculation was recorded.
+
+Usage:
+    python -m benchmarks.bench_threads [--calls 20000] [--threads 1 2 4 8]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+def time_threads(threads: int, calls: int, thread_safe: bool, workdir: str) -> float:
+    """Return calculations per second with the given number of threads."""
+    from calculator.core import Calculator
+    from calculator.history import CalculationHistory
+
+    path = os.path.join(workdir, f'history-{threads}-{int(thread_safe)}.csv')
+    history = CalculationHistory(path, durability='batched', thread_safe=thread_safe)
+    calculator = Calculator(history=history)
+    lock = nullcontext() if thread_safe else threading.Lock()
+
+    def work(thread: int) -> None:
+        for i in range(calls):
+            with lock:
+                calculator.calculate('+', thread, i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, range(threads)))
+    history.flush()
+    elapsed = time.perf_counter() - start
+    recorded = len(history.history)
+    history.close()
+    if recorded != threads * calls:
+        raise RuntimeError(f"Lost records: {recorded} of {threads * calls}")
+    return threads * calls / elapsed
+
+def run(calls: int, thread_counts: List[int]) -> List[Dict]:
+    """Time every thread count in both modes and report throughput."""
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for thread_safe in (True, False):
+            mode = 'thread-safe' if thread_safe else 'global lock'
+            for threads in thread_counts:
+                rate = time_threads(threads, calls, thread_safe, workdir)
+                results.append({'benchmark': 'threads', 'mode': mode, 'threads': threads,
+                                'calls_per_s': rate})
+                print(f"{mode:<12} {threads:>3} thread(s) {rate:>12,.0f} calls/s", file=sys.stderr)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=20000, help='calculations per thread')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    print(json.dumps(run(args.calls, args.threads), indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Benchmark suite for calculation, history growth, statistics and startup.
+
+Measures Calculator.calculate throughput, add_calculation latency as the
+history grows, get_statistics and get_history(limit) latency, plugin
+loading in CalculatorREPL._load_plugins and cold start of
+``python -m calculator``. calculate and add_calculation are measured with
+on-exit durability and with the default sync durability. Input data is
+generated with fixed seeds (Faker for operands) so runs are comparable.
+Results are written as JSON; with --baseline they are compared against an
+earlier run and regressions beyond the threshold make the exit code 1.
+
+Usage:
+    python -m benchmarks.suite [--quick] [--output results.json]
+    python -m benchmarks.suite --baseline baseline.json [--threshold 0.2]
+    python -m benchmarks.suite --results new.json --baseline baseline.json
+"""
+
+import os
+import sys
+import cmd
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+from faker import Faker
+from .bench_startup import time_startup, write_history
+
+SEED = 1234
+OPERATIONS = ['+', '-', '*', '/']
+
+def generate_operands(count: int, seed: int = SEED) -> List[Tuple[str, float, float]]:
+    """Generate (operation, x, y) triples with Faker at a fixed seed."""
+    fake = Faker()
+    fake.seed_instance(seed)
+    return [(fake.random_element(OPERATIONS),
+             fake.pyfloat(min_value=-1000, max_value=1000),
+             fake.pyfloat(min_value=1, max_value=1000))
+            for _ in range(count)]
+
+def _result(name: str, value: float, unit: str, higher_is_better: bool = False, **extra) -> Dict:
+    """Build one result entry."""
+    return {'name': name, 'value': value, 'unit': unit,
+            'higher_is_better': higher_is_better, **extra}
+
+def _latencies(function: Callable[[], object], repeat: int) -> List[float]:
+    """Time repeated calls of function in microseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+def _history(workdir: str, name: str, durability: str = 'on-exit', **kwargs):
+    """A history in workdir, by default one whose writes happen only when it is closed."""
+    from calculator.history import CalculationHistory
+    return CalculationHistory(os.path.join(workdir, name), durability=durability, **kwargs)
+
+def bench_calculate(workdir: str, calls: int) -> List[Dict]:
+    """Calculator.calculate throughput over Faker-generated operands.
+
+    Measured with on-exit durability (calculation only) and with the
+    default sync durability, which appends every record to the file.
+    """
+    from calculator.core import Calculator
+    operands = generate_operands(calls)
+    results = []
+    for durability, name in [('on-exit', 'calculate.throughput'),
+                             ('sync', 'calculate.throughput[sync]')]:
+        calculator = Calculator(cache_size=0,
+                                history=_history(workdir, f'calculate-{durability}.csv', durability))
+        start = time.perf_counter()
+        for operation, x, y in operands:
+            calculator.calculate(operation, x, y)
+        elapsed = time.perf_counter() - start
+        calculator.history.clear_history()
+        results.append(_result(name, calls / elapsed, 'calls/s', higher_is_better=True))
+    return results
+
+def bench_history(workdir: str, sizes: List[int], repeat: int) -> List[Dict]:
+    """add_calculation, get_statistics and get_history latency as history grows.
+
+    add_calculation is timed both with on-exit durability and with the
+    default sync durability, which appends each record to the file.
+    """
+    results = []
+    rng = np.random.default_rng(SEED)
+    for size in sizes:
+        history = _history(workdir, f'history-{size}.csv')
+        synced = _history(workdir, f'history-sync-{size}.csv', 'sync')
+        operations = rng.choice(OPERATIONS, size)
+        xs = rng.uniform(-1000, 1000, size)
+        ys = rng.uniform(1, 1000, size)
+        history.add_calculations(operations, xs, ys, xs + ys)
+        synced.add_calculations(operations, xs, ys, xs + ys)
+        add = _latencies(lambda: history.add_calculation('+', 1.5, 2.5, 4.0), repeat)
+        add_sync = _latencies(lambda: synced.add_calculation('+', 1.5, 2.5, 4.0), repeat)
+        stats = _latencies(history.get_statistics, repeat)
+        recent = _latencies(lambda: history.get_history(100), repeat)
+        for name, timings in [('add_calculation', add), ('add_calculation.sync', add_sync),
+                              ('get_statistics', stats), ('get_history_100', recent)]:
+            results.append(_result(f'{name}.latency[{size}]', statistics.median(timings), 'us',
+                                   p95=float(np.percentile(timings, 95)), history_rows=size))
+        history.clear_history()
+        synced.clear_history()
+    return results
+
+def bench_plugins(repeat: int) -> List[Dict]:
+    """Time CalculatorREPL._load_plugins, first call and repeated calls."""
+    from calculator.core import Calculator
+    from calculator.repl import CalculatorREPL
+
+    def load() -> None:
+        repl = CalculatorREPL.__new__(CalculatorREPL)
+        cmd.Cmd.__init__(repl)
+        repl.calculator = calculator
+        repl.plugins = {}
+        repl._load_plugins()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        calculator = Calculator(history=_history(workdir, 'plugins.csv'))
+        first = _latencies(load, 1)[0]
+        timings = _latencies(load, repeat)
+    return [_result('plugin_load.first', first, 'us'),
+            _result('plugin_load.latency', statistics.median(timings), 'us')]
+
+def bench_cold_start(repeat: int, rows: int) -> List[Dict]:
+    """Cold start of ``python -m calculator`` with a history of the given size."""
+    with tempfile.TemporaryDirectory() as workdir:
+        write_history(os.path.join(workdir, 'calculator_history.csv'), rows, seed=SEED)
+        timings = time_startup(workdir, repeat, {})
+    return [_result(f'cold_start[{rows}]', statistics.median(timings), 's', min_s=min(timings))]
+
+def run(quick: bool = False) -> Dict:
+    """Run every benchmark and return the results document."""
+    sizes = [100, 10_000, 1_000_000] if quick else [100, 1_000, 10_000, 100_000, 1_000_000]
+    repeat = 20 if quick else 200
+    # Keep logging off the measurements: warnings and errors only, to stderr
+    logging.basicConfig(level=logging.WARNING)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        results += bench_calculate(workdir, 2_000 if quick else 20_000)
+        results += bench_history(workdir, sizes, repeat)
+    results += bench_plugins(repeat)
+    results += bench_cold_start(3 if quick else 10, 100_000)
+    for result in results:
+        print(f"{result['name']:<36} {result['value']:>14,.2f} {result['unit']}", file=sys.stderr)
+    return {
+        'metadata': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': SEED,
+            'quick': quick,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Dict]:
+    """Compare two result documents; return entries that regressed beyond threshold.
+
+    The change is relative to the baseline value, signed so that positive
+    means slower (or lower throughput).
+    """
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = previous.get(result['name'])
+        if old is None or not old['value']:
+            continue
+        change = (result['value'] - old['value']) / old['value']
+        if result['higher_is_better']:
+            change = -change
+        status = 'REGRESSION' if change > threshold else 'ok'
+        print(f"{result['name']:<36} {old['value']:>14,.2f} -> {result['value']:>14,.2f} "
+              f"{result['unit']:<8} {change:+7.1%}  {status}", file=sys.stderr)
+        if change > threshold:
+            regressions.append({'name': result['name'], 'baseline': old['value'],
+                                'current': result['value'], 'change': change})
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='smaller sizes and fewer repeats')
+    parser.add_argument('--output', help='write the results JSON here (default: stdout)')
+    parser.add_argument('--baseline', help='compare against this results JSON')
+    parser.add_argument('--results', help='compare these stored results instead of running')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown reported as a regression (default: 0.2)')
+    args = parser.parse_args(argv)
+    if args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        current = run(args.quick)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+        elif not args.baseline:
+            print(json.dumps(current, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), current, args.threshold)
+        print(json.dumps({'regressions': regressions}, indent=2))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
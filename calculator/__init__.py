@@ -1,7 +1,7 @@
-"""Calculator package initialization."""
-
-from .core import Calculator
-from .repl import CalculatorREPL
-from .config import setup_logging
-
+"""Calculator package initialization."""
+
+from .core import Calculator
+from .repl import CalculatorREPL
+from .config import setup_logging
+
 __version__ = '1.0.0'
\ No newline at end of file
@@ -1,6 +1,84 @@
-"""Main entry point for the calculator application."""
-
-from .repl import main
-
-if __name__ == '__main__':
-    main()
\ No newline at end of file
+"""Main entry point for the calculator application."""
+
+import sys
+import argparse
+from typing import List, Optional
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(prog='python -m calculator',
+                                     description='Advanced Python Calculator')
+    parser.add_argument('--batch', nargs='?', const='-', metavar='FILE',
+                        help="run commands from FILE (or stdin with '-' or no FILE) "
+                             "without the interactive prompt")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv',
+                        help='batch output format (default: csv)')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='commands evaluated and committed to history per chunk')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='batch worker processes (default: evaluate in this process)')
+    parser.add_argument('--serve', action='store_true',
+                        help='run a JSON-lines calculation server instead of the REPL')
+    parser.add_argument('--host', default='127.0.0.1', help='server host (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='server port (default: 8765)')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='serve on a Unix socket at PATH instead of TCP')
+    parser.add_argument('--convert', nargs=2, metavar=('SOURCE', 'DESTINATION'),
+                        help='convert a history file between CSV and the binary format '
+                             '(chosen by extension: .bin or .calh is binary) and exit')
+    parser.add_argument('--replay', nargs='?', const='', metavar='FILE',
+                        help='recompute the results stored in FILE (default: the history file) '
+                             'and report mismatches; exits with status 1 if any are found')
+    parser.add_argument('--rtol', type=float, default=None,
+                        help='relative tolerance for --replay (default: 1e-9)')
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    return args
+
+def run(argv: Optional[List[str]] = None) -> int:
+    """Run the REPL or batch mode depending on the arguments."""
+    args = parse_args(argv)
+    if args.convert:
+        from .storage import convert_history
+        count = convert_history(*args.convert)
+        print(f"Converted {count} record(s) to {args.convert[1]}")
+        return 0
+    if args.replay is not None:
+        from .core import Calculator
+        from .plugins import register_plugin_operations
+        from .replay import DEFAULT_RTOL, format_report, replay_history
+        calculator = Calculator()
+        register_plugin_operations(calculator)
+        try:
+            report = replay_history(calculator, args.replay or None,
+                                    rtol=DEFAULT_RTOL if args.rtol is None else args.rtol)
+        finally:
+            calculator.history.close()
+        print(format_report(report))
+        return 0 if report.ok else 1
+    if args.serve:
+        from .server import serve
+        from .config import setup_logging
+        setup_logging(console=False)
+        serve(args.host, args.port, args.socket)
+        return 0
+    if args.batch is None:
+        from .repl import main
+        main()
+        return 0
+    
+    from .batch import run_batch
+    from .config import setup_logging
+    setup_logging(console=False)
+    if args.batch == '-':
+        _, errors = run_batch(sys.stdin, sys.stdout, args.format, args.chunk_size,
+                              workers=args.workers)
+    else:
+        with open(args.batch) as source:
+            _, errors = run_batch(source, sys.stdout, args.format, args.chunk_size,
+                                  workers=args.workers)
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(run())
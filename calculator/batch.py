@@ -0,0 +1,217 @@
+"""Non-interactive streaming batch mode for the calculator."""
+
+import csv
+import json
+import logging
+import math
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, TextIO, Tuple
+from .core import Calculator, evaluate_vectorized
+from .plugins import register_plugin_operations
+from .registry import BUILTIN_COMMANDS
+
+logger = logging.getLogger(__name__)
+
+# Batch command name -> (calculator operation, number of operands), used when
+# no calculator registry is given
+COMMANDS: Dict[str, Tuple[str, int]] = BUILTIN_COMMANDS
+
+OUTPUT_FIELDS = ['command', 'x', 'y', 'result', 'error']
+
+class Command:
+    """A parsed batch command line."""
+    __slots__ = ('line', 'command', 'operation', 'x', 'y', 'result', 'error')
+
+    def __init__(self, line: int, command: str, operation: Optional[str] = None,
+                 x: float = math.nan, y: float = math.nan, error: Optional[str] = None):
+        self.line = line
+        self.command = command
+        self.operation = operation
+        self.x = x
+        self.y = y
+        self.result = math.nan
+        self.error = error
+
+def read_lines(stream: TextIO) -> Iterator[Tuple[int, str]]:
+    """Yield numbered command lines, skipping blanks and # comments."""
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield number, line
+
+def parse_commands(lines: Iterable[Tuple[int, str]],
+                   commands: Optional[Mapping[str, Tuple[str, int]]] = None) -> Iterator[Command]:
+    """Parse command lines into Command objects; bad lines carry an error.
+
+    commands is a calculator's registry.commands table (COMMANDS by default).
+    """
+    if commands is None:
+        commands = COMMANDS
+    for number, line in lines:
+        name, *args = line.split()
+        if name not in commands:
+            yield Command(number, name, error=f"Unknown command: {name}")
+            continue
+        operation, arity = commands[name]
+        try:
+            if len(args) != arity:
+                raise ValueError
+            values = [float(arg) for arg in args]
+        except ValueError:
+            usage = ' '.join(['X', 'Y'][:arity])
+            yield Command(number, name, error=f"Invalid input. Format: {name} {usage}")
+            continue
+        # Unary operations are recorded with y=0, like the REPL commands
+        yield Command(number, name, operation, values[0], values[1] if arity == 2 else 0.0)
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most size items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _evaluate_commands(vector_operations: Dict[str, Any], chunk: List[Command],
+                       errors: Optional[Mapping[str, str]] = None) -> List[Command]:
+    """Evaluate a chunk of commands in one bulk calculation, setting results and errors.
+
+    errors is a calculator's registry.errors table, giving each operation's
+    message for elements it cannot calculate. Pure apart from updating the
+    commands, so it can run in worker processes.
+    """
+    if errors is None:
+        errors = {}
+    for command in chunk:
+        if command.error is None and command.operation not in vector_operations:
+            command.error = f"Operation not available: {command.command}"
+    valid = [command for command in chunk if command.error is None]
+    if valid:
+        batch = evaluate_vectorized(
+            vector_operations,
+            np.array([command.operation for command in valid]),
+            np.fromiter((command.x for command in valid), dtype=np.float64, count=len(valid)),
+            np.fromiter((command.y for command in valid), dtype=np.float64, count=len(valid)))
+        for command, result, error in zip(valid, batch.results.tolist(), batch.errors.tolist()):
+            if error:
+                command.error = errors.get(command.operation,
+                                           f"Invalid operands for {command.command}")
+            else:
+                command.result = result
+    return chunk
+
+def _parse_and_evaluate(vector_operations: Dict[str, Any], commands: Mapping[str, Tuple[str, int]],
+                        errors: Mapping[str, str], lines: List[Tuple[int, str]]) -> List[Command]:
+    """Parse and evaluate a chunk of numbered lines (a worker process task)."""
+    return _evaluate_commands(vector_operations, list(parse_commands(lines, commands)), errors)
+
+def _record(calculator: Calculator, chunk: List[Command]) -> None:
+    """Add a chunk's successful calculations to history in one bulk append."""
+    done = [command for command in chunk if command.error is None]
+    if done:
+        calculator.history.add_calculations(
+            [command.operation for command in done],
+            [command.x for command in done],
+            [command.y for command in done],
+            [command.result for command in done])
+
+def evaluate_chunks(calculator: Calculator, chunks: Iterable[List[Command]]) -> Iterator[List[Command]]:
+    """Evaluate each chunk with one bulk calculation, preserving input order.
+
+    Every chunk is committed to history in a single bulk append.
+    """
+    for chunk in chunks:
+        _evaluate_commands(calculator.vector_operations, chunk, calculator.registry.errors)
+        _record(calculator, chunk)
+        yield chunk
+
+def evaluate_parallel(calculator: Calculator, line_chunks: Iterable[List[Tuple[int, str]]],
+                      workers: int) -> Iterator[List[Command]]:
+    """Parse and evaluate chunks of lines in a process pool, preserving input order.
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    however long the input is. Workers never touch history: this process
+    commits each finished chunk with one bulk append, in input order.
+    """
+    task = partial(_parse_and_evaluate, calculator.vector_operations, calculator.registry.commands,
+                   calculator.registry.errors)
+    with ProcessPoolExecutor(workers) as pool:
+        pending: Deque[Future] = deque()
+        for lines in line_chunks:
+            pending.append(pool.submit(task, lines))
+            if len(pending) >= 2 * workers:
+                chunk = pending.popleft().result()
+                _record(calculator, chunk)
+                yield chunk
+        while pending:
+            chunk = pending.popleft().result()
+            _record(calculator, chunk)
+            yield chunk
+
+def _row(command: Command) -> Dict[str, Any]:
+    """Build an output row for an evaluated command."""
+    return {
+        'command': command.command,
+        'x': None if math.isnan(command.x) else command.x,
+        'y': None if math.isnan(command.y) else command.y,
+        'result': None if command.error is not None else command.result,
+        'error': command.error,
+    }
+
+def write_results(evaluated: Iterable[List[Command]], output: TextIO,
+                  output_format: str = 'csv') -> Tuple[int, int]:
+    """Write evaluated chunks as CSV or JSON lines; return (rows, errors)."""
+    rows = errors = 0
+    writer = None
+    if output_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=OUTPUT_FIELDS, lineterminator='\n')
+        writer.writeheader()
+    for chunk in evaluated:
+        for command in chunk:
+            row = _row(command)
+            if writer is not None:
+                writer.writerow(row)
+            else:
+                output.write(json.dumps(row) + '\n')
+            rows += 1
+            errors += command.error is not None
+        output.flush()
+    return rows, errors
+
+def run_batch(source: TextIO, output: TextIO, output_format: str = 'csv',
+              chunk_size: int = 10000, calculator: Optional[Calculator] = None,
+              workers: Optional[int] = None) -> Tuple[int, int]:
+    """Stream commands from source through the calculator into output.
+
+    Memory use is bounded by chunk_size (times twice the worker count in
+    parallel mode). With workers > 1, parsing and evaluation are spread
+    over a process pool. Returns the number of rows written and how many of
+    them were errors.
+    """
+    if output_format not in ('csv', 'jsonl'):
+        raise ValueError(f"Unknown output format: {output_format}")
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be at least 1")
+    owns_calculator = calculator is None
+    if owns_calculator:
+        calculator = Calculator()
+        register_plugin_operations(calculator)
+    try:
+        if workers is not None and workers > 1:
+            evaluated = evaluate_parallel(calculator, chunked(read_lines(source), chunk_size), workers)
+        else:
+            commands = parse_commands(read_lines(source), calculator.registry.commands)
+            evaluated = evaluate_chunks(calculator, chunked(commands, chunk_size))
+        rows, errors = write_results(evaluated, output, output_format)
+        logger.info("Batch processed %d command(s) with %d error(s)", rows, errors)
+        return rows, errors
+    finally:
+        if owns_calculator:
+            calculator.history.close()
+        else:
+            calculator.history.flush()
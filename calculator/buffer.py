@@ -0,0 +1,403 @@
+"""Columnar in-memory storage for calculation history."""
+
+import logging
+import numpy as np
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['timestamp', 'operation', 'x', 'y', 'result']
+
+# Comparison operators accepted in HistoryBuffer.select() conditions
+COMPARISONS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '=': np.equal,
+    '!=': np.not_equal,
+}
+
+def columns_to_frame(columns: Dict[str, np.ndarray], operation_names: Sequence[str], offset: int = 0,
+                     index: Optional[np.ndarray] = None) -> 'pd.DataFrame':
+    """Build a history DataFrame from column arrays and their operation code table.
+
+    timestamp becomes datetime64[ns], operation a categorical built from
+    the codes (no per-row strings) and x, y and result keep the dtype of
+    the arrays. The index counts rows from offset unless explicit row
+    numbers are given.
+    """
+    import pandas as pd
+    codes = columns['operation']
+    if index is None:
+        index = pd.RangeIndex(offset, offset + len(codes))
+    return pd.DataFrame({
+        'timestamp': columns['timestamp'].astype('datetime64[ns]'),
+        'operation': pd.Categorical.from_codes(codes.astype(np.int16), categories=list(operation_names)),
+        'x': np.array(columns['x']),
+        'y': np.array(columns['y']),
+        'result': np.array(columns['result']),
+    }, index=index)
+
+class _PositionList:
+    """Growable int64 array, such as row positions in ascending order."""
+
+    def __init__(self):
+        self._positions = np.empty(16, dtype=np.int64)
+        self._size = 0
+
+    def extend(self, positions: np.ndarray) -> None:
+        needed = self._size + len(positions)
+        if needed > len(self._positions):
+            grown = np.empty(max(needed, 2 * len(self._positions)), dtype=np.int64)
+            grown[:self._size] = self._positions[:self._size]
+            self._positions = grown
+        self._positions[self._size:needed] = positions
+        self._size = needed
+
+    def append(self, position: int) -> None:
+        if self._size == len(self._positions):
+            self.extend(np.array([position]))
+        else:
+            self._positions[self._size] = position
+            self._size += 1
+
+    def view(self) -> np.ndarray:
+        return self._positions[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._positions.nbytes
+
+class HistoryBuffer:
+    """Stores calculation records in typed, preallocated column arrays.
+
+    Timestamps are int64 nanoseconds since the epoch (naive local time),
+    operations are uint8 codes into ``operation_names`` and operands and
+    results are float64, or float32 with ``dtype=np.float32`` to halve
+    their footprint at the cost of precision. Capacity doubles as records are added. When
+    ``maxlen`` is given the buffer becomes a fixed-size ring that keeps only
+    the last ``maxlen`` records.
+
+    Outside ring mode the buffer also maintains query indexes as records
+    are added: a position list per operation, and whether the timestamps
+    are still in ascending order (the timestamp column itself is then the
+    sorted index for binary search). Once they are not, time-range queries
+    use a timestamp-ordered position index instead, into which the rows
+    added since the previous query are merged.
+    """
+
+    def __init__(self, capacity: int = 1024, maxlen: Optional[int] = None,
+                 dtype: Any = np.float64):
+        """Initialize empty column arrays."""
+        if maxlen is not None and maxlen < 1:
+            raise ValueError("Ring buffer size must be at least 1")
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported history value dtype: {self.dtype}")
+        self.maxlen = maxlen
+        self.operation_names: List[str] = []
+        self._operation_codes: Dict[str, int] = {}
+        self._allocate(maxlen if maxlen is not None else max(capacity, 1))
+        self.dropped = 0
+        self.version = 0
+        self._reset_index()
+
+    def _allocate(self, capacity: int) -> None:
+        """Allocate empty column arrays of the given capacity."""
+        self.timestamp = np.empty(capacity, dtype=np.int64)
+        self.operation = np.empty(capacity, dtype=np.uint8)
+        self.x = np.empty(capacity, dtype=self.dtype)
+        self.y = np.empty(capacity, dtype=self.dtype)
+        self.result = np.empty(capacity, dtype=self.dtype)
+        self._start = 0
+        self._size = 0
+
+    @property
+    def capacity(self) -> int:
+        """Number of records the current arrays can hold."""
+        return len(self.timestamp)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def operation_code(self, name: str) -> int:
+        """Return the code for an operation name, assigning a new one if needed."""
+        code = self._operation_codes.get(name)
+        if code is None:
+            code = len(self.operation_names)
+            if code > np.iinfo(np.uint8).max:
+                raise ValueError("Too many distinct operations in history")
+            self.operation_names.append(name)
+            self._operation_codes[name] = code
+        return code
+
+    def encode_operations(self, names: Sequence[str],
+                          check: Optional[Callable[[List[str]], None]] = None) -> np.ndarray:
+        """Convert a sequence of operation names to an array of codes.
+
+        check, if given, is called with the distinct names before any new
+        code is assigned, and may raise to reject them.
+        """
+        unique, inverse = np.unique(np.asarray(names, dtype=object).astype(str), return_inverse=True)
+        if check is not None:
+            check(unique.tolist())
+        codes = np.array([self.operation_code(str(name)) for name in unique], dtype=np.uint8)
+        return codes[inverse]
+
+    def _grow(self, needed: int) -> None:
+        """Grow the arrays geometrically to hold at least ``needed`` records."""
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name in COLUMNS:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, timestamp: int, operation: str, x: float, y: float, result: float) -> None:
+        """Append a single record."""
+        code = self.operation_code(operation)
+        if self.maxlen is None:
+            if self._size == self.capacity:
+                self._grow(self._size + 1)
+            i = self._size
+            self._size += 1
+        else:
+            i = (self._start + self._size) % self.maxlen
+            if self._size == self.maxlen:
+                self._start = (self._start + 1) % self.maxlen
+                self.dropped += 1
+            else:
+                self._size += 1
+        self.timestamp[i] = timestamp
+        self.operation[i] = code
+        self.x[i] = x
+        self.y[i] = y
+        self.result[i] = result
+        self.version += 1
+        if self.maxlen is None:
+            if i and timestamp < self.timestamp[i - 1]:
+                self.time_sorted = False
+            positions = self._operation_positions.get(code)
+            if positions is None:
+                positions = self._operation_positions[code] = _PositionList()
+            positions.append(i)
+
+    def extend(self, timestamps: np.ndarray, operations: np.ndarray, xs: np.ndarray,
+               ys: np.ndarray, results: np.ndarray) -> None:
+        """Append many records at once; ``operations`` are operation codes."""
+        columns = [timestamps, operations, xs, ys, results]
+        n = len(timestamps)
+        if n == 0:
+            return
+        if self.maxlen is None:
+            if self._size + n > self.capacity:
+                self._grow(self._size + n)
+            for name, values in zip(COLUMNS, columns):
+                getattr(self, name)[self._size:self._size + n] = values
+            self._index_rows(self._size, self._size + n)
+            self._size += n
+        else:
+            if n > self.maxlen:
+                self.dropped += n - self.maxlen
+                columns = [values[-self.maxlen:] for values in columns]
+                n = self.maxlen
+            positions = (self._start + self._size + np.arange(n)) % self.maxlen
+            for name, values in zip(COLUMNS, columns):
+                getattr(self, name)[positions] = values
+            overflow = max(self._size + n - self.maxlen, 0)
+            self._start = (self._start + overflow) % self.maxlen
+            self._size += n - overflow
+            self.dropped += overflow
+        self.version += 1
+
+    def prepend(self, timestamps: np.ndarray, operations: np.ndarray, xs: np.ndarray,
+                ys: np.ndarray, results: np.ndarray) -> None:
+        """Insert older records before the ones already held.
+
+        Used when the bulk of a history file is loaded after its most recent
+        rows. In ring mode the older records are only kept if there is room.
+        """
+        held = [values.copy() for values in self.columns().values()]
+        dropped = self.dropped
+        self._start = 0
+        self._size = 0
+        self.dropped = 0
+        self._reset_index()
+        self.extend(timestamps, operations, xs, ys, results)
+        self.extend(*held)
+        self.dropped += dropped
+
+    def clear(self) -> None:
+        """Remove all records, keeping the operation code table."""
+        self._start = 0
+        self._size = 0
+        self.dropped = 0
+        self.version += 1
+        self._reset_index()
+
+    def _reset_index(self) -> None:
+        """Empty the query indexes."""
+        self._operation_positions: Dict[int, _PositionList] = {}
+        self.time_sorted = True
+        # Positions ordered by timestamp and their timestamps, covering the
+        # first _time_indexed rows; only built once time_sorted is False
+        self._time_order = _PositionList()
+        self._time_keys = _PositionList()
+        self._time_indexed = 0
+
+    def _time_index(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return positions ordered by timestamp and the ordered timestamps.
+
+        Rows added since the last call are sorted and merged into the
+        index; rows newer than all indexed ones are simply appended.
+        """
+        if self._time_indexed < self._size:
+            new = np.arange(self._time_indexed, self._size)
+            keys = self.timestamp[new]
+            order = np.argsort(keys, kind='stable')
+            new, keys = new[order], keys[order]
+            at = np.searchsorted(self._time_keys.view(), keys, 'right')
+            if at[0] < len(self._time_keys.view()):
+                merged_order, merged_keys = _PositionList(), _PositionList()
+                merged_order.extend(np.insert(self._time_order.view(), at, new))
+                merged_keys.extend(np.insert(self._time_keys.view(), at, keys))
+                self._time_order, self._time_keys = merged_order, merged_keys
+            else:
+                self._time_order.extend(new)
+                self._time_keys.extend(keys)
+            self._time_indexed = self._size
+        return self._time_order.view(), self._time_keys.view()
+
+    def _index_rows(self, start: int, stop: int) -> None:
+        """Add the rows in [start, stop) to the query indexes (not used in ring mode)."""
+        timestamps = self.timestamp[max(start - 1, 0):stop]
+        if self.time_sorted and np.any(timestamps[1:] < timestamps[:-1]):
+            self.time_sorted = False
+        codes = self.operation[start:stop]
+        for code in np.unique(codes).tolist():
+            positions = self._operation_positions.get(code)
+            if positions is None:
+                positions = self._operation_positions[code] = _PositionList()
+            positions.extend(start + np.flatnonzero(codes == code))
+
+    def select(self, operations: Optional[Sequence[str]] = None, since: Optional[int] = None,
+               until: Optional[int] = None, conditions: Sequence[Tuple[str, str, float]] = (),
+               limit: Optional[int] = None) -> np.ndarray:
+        """Return the positions of matching records, oldest first.
+
+        operations restricts to the named operations, since/until to
+        timestamps (epoch ns) in [since, until), and each (column, operator,
+        value) condition compares x, y or result using an operator from
+        COMPARISONS. With limit, only the last limit matches are returned.
+
+        Time ranges are found by binary search, in the timestamp column
+        while it is in order and in the time index otherwise, and
+        operations through the per-operation position lists, so only the
+        candidate rows are compared; ring buffers are scanned.
+        """
+        for column, operator, _ in conditions:
+            if column not in ('x', 'y', 'result') or operator not in COMPARISONS:
+                raise ValueError(f"Invalid condition: {column} {operator}")
+        if self.maxlen is not None:
+            columns = self.columns()
+            mask = np.ones(self._size, dtype=bool)
+            if operations is not None:
+                codes = [self._operation_codes[name] for name in operations if name in self._operation_codes]
+                mask &= np.isin(columns['operation'], codes)
+            if since is not None:
+                mask &= columns['timestamp'] >= since
+            if until is not None:
+                mask &= columns['timestamp'] < until
+            for column, operator, value in conditions:
+                mask &= COMPARISONS[operator](columns[column], value)
+            positions = np.flatnonzero(mask)
+        else:
+            timestamps = self.timestamp[:self._size]
+            low, high = 0, self._size
+            in_range = None
+            if self.time_sorted:
+                if since is not None:
+                    low = int(np.searchsorted(timestamps, since, 'left'))
+                if until is not None:
+                    high = int(np.searchsorted(timestamps, until, 'left'))
+            elif since is not None or until is not None:
+                order, keys = self._time_index()
+                first = int(np.searchsorted(keys, since, 'left')) if since is not None else 0
+                last = int(np.searchsorted(keys, until, 'left')) if until is not None else len(keys)
+                in_range = np.sort(order[first:max(first, last)])
+            if operations is None:
+                positions = np.arange(low, max(low, high)) if in_range is None else in_range
+            else:
+                lists = [self._operation_positions[self._operation_codes[name]].view()
+                         for name in set(operations)
+                         if self._operation_codes.get(name) in self._operation_positions]
+                lists = [values[np.searchsorted(values, low):np.searchsorted(values, high)]
+                         for values in lists]
+                positions = np.sort(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64)
+                if in_range is not None:
+                    positions = np.intersect1d(positions, in_range, assume_unique=True)
+            for column, operator, value in conditions:
+                positions = positions[COMPARISONS[operator](getattr(self, column)[positions], value)]
+        if limit is not None:
+            positions = positions[max(len(positions) - limit, 0):]
+        return positions
+
+    def take(self, positions: np.ndarray) -> Dict[str, np.ndarray]:
+        """Return the records at the given positions (relative to the oldest held)."""
+        rows = (self._start + positions) % self.capacity
+        return {name: getattr(self, name)[rows] for name in COLUMNS}
+
+    def columns(self, start: int = 0, stop: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Return the records in [start, stop) as ordered column arrays.
+
+        Positions are relative to the oldest record held. The arrays are views
+        unless the range wraps around the end of a ring buffer.
+        """
+        start, stop, _ = slice(start, stop).indices(self._size)
+        stop = max(start, stop)
+        first = self._start + start
+        last = self._start + stop
+        if first >= self.capacity:
+            first -= self.capacity
+            last -= self.capacity
+        result = {}
+        for name in COLUMNS:
+            values = getattr(self, name)
+            if last <= self.capacity:
+                result[name] = values[first:last]
+            else:
+                result[name] = np.concatenate([values[first:], values[:last - self.capacity]])
+        return result
+
+    def memory_usage(self) -> Dict[str, Any]:
+        """Report the bytes allocated for the columns and query indexes."""
+        columns = {name: getattr(self, name).nbytes for name in COLUMNS}
+        index = (sum(positions.nbytes for positions in self._operation_positions.values())
+                 + self._time_order.nbytes + self._time_keys.nbytes)
+        total = sum(columns.values()) + index
+        return {
+            'rows': self._size,
+            'capacity': self.capacity,
+            'value_dtype': self.dtype.name,
+            'columns': columns,
+            'index_bytes': index,
+            'total_bytes': total,
+            'record_bytes': sum(getattr(self, name).itemsize for name in COLUMNS),
+        }
+
+    def operation_labels(self, codes: np.ndarray) -> np.ndarray:
+        """Map operation codes back to an object array of names."""
+        names = np.array(self.operation_names, dtype=object)
+        return names[codes]
+
+    def to_frame(self, start: int = 0, stop: Optional[int] = None) -> 'pd.DataFrame':
+        """Build a DataFrame for the records in [start, stop)."""
+        start, stop, _ = slice(start, stop).indices(self._size)
+        columns = self.columns(start, stop)
+        return columns_to_frame(columns, self.operation_names, self.dropped + start)
@@ -0,0 +1,83 @@
+"""Bounded LRU memoization of calculation results."""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Least-recently-used cache with hit, miss and eviction counters.
+
+    A maxsize of 0 disables the cache: every lookup computes the value and
+    nothing is stored. Exceptions raised while computing a value propagate
+    and are never cached.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        """Initialize an empty cache holding at most maxsize entries."""
+        if maxsize < 0:
+            raise ValueError("Cache size cannot be negative")
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, key: Hashable, function: Callable, *args: Any) -> Any:
+        """Return the cached value for key, or compute it with function(*args)."""
+        if not self.maxsize:
+            return function(*args)
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+        value = function(*args)
+        with self._lock:
+            self._entries[key] = value
+            self._evict()
+        return value
+
+    def _evict(self) -> None:
+        """Drop least recently used entries beyond maxsize."""
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize: int) -> None:
+        """Change the maximum size, evicting entries if it shrinks."""
+        if maxsize < 0:
+            raise ValueError("Cache size cannot be negative")
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+        logger.info("Cache size set to %d", maxsize)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the cache size and hit, miss and eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.maxsize > 0,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
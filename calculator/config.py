@@ -1,13 +1,81 @@
 """Configuration settings for the calculator application."""
 
 import os
+import queue
+import atexit
 import logging.config
-from typing import Dict
+import logging.handlers
+from typing import Any, Dict, Optional
 
-def setup_logging() -> None:
-    """Configure logging based on environment variables."""
+# Loggers on the calculation hot path, subject to CALCULATOR_LOG_SAMPLE_RATE
+HOT_PATH_LOGGERS = ['calculator.core', 'calculator.history', 'calculator.writer']
+
+_operation_log_level = logging.DEBUG
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
+class SamplingFilter(logging.Filter):
+    """Pass only a fraction of records below WARNING.
+
+    Uses a deterministic credit counter, so a rate of 0.25 keeps exactly
+    every fourth record. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = min(max(rate, 0.0), 1.0)
+        self._credit = 0.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        self._credit += self.rate
+        if self._credit >= 1.0:
+            self._credit -= 1.0
+            return True
+        return False
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves message formatting to the listener thread.
+
+    The standard QueueHandler formats each record before queueing it; this
+    one enqueues the record untouched so %-style arguments are only merged
+    off the calling thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def operation_log_level() -> int:
+    """Level used for per-operation log messages (CALCULATOR_OP_LOG_LEVEL)."""
+    return _operation_log_level
+
+def _stop_queue_listener() -> None:
+    """Stop the background logging listener, flushing queued records."""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+def setup_logging(console: bool = True) -> None:
+    """Configure logging based on environment variables.
+
+    With console=False records only go to the log file, which keeps stdout
+    clean for batch output. With CALCULATOR_LOG_ASYNC enabled, records are
+    put on a queue and written to the console and file by a background
+    listener thread instead of the calling thread.
+    """
+    global _operation_log_level, _queue_listener
     log_level = os.getenv('CALCULATOR_LOG_LEVEL', 'INFO').upper()
     log_file = os.getenv('CALCULATOR_LOG_FILE', 'calculator.log')
+    use_queue = os.getenv('CALCULATOR_LOG_ASYNC', '0').lower() in ('1', 'true', 'yes')
+    sample_rate = float(os.getenv('CALCULATOR_LOG_SAMPLE_RATE', '1.0'))
+    operation_level = os.getenv('CALCULATOR_OP_LOG_LEVEL', 'DEBUG').upper()
+    # getLevelName maps level names to numbers and returns a string for unknown names
+    _operation_log_level = logging.getLevelName(operation_level)
+    unknown_operation_level = not isinstance(_operation_log_level, int)
+    if unknown_operation_level:
+        _operation_log_level = logging.DEBUG
+    _stop_queue_listener()
     
     logging_config: Dict = {
         'version': 1,
@@ -17,6 +85,12 @@ def setup_logging() -> None:
                 'format': '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
             },
         },
+        'filters': {
+            'sampling': {
+                '()': SamplingFilter,
+                'rate': sample_rate,
+            },
+        },
         'handlers': {
             'console': {
                 'level': log_level,
@@ -34,12 +108,67 @@ def setup_logging() -> None:
         },
         'loggers': {
             '': {  # root logger
-                'handlers': ['console', 'file'],
+                'handlers': ['console', 'file'] if console else ['file'],
                 'level': log_level,
                 'propagate': True
-            }
+            },
+            **{name: {'filters': ['sampling']} for name in HOT_PATH_LOGGERS}
         }
     }
     
     logging.config.dictConfig(logging_config)
-    logging.info(f"Logging configured with level {log_level}")
\ No newline at end of file
+    if use_queue:
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        for handler in handlers:
+            root.removeHandler(handler)
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _queue_listener = logging.handlers.QueueListener(log_queue, *handlers,
+                                                         respect_handler_level=True)
+        root.addHandler(DeferredQueueHandler(log_queue))
+        _queue_listener.start()
+        atexit.unregister(_stop_queue_listener)
+        atexit.register(_stop_queue_listener)
+    logging.info("Logging configured with level %s%s", log_level, " (async)" if use_queue else "")
+    if unknown_operation_level:
+        logging.warning("Unknown CALCULATOR_OP_LOG_LEVEL %s, using DEBUG", operation_level)
+
+def get_history_settings() -> Dict[str, Any]:
+    """Read history persistence settings from environment variables."""
+    return {
+        'history_file': os.getenv('CALCULATOR_HISTORY_FILE', 'calculator_history.csv'),
+        'storage': os.getenv('CALCULATOR_HISTORY_STORAGE', '').lower() or None,
+        'durability': os.getenv('CALCULATOR_HISTORY_DURABILITY', 'sync').lower(),
+        'batch_size': int(os.getenv('CALCULATOR_HISTORY_BATCH_SIZE', '1000')),
+        'flush_interval': float(os.getenv('CALCULATOR_HISTORY_FLUSH_INTERVAL', '1.0')),
+        'max_records': int(os.getenv('CALCULATOR_HISTORY_MAX_RECORDS', '0')) or None,
+        'tail_rows': int(os.getenv('CALCULATOR_HISTORY_TAIL_ROWS', '1000')),
+        'segment_rows': int(os.getenv('CALCULATOR_HISTORY_SEGMENT_ROWS', '1000000')),
+        'segment_seconds': float(os.getenv('CALCULATOR_HISTORY_SEGMENT_SECONDS', '0')) or None,
+        'resident_rows': int(os.getenv('CALCULATOR_HISTORY_RESIDENT_ROWS', '100000')),
+        'value_dtype': os.getenv('CALCULATOR_HISTORY_DTYPE', 'float64').lower(),
+        'thread_safe': os.getenv('CALCULATOR_HISTORY_THREAD_SAFE', '0').lower() in ('1', 'true', 'yes', 'on'),
+        'sharded': os.getenv('CALCULATOR_HISTORY_SHARDED', '0').lower() in ('1', 'true', 'yes', 'on'),
+        'compact_interval': float(os.getenv('CALCULATOR_HISTORY_COMPACT_INTERVAL', '0')) or None,
+    }
+
+def get_memory_settings() -> Dict[str, Any]:
+    """Read the shared memory register settings.
+
+    CALCULATOR_MEMORY_FILE enables registers shared between processes in
+    that file; CALCULATOR_MEMORY_SLOTS and CALCULATOR_MEMORY_DATA_MB size
+    a newly created file (default: 1024 registers, 64 MB for arrays).
+    """
+    return {
+        'memory_file': os.getenv('CALCULATOR_MEMORY_FILE') or None,
+        'slots': int(os.getenv('CALCULATOR_MEMORY_SLOTS', '1024')),
+        'data_bytes': int(float(os.getenv('CALCULATOR_MEMORY_DATA_MB', '64')) * (1 << 20)),
+    }
+
+def get_cache_size() -> int:
+    """Read the result cache size (CALCULATOR_CACHE_SIZE, 0 disables it)."""
+    return int(os.getenv('CALCULATOR_CACHE_SIZE', '0'))
+
+def get_metrics_enabled() -> bool:
+    """Whether instrumentation starts enabled (CALCULATOR_METRICS=1)."""
+    return os.getenv('CALCULATOR_METRICS', '0').lower() in ('1', 'true', 'yes', 'on')
@@ -1,60 +1,239 @@
-"""Core calculator functionality implementation."""
-
-import logging
-from .history import CalculationHistory
-from typing import Any, Dict, Optional, Callable
-
-# Set up logging
-logger = logging.getLogger(__name__)
-
-class Calculator:
-    """Core calculator class implementing basic arithmetic operations."""
-    
-    def __init__(self):
-        """Initialize the calculator with basic operations."""
-        self.operations: Dict[str, Callable] = {
-            '+': self.add,
-            '-': self.subtract,
-            '*': self.multiply,
-            '/': self.divide
-        }
-        self.history = CalculationHistory()
-    
-    def add(self, x: float, y: float) -> float:
-        """Add two numbers."""
-        logger.info(f"Adding {x} and {y}")
-        return x + y
-    
-    def subtract(self, x: float, y: float) -> float:
-        """Subtract two numbers."""
-        logger.info(f"Subtracting {y} from {x}")
-        return x - y
-    
-    def multiply(self, x: float, y: float) -> float:
-        """Multiply two numbers."""
-        logger.info(f"Multiplying {x} and {y}")
-        return x * y
-    
-    def divide(self, x: float, y: float) -> float:
-        """Divide two numbers."""
-        if y == 0:
-            logger.error("Division by zero attempted")
-            raise ValueError("Cannot divide by zero")
-        logger.info(f"Dividing {x} by {y}")
-        return x / y
-    
-    def calculate(self, operation: str, x: float, y: float) -> Optional[float]:
-        """Perform the specified calculation."""
-        try:
-            if operation not in self.operations:
-                logger.error(f"Invalid operation attempted: {operation}")
-                raise ValueError(f"Unknown operation: {operation}")
-            
-            result = self.operations[operation](x, y)
-            logger.info(f"Calculation result: {result}")
-            self.history.add_calculation(operation, x, y, result)
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error during calculation: {str(e)}")
+"""Core calculator functionality implementation."""
+
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from .cache import LRUCache
+from .config import get_cache_size, operation_log_level
+from .expression import CompiledExpression
+from .history import CalculationHistory
+from .metrics import instrumented
+from .registry import OperationRegistry
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Callable, Sequence, Union
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Compiled expressions kept per calculator, keyed by expression text
+EXPRESSION_CACHE_SIZE = 1024
+
+class BatchResult(NamedTuple):
+    """Results of a bulk calculation.
+
+    errors marks the elements that could not be calculated (for example a
+    division by zero); their results are NaN and they are not recorded in
+    history.
+    """
+    results: np.ndarray
+    errors: np.ndarray
+
+def evaluate_vectorized(vector_operations: Mapping[str, Callable], operations: Union[str, np.ndarray],
+                        xs: np.ndarray, ys: np.ndarray, zero_division: str = 'nan') -> BatchResult:
+    """Evaluate equal-length operand arrays with one vectorized pass per operation.
+
+    A pure function of its arguments (it does not touch history), so it can
+    run in worker processes. See Calculator.calculate_many for the error
+    handling.
+    """
+    if isinstance(operations, str):
+        groups = [(operations, None)]
+    else:
+        names, inverse = np.unique(np.asarray(operations, dtype=str), return_inverse=True)
+        if len(inverse) != len(xs):
+            raise ValueError("Operations and operands must have the same length")
+        groups = [(str(name), np.flatnonzero(inverse == i)) for i, name in enumerate(names)]
+    
+    results = np.empty(len(xs), dtype=np.float64)
+    errors = np.zeros(len(xs), dtype=bool)
+    for operation, index in groups:
+        if operation not in vector_operations:
+            logger.error("Invalid operation attempted: %s", operation)
+            raise ValueError(f"Unknown operation: {operation}")
+        x = xs if index is None else xs[index]
+        y = ys if index is None else ys[index]
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            values = vector_operations[operation](x, y)
+        if operation == '/':
+            values[y == 0] = np.nan
+        failed = np.isnan(values) & ~np.isnan(x) & ~np.isnan(y)
+        if index is None:
+            results, errors = values, failed
+        else:
+            results[index] = values
+            errors[index] = failed
+        if failed.any():
+            message = ("Cannot divide by zero" if operation == '/'
+                       else f"Invalid operands for {operation}")
+            logger.error("%s in %d batch element(s)", message, int(failed.sum()))
+            if zero_division == 'raise':
+                raise ValueError(message)
+    return BatchResult(results, errors)
+
+class Calculator:
+    """Core calculator class implementing basic arithmetic operations."""
+    
+    def __init__(self, cache_size: Optional[int] = None,
+                 history: Optional[CalculationHistory] = None):
+        """Initialize the calculator with basic operations.
+
+        cache_size bounds the LRU cache of (operation, x, y) results used by
+        calculate(); it defaults to CALCULATOR_CACHE_SIZE and 0 disables it.
+        history defaults to a CalculationHistory with the environment settings.
+        """
+        self.registry = OperationRegistry()
+        for name, command, scalar, vector, description in [
+                ('+', 'add', self.add, np.add, "Add two numbers: add X Y"),
+                ('-', 'subtract', self.subtract, np.subtract, "Subtract two numbers: subtract X Y"),
+                ('*', 'multiply', self.multiply, np.multiply, "Multiply two numbers: multiply X Y"),
+                ('/', 'divide', self.divide, np.divide, "Divide two numbers: divide X Y")]:
+            self.registry.register(name, scalar, vector, command=command, description=description,
+                                   error="Cannot divide by zero" if name == '/' else None)
+        # Dispatch tables kept up to date by the registry; plugins register
+        # their operations with calculator.registry.register()
+        self.operations = self.registry.operations
+        self.vector_operations = self.registry.vector_operations
+        # Functions callable from expressions
+        self.functions = self.registry.functions
+        self.cache = LRUCache(get_cache_size() if cache_size is None else cache_size)
+        self.expressions = LRUCache(EXPRESSION_CACHE_SIZE)
+        self.history = history if history is not None else CalculationHistory()
+    
+    def add(self, x: float, y: float) -> float:
+        """Add two numbers."""
+        logger.log(operation_log_level(), "Adding %s and %s", x, y)
+        return x + y
+    
+    def subtract(self, x: float, y: float) -> float:
+        """Subtract two numbers."""
+        logger.log(operation_log_level(), "Subtracting %s from %s", y, x)
+        return x - y
+    
+    def multiply(self, x: float, y: float) -> float:
+        """Multiply two numbers."""
+        logger.log(operation_log_level(), "Multiplying %s and %s", x, y)
+        return x * y
+    
+    def divide(self, x: float, y: float) -> float:
+        """Divide two numbers."""
+        if y == 0:
+            logger.error("Division by zero attempted")
+            raise ValueError("Cannot divide by zero")
+        logger.log(operation_log_level(), "Dividing %s by %s", x, y)
+        return x / y
+    
+    @instrumented('calculate')
+    def calculate(self, operation: str, x: float, y: float) -> Optional[float]:
+        """Perform the specified calculation.
+
+        Results may come from the cache, but every calculation is still
+        recorded in history.
+        """
+        try:
+            if operation not in self.operations:
+                logger.error("Invalid operation attempted: %s", operation)
+                raise ValueError(f"Unknown operation: {operation}")
+            
+            result = self.cache.get_or_compute((operation, x, y), self.operations[operation], x, y)
+            logger.log(operation_log_level(), "Calculation result: %s", result)
+            self.history.add_calculation(operation, x, y, result)
+            return result
+            
+        except Exception as e:
+            logger.error("Error during calculation: %s", e)
+            raise
+    
+    @instrumented('reduce')
+    def reduce(self, operation: str, values: Sequence[float]) -> float:
+        """Reduce values with a registered reduction (such as the scientific plugin's sum).
+
+        The calculation is recorded in history as one row whose x is the
+        number of values reduced and y is 0. Results are not cached.
+        """
+        try:
+            if operation not in self.registry.reductions:
+                logger.error("Invalid operation attempted: %s", operation)
+                raise ValueError(f"Unknown operation: {operation}")
+            values = np.asarray(values, dtype=np.float64)
+            result = float(self.registry.reductions[operation](values))
+            logger.log(operation_log_level(), "Calculation result: %s", result)
+            self.history.add_calculation(operation, len(values), 0.0, result)
+            return result
+        except Exception as e:
+            logger.error("Error during reduction: %s", e)
+            raise
+    
+    def compile(self, expression: str) -> CompiledExpression:
+        """Compile an infix expression, reusing an earlier compilation of the same text.
+
+        Expressions support + - * / and ^ (or **) with parentheses, unary
+        minus, variables and calls to the functions in self.functions.
+        """
+        return self.expressions.get_or_compute(expression, CompiledExpression,
+                                               expression, self.functions)
+    
+    def evaluate(self, expression: str, variables: Optional[Mapping[str, float]] = None) -> float:
+        """Evaluate an infix expression with the given variable values.
+
+        Expressions are compiled once and cached by their text, so repeated
+        evaluation with different variables does no parsing. Evaluations
+        are not recorded in history.
+        """
+        try:
+            result = self.compile(expression)(variables)
+            logger.log(operation_log_level(), "Evaluated %s = %s", expression, result)
+            return result
+        except Exception as e:
+            logger.error("Error evaluating expression: %s", e)
+            raise
+    
+    @instrumented('calculate_many')
+    def calculate_many(self, operations: Union[str, Sequence[str]], xs: Sequence[float],
+                       ys: Sequence[float], zero_division: str = 'nan',
+                       workers: Optional[int] = None, chunk_size: int = 1_000_000) -> BatchResult:
+        """Perform many calculations with one vectorized pass per operation.
+
+        operations is a single operation for every element or one operation
+        per element. Division by zero, and any other element whose result is
+        NaN although its operands are not, yields NaN and is flagged in the
+        errors mask; with zero_division='raise' it raises ValueError instead
+        and nothing is recorded. All successful calculations are added to
+        history in one bulk append.
+
+        With workers > 1, inputs longer than chunk_size are split into
+        chunks evaluated in a process pool. Results keep the input order and
+        are still recorded by this process in a single bulk append.
+        """
+        try:
+            if zero_division not in ('nan', 'raise'):
+                raise ValueError(f"Unknown zero division policy: {zero_division}")
+            xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=np.float64),
+                                         np.asarray(ys, dtype=np.float64))
+            xs, ys = np.ravel(xs), np.ravel(ys)
+            if not isinstance(operations, str):
+                operations = np.asarray(operations, dtype=str)
+            
+            if workers is not None and workers > 1 and len(xs) > chunk_size:
+                starts = range(0, len(xs), chunk_size)
+                with ProcessPoolExecutor(workers) as pool:
+                    batches = list(pool.map(
+                        partial(evaluate_vectorized, self.vector_operations, zero_division=zero_division),
+                        [operations if isinstance(operations, str) else operations[i:i + chunk_size]
+                         for i in starts],
+                        [xs[i:i + chunk_size] for i in starts],
+                        [ys[i:i + chunk_size] for i in starts]))
+                results = np.concatenate([batch.results for batch in batches])
+                errors = np.concatenate([batch.errors for batch in batches])
+            else:
+                results, errors = evaluate_vectorized(self.vector_operations, operations,
+                                                      xs, ys, zero_division)
+            
+            valid = ~errors
+            recorded_operations = operations if isinstance(operations, str) else operations[valid]
+            self.history.add_calculations(recorded_operations, xs[valid], ys[valid], results[valid])
+            logger.info("Calculated batch of %d operations", len(xs))
+            return BatchResult(results, errors)
+            
+        except Exception as e:
+            logger.error("Error during batch calculation: %s", e)
             raise
\ No newline at end of file
@@ -0,0 +1,185 @@
+"""Infix expression parsing and compilation."""
+
+import re
+import math
+import inspect
+import logging
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)"
+                    r"|([A-Za-z_][A-Za-z0-9_]*)|(\*\*|[-+*/^(),]))")
+
+# Binary operator -> (precedence, right associative)
+_BINARY = {'+': (1, False), '-': (1, False), '*': (2, False), '/': (2, False), '^': (4, True)}
+_UNARY_PRECEDENCE = 3
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    """Split an expression into (kind, value) tokens: number, name or op."""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Unexpected character in expression: {text[position:].strip()[0]!r}")
+        number, name, op = match.groups()
+        if number is not None:
+            tokens.append(('number', number))
+        elif name is not None:
+            tokens.append(('name', name))
+        else:
+            tokens.append(('op', '^' if op == '**' else op))
+        position = match.end()
+    return tokens
+
+class _Parser:
+    """Precedence-climbing parser producing nested tuples.
+
+    Nodes are ('number', value), ('name', name), ('neg', node),
+    ('binary', op, left, right) and ('call', name, [args]).
+    """
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of expression")
+        self.position += 1
+        return token
+
+    def expect(self, op: str) -> None:
+        if self.take() != ('op', op):
+            raise ValueError(f"Expected '{op}' in expression")
+
+    def parse(self) -> Tuple:
+        node = self.expression(0)
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected token in expression: {self.peek()[1]}")
+        return node
+
+    def expression(self, min_precedence: int) -> Tuple:
+        left = self.unary()
+        while True:
+            token = self.peek()
+            if token is None or token[0] != 'op' or token[1] not in _BINARY:
+                return left
+            precedence, right_associative = _BINARY[token[1]]
+            if precedence < min_precedence:
+                return left
+            self.position += 1
+            right = self.expression(precedence if right_associative else precedence + 1)
+            left = ('binary', token[1], left, right)
+
+    def unary(self) -> Tuple:
+        token = self.peek()
+        if token in (('op', '-'), ('op', '+')):
+            self.position += 1
+            operand = self.expression(_UNARY_PRECEDENCE)
+            return ('neg', operand) if token[1] == '-' else operand
+        return self.primary()
+
+    def primary(self) -> Tuple:
+        kind, value = self.take()
+        if kind == 'number':
+            return ('number', float(value))
+        if kind == 'name':
+            if self.peek() != ('op', '('):
+                return ('name', value)
+            self.position += 1
+            args = []
+            if self.peek() != ('op', ')'):
+                args.append(self.expression(0))
+                while self.peek() == ('op', ','):
+                    self.position += 1
+                    args.append(self.expression(0))
+            self.expect(')')
+            return ('call', value, args)
+        if value == '(':
+            node = self.expression(0)
+            self.expect(')')
+            return node
+        raise ValueError(f"Unexpected token in expression: {value}")
+
+def parse(text: str) -> Tuple:
+    """Parse an infix expression into a syntax tree."""
+    tokens = tokenize(text)
+    if not tokens:
+        raise ValueError("Empty expression")
+    return _Parser(tokens).parse()
+
+def _divide(x: float, y: float) -> float:
+    """Division with the calculator's error for a zero divisor."""
+    if y == 0:
+        raise ValueError("Cannot divide by zero")
+    return x / y
+
+def _arity(function: Callable) -> Optional[int]:
+    """Number of positional parameters of a function, if it can be determined."""
+    try:
+        return len(inspect.signature(function).parameters)
+    except (TypeError, ValueError):
+        return None
+
+class CompiledExpression:
+    """An expression compiled once into a Python function of its variables.
+
+    Calling it with a mapping of variable values evaluates the expression
+    without any parsing.
+    """
+
+    def __init__(self, text: str, functions: Mapping[str, Callable]):
+        """Parse and compile the expression, resolving functions immediately."""
+        self.text = text
+        self.variables: List[str] = []
+        namespace: Dict[str, Any] = {'_divide': _divide, '_pow': math.pow}
+        source = self._generate(parse(text), functions, namespace)
+        self._function = eval(compile(f"lambda v: {source}", '<expression>', 'eval'), namespace)
+
+    def _generate(self, node: Tuple, functions: Mapping[str, Callable],
+                  namespace: Dict[str, Any]) -> str:
+        """Generate Python source for a syntax tree node."""
+        kind = node[0]
+        if kind == 'number':
+            return repr(node[1])
+        if kind == 'name':
+            if node[1] not in self.variables:
+                self.variables.append(node[1])
+            return f"v[{node[1]!r}]"
+        if kind == 'neg':
+            return f"(-{self._generate(node[1], functions, namespace)})"
+        if kind == 'binary':
+            _, op, left, right = node
+            left = self._generate(left, functions, namespace)
+            right = self._generate(right, functions, namespace)
+            if op == '/':
+                return f"_divide({left}, {right})"
+            if op == '^':
+                # math.pow raises on overflow, like the pow operation
+                return f"_pow({left}, {right})"
+            return f"({left} {op} {right})"
+        _, name, args = node
+        if name not in functions:
+            raise ValueError(f"Unknown function: {name}")
+        arity = _arity(functions[name])
+        if arity is not None and arity != len(args):
+            raise ValueError(f"{name}() takes {arity} argument(s), got {len(args)}")
+        namespace[f"_f_{name}"] = functions[name]
+        return f"_f_{name}({', '.join(self._generate(arg, functions, namespace) for arg in args)})"
+
+    def __call__(self, variables: Optional[Mapping[str, float]] = None) -> float:
+        """Evaluate the expression with the given variable values."""
+        try:
+            return self._function(variables if variables is not None else {})
+        except KeyError as e:
+            raise ValueError(f"Unknown variable: {e.args[0]}") from None
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression({self.text!r})"
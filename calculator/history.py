@@ -1,90 +1,776 @@
-"""History management for calculator operations using pandas."""
-
-import os
-import logging
-import pandas as pd
-from datetime import datetime
-from typing import Optional, List, Dict
-
-logger = logging.getLogger(__name__)
-
-class CalculationHistory:
-    """Manages calculation history using pandas DataFrame."""
-    
-    def __init__(self, history_file: str = "calculator_history.csv"):
-        """Initialize the history manager."""
-        self.history_file = history_file
-        self.history: pd.DataFrame = self._load_history()
-        logger.info("Calculation history manager initialized")
-    
-    def _load_history(self) -> pd.DataFrame:
-        """Load history from CSV file or create new DataFrame."""
-        try:
-            if os.path.exists(self.history_file):
-                df = pd.read_csv(self.history_file)
-                logger.info(f"Loaded history from {self.history_file}")
-                return df
-        except Exception as e:
-            logger.error(f"Error loading history file: {str(e)}")
-        
-        # Create new DataFrame if file doesn't exist or there's an error
-        return pd.DataFrame(columns=['timestamp', 'operation', 'x', 'y', 'result'])
-    
-    def add_calculation(self, operation: str, x: float, y: float, result: float) -> None:
-        """Add a new calculation to history."""
-        try:
-            new_record = {
-                'timestamp': datetime.now(),
-                'operation': operation,
-                'x': x,
-                'y': y,
-                'result': result
-            }
-            self.history = pd.concat([self.history, pd.DataFrame([new_record])], 
-                                   ignore_index=True)
-            self._save_history()
-            logger.info(f"Added calculation to history: {operation} {x} {y} = {result}")
-        except Exception as e:
-            logger.error(f"Error adding calculation to history: {str(e)}")
-            raise
-    
-    def _save_history(self) -> None:
-        """Save history to CSV file."""
-        try:
-            self.history.to_csv(self.history_file, index=False)
-            logger.info(f"Saved history to {self.history_file}")
-        except Exception as e:
-            logger.error(f"Error saving history: {str(e)}")
-            raise
-    
-    def get_history(self, limit: Optional[int] = None) -> pd.DataFrame:
-        """Retrieve calculation history, optionally limited to last N entries."""
-        if limit is not None:
-            return self.history.tail(limit)
-        return self.history
-    
-    def clear_history(self) -> None:
-        """Clear all calculation history."""
-        try:
-            self.history = pd.DataFrame(columns=['timestamp', 'operation', 'x', 'y', 'result'])
-            self._save_history()
-            logger.info("Cleared calculation history")
-        except Exception as e:
-            logger.error(f"Error clearing history: {str(e)}")
-            raise
-    
-    def get_statistics(self) -> Dict:
-        """Calculate basic statistics about calculations."""
-        try:
-            stats = {
-                'total_calculations': len(self.history),
-                'operations_count': self.history['operation'].value_counts().to_dict(),
-                'average_result': self.history['result'].mean(),
-                'max_result': self.history['result'].max(),
-                'min_result': self.history['result'].min()
-            }
-            logger.info("Generated calculation statistics")
-            return stats
-        except Exception as e:
-            logger.error(f"Error generating statistics: {str(e)}")
+"""History management for calculator operations using pandas."""
+
+import time
+import atexit
+import logging
+import functools
+import threading
+import numpy as np
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, List, Dict, Sequence, Tuple, Union
+from .buffer import COLUMNS, HistoryBuffer, columns_to_frame
+from .config import get_history_settings, operation_log_level
+from .metrics import instrumented
+from .stats import RunningStats
+from .storage import (RecordBlock, SegmentedHistoryFile, ShardedHistoryFile, chunks_to_block,
+                      concat_blocks, empty_block, open_history_file, open_transfer_file,
+                      select_block)
+from .writer import WriteBehindWriter
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Records per chunk when aggregating or scanning history files
+STATS_CHUNK_ROWS = 1_000_000
+# Records per chunk when exporting or importing history
+TRANSFER_CHUNK_ROWS = 100_000
+
+def _now_ns() -> int:
+    """Current local wall-clock time as nanoseconds since the epoch.
+
+    Truncated to microseconds, the precision stored in the history file.
+    """
+    now = time.time_ns()
+    now -= now % 1000
+    return now + time.localtime(now // 1_000_000_000).tm_gmtoff * 1_000_000_000
+
+class _ThreadBuffer:
+    """Records added by one thread that are not yet merged into the shared history.
+
+    The lock is only contended while a merge drains this buffer. Holding
+    it while taking a record's timestamp means a merge never misses a
+    record older than the moment it started.
+    """
+    __slots__ = ('thread', 'lock', 'records', 'chunks')
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.lock = threading.Lock()
+        # Single records as (timestamp, operation, x, y, result) tuples
+        self.records: List[Tuple] = []
+        # Bulk chunks as (timestamps, operations, xs, ys, results) tuples
+        self.chunks: List[Tuple] = []
+
+    def drain(self) -> List[Tuple]:
+        """Remove the pending records and return them as column chunks."""
+        with self.lock:
+            records, self.records = self.records, []
+            chunks, self.chunks = self.chunks, []
+        if records:
+            chunks.append(tuple(zip(*records)))
+        return chunks
+
+def _merged(method: Callable) -> Callable:
+    """Run a method on the merged history, under the history lock in thread-safe mode."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._thread_buffers is None:
+            return method(self, *args, **kwargs)
+        with self._lock:
+            self._merge_thread_buffers()
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class CalculationHistory:
+    """Manages calculation history in columnar arrays, exposed as pandas DataFrames."""
+    
+    def __init__(self, history_file: Optional[str] = None, append_only: bool = True,
+                 durability: Optional[str] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, max_records: Optional[int] = None,
+                 tail_rows: Optional[int] = None, storage: Optional[str] = None,
+                 value_dtype: Optional[str] = None, thread_safe: Optional[bool] = None,
+                 sharded: Optional[bool] = None, compact_interval: Optional[float] = None):
+        """Initialize the history manager.
+
+        In append-only mode each new calculation is appended to the history
+        file; the whole file is only rewritten by clear_history() and compact().
+        Durability, batch size and flush interval default to the
+        CALCULATOR_HISTORY_* environment settings (see WriteBehindWriter).
+        With max_records set, only the last max_records calculations are
+        kept in memory (and in the file after a full rewrite).
+        
+        Only the last tail_rows records (CALCULATOR_HISTORY_TAIL_ROWS,
+        default 1000) are read at startup; the rest of the file is loaded
+        the first time full history is needed. tail_rows=0 loads the whole
+        file immediately.
+
+        The history file defaults to CALCULATOR_HISTORY_FILE, or
+        calculator_history.csv. storage selects the file format ('csv',
+        'binary' or 'segmented'); by default files ending in .bin or .calh
+        use the binary memory-mapped format and directories (or paths ending
+        in .d) hold segmented history (see calculator.storage). Segmented
+        history keeps at most CALCULATOR_HISTORY_RESIDENT_ROWS records in
+        memory unless max_records is given; older records are read from
+        the segments when history, queries or statistics need them.
+
+        Operands and results are held in memory as float64, or as float32
+        with value_dtype='float32' (CALCULATOR_HISTORY_DTYPE); statistics
+        are always computed from the full-precision values, and the file
+        keeps them too, so float32 history requires append-only mode and
+        compact() rewrites the file from its own records.
+
+        With thread_safe=True (CALCULATOR_HISTORY_THREAD_SAFE) the history
+        can be shared by many threads: each thread appends to its own
+        buffer without contending with the others, and the buffers are
+        merged into the shared history in timestamp order whenever it is
+        read, flushed or closed, and by each thread once it holds
+        batch_size records. Records reach
+        the writer when they are merged, so thread-safe history requires
+        append-only mode.
+
+        With sharded=True (CALCULATOR_HISTORY_SHARDED) several processes
+        can share one history file: each appends to its own shard, and
+        reads merge the main file and every shard by timestamp, reloading
+        when another process has written (see ShardedHistoryFile). With
+        compact_interval (CALCULATOR_HISTORY_COMPACT_INTERVAL) seconds, a
+        background thread folds the shards of exited processes into the
+        main file. Sharded history also requires append-only mode.
+        """
+        settings = get_history_settings()
+        self.history_file = history_file or settings['history_file']
+        self.append_only = append_only
+        if sharded if sharded is not None else settings['sharded']:
+            if not append_only:
+                raise ValueError("Sharded history requires append-only mode")
+            self._storage = ShardedHistoryFile(self.history_file, storage or settings['storage'])
+        else:
+            self._storage = open_history_file(self.history_file, storage or settings['storage'],
+                                              segment_rows=settings['segment_rows'],
+                                              segment_seconds=settings['segment_seconds'])
+        max_records = max_records or settings['max_records']
+        if max_records is None and isinstance(self._storage, SegmentedHistoryFile):
+            max_records = settings['resident_rows']
+        self._buffer = HistoryBuffer(maxlen=max_records, dtype=value_dtype or settings['value_dtype'])
+        if self._buffer.dtype == np.float32 and not append_only:
+            raise ValueError("float32 history requires append-only mode")
+        self._frame: Optional[pd.DataFrame] = None
+        self._frame_version = -1
+        self._stats = RunningStats()
+        self._unloaded_end: Optional[int] = None
+        self._unloaded_counted = False
+        self._tail_rows = settings['tail_rows'] if tail_rows is None else tail_rows
+        self._thread_buffers: Optional[List[_ThreadBuffer]] = None
+        if thread_safe if thread_safe is not None else settings['thread_safe']:
+            if not append_only:
+                raise ValueError("Thread-safe history requires append-only mode")
+            self._thread_buffers = []
+            self._carried: List[Tuple] = []
+            self._local = threading.local()
+            self._lock = threading.RLock()
+        self._load_history(self._tail_rows)
+        self._writer = WriteBehindWriter(
+            self._write_batch,
+            durability=durability or settings['durability'],
+            batch_size=batch_size or settings['batch_size'],
+            flush_interval=flush_interval or settings['flush_interval'])
+        if self._thread_buffers is not None:
+            # Merge what threads still hold before the writer's own exit flush
+            atexit.register(self.close)
+        self._compactor: Optional[threading.Thread] = None
+        self._stop_compaction = threading.Event()
+        compact_interval = compact_interval or settings['compact_interval']
+        if isinstance(self._storage, ShardedHistoryFile) and compact_interval:
+            self._compactor = threading.Thread(target=self._run_compaction, args=(compact_interval,),
+                                               name='history-compactor', daemon=True)
+            self._compactor.start()
+        logger.info("Calculation history manager initialized")
+    
+    @property
+    @_merged
+    def history(self) -> 'pd.DataFrame':
+        """Full history as a DataFrame, rebuilt only after it has changed.
+
+        For binary and segmented history the records no longer held in
+        memory are read from the files.
+        """
+        self._refresh_shards()
+        self._ensure_loaded()
+        if self._frame is None or self._frame_version != self._buffer.version:
+            if self._storage.supports_views and self._buffer.dropped:
+                self._frame = self._stored_frame(0)
+            else:
+                self._frame = self._buffer.to_frame()
+            self._frame_version = self._buffer.version
+        return self._frame
+    
+    def _stored_frame(self, start: int) -> 'pd.DataFrame':
+        """Frame of the file's records from record start up to the buffer, then the buffer's."""
+        self._writer.flush()
+        older = self._storage.view(start, self._buffer.dropped)
+        held = self._buffer.columns()
+        columns = {name: np.concatenate([getattr(older, name), held[name]])
+                   for name in COLUMNS if name != 'operation'}
+        columns['operation'] = np.concatenate([self._buffer_codes(older), held['operation']])
+        return columns_to_frame(columns, self._buffer.operation_names, start)
+    
+    def _buffer_codes(self, block: RecordBlock) -> np.ndarray:
+        """Translate a block's operation codes into the buffer's code table."""
+        table = np.array([self._buffer.operation_code(name) for name in block.operation_names],
+                         dtype=np.uint8)
+        return table[block.operation] if len(table) else block.operation.astype(np.uint8)
+    
+    @instrumented('history.load')
+    def _load_history(self, tail_rows: int) -> None:
+        """Load the most recent records from the history file into the columnar buffer.
+
+        Anything before the tail is left for _ensure_loaded().
+        """
+        try:
+            end = self._storage.end()
+            if end == 0:
+                return
+            if tail_rows <= 0:
+                self._unloaded_end = end
+                self._ensure_loaded()
+                return
+            block, start = self._storage.read_tail(end, tail_rows)
+            codes = self._buffer_codes(block)
+            self._buffer.extend(block.timestamp, codes, block.x, block.y, block.result)
+            self._stats.add_many(self._buffer.operation_names, codes, block.result)
+            self._unloaded_end = start
+            if self._storage.supports_views:
+                # Record numbers are known, so buffer rows keep their history index
+                self._buffer.dropped += start or 0
+            logger.info("Loaded last %d record(s) of history from %s", block.size, self.history_file)
+        except Exception as e:
+            logger.error("Error loading history file: %s", e)
+            # Start with an empty history if the file can't be read
+            self._buffer.clear()
+            self._stats.clear()
+            self._unloaded_end = None
+    
+    def _ensure_statistics(self) -> None:
+        """Fold the records not yet loaded into the running statistics.
+
+        Binary and segmented history is aggregated from the files in
+        chunks, without loading the records; CSV files are loaded in full.
+        """
+        if self._unloaded_end is None or self._unloaded_counted:
+            return
+        if not self._storage.supports_views:
+            self._ensure_loaded()
+            return
+        try:
+            stats = RunningStats()
+            for block in self._storage.iter_blocks(STATS_CHUNK_ROWS, self._unloaded_end):
+                stats.add_many(block.operation_names, block.operation, block.result)
+            stats.merge(self._stats)
+            self._stats = stats
+            self._unloaded_counted = True
+        except Exception as e:
+            logger.error("Error reading history file: %s", e)
+    
+    @instrumented('history.load_full')
+    def _ensure_loaded(self) -> None:
+        """Load the part of the history file that precedes the records in memory.
+
+        With a ring buffer and binary or segmented history, only the
+        records that fit are read (statistics are aggregated separately).
+        """
+        if self._unloaded_end is None:
+            return
+        try:
+            start = 0
+            if self._storage.supports_views:
+                self._ensure_statistics()
+                if self._buffer.maxlen is not None:
+                    start = max(self._unloaded_end - (self._buffer.maxlen - len(self._buffer)), 0)
+            end, self._unloaded_end = self._unloaded_end, None
+            block = self._storage.view(start, end) if start else self._storage.read(end)
+            codes = self._buffer_codes(block)
+            self._buffer.dropped = start
+            self._buffer.prepend(block.timestamp, codes, block.x, block.y, block.result)
+            if not self._unloaded_counted:
+                stats = RunningStats()
+                stats.add_many(self._buffer.operation_names, codes, block.result)
+                stats.merge(self._stats)
+                self._stats = stats
+            logger.info("Loaded history from %s", self.history_file)
+        except Exception as e:
+            logger.error("Error loading history file: %s", e)
+        self._unloaded_end = None
+        self._unloaded_counted = False
+    
+    def _check_operations(self, names: Iterable[str]) -> None:
+        """Reject operation names the history file cannot store.
+
+        Called before a record reaches memory, so a rejected record is
+        neither kept nor counted in the statistics.
+        """
+        limit = self._storage.max_operation_bytes
+        if limit is None:
+            return
+        for name in names:
+            if len(name.encode()) > limit:
+                raise ValueError(f"Operation cannot be stored in binary history: {name}")
+    
+    def add_calculation(self, operation: str, x: float, y: float, result: float) -> None:
+        """Add a new calculation to history."""
+        try:
+            self._check_operations((operation,))
+            if self._thread_buffers is not None:
+                buffer = self._thread_buffer()
+                with buffer.lock:
+                    buffer.records.append((_now_ns(), operation, x, y, result))
+                if len(buffer.records) >= self._writer.batch_size:
+                    self.flush_threads()
+                return
+            timestamp = _now_ns()
+            self._buffer.append(timestamp, operation, x, y, result)
+            self._stats.add(operation, result)
+            self._writer.submit(([timestamp], [operation], [x], [y], [result]))
+            logger.log(operation_log_level(), "Added calculation to history: %s %s %s = %s",
+                       operation, x, y, result)
+        except Exception as e:
+            logger.error("Error adding calculation to history: %s", e)
+            raise
+    
+    def add_calculations(self, operations: Union[str, Sequence[str]], xs: Sequence[float],
+                         ys: Sequence[float], results: Sequence[float]) -> None:
+        """Add many calculations to history in one bulk append.
+
+        operations is either a single operation for every row or one
+        operation per row.
+        """
+        try:
+            xs = np.asarray(xs, dtype=np.float64)
+            ys = np.asarray(ys, dtype=np.float64)
+            results = np.asarray(results, dtype=np.float64)
+            count = len(results)
+            if count == 0:
+                return
+            if isinstance(operations, str):
+                self._check_operations((operations,))
+            if self._thread_buffers is not None:
+                if not isinstance(operations, str):
+                    self._check_operations(set(operations))
+                operations = [operations] * count if isinstance(operations, str) else list(operations)
+                buffer = self._thread_buffer()
+                with buffer.lock:
+                    timestamps = np.full(count, _now_ns(), dtype=np.int64)
+                    buffer.chunks.append((timestamps, operations, xs, ys, results))
+                self.flush_threads()
+            else:
+                timestamps = np.full(count, _now_ns(), dtype=np.int64)
+                if isinstance(operations, str):
+                    codes = np.full(count, self._buffer.operation_code(operations), dtype=np.uint8)
+                    operations = [operations] * count
+                else:
+                    codes = self._buffer.encode_operations(operations, self._check_operations)
+                    operations = list(operations)
+                self._buffer.extend(timestamps, codes, xs, ys, results)
+                self._stats.add_many(self._buffer.operation_names, codes, results)
+                self._writer.submit((timestamps, operations, xs, ys, results), count)
+            logger.info("Added %d calculations to history", count)
+        except Exception as e:
+            logger.error("Error adding calculations to history: %s", e)
+            raise
+    
+    def _thread_buffer(self) -> _ThreadBuffer:
+        """Return the calling thread's buffer, registering it on first use."""
+        try:
+            return self._local.buffer
+        except AttributeError:
+            buffer = self._local.buffer = _ThreadBuffer()
+            with self._lock:
+                self._thread_buffers.append(buffer)
+            return buffer
+    
+    def flush_threads(self) -> None:
+        """Merge the records held by every thread into the shared history (thread-safe mode)."""
+        if self._thread_buffers is None:
+            return
+        with self._lock:
+            self._merge_thread_buffers()
+    
+    def _merge_thread_buffers(self, complete: bool = False) -> None:
+        """Move pending per-thread records into the shared history in timestamp order.
+
+        Called with the history lock held. Only records up to the current
+        microsecond are merged; newer ones, which other threads may still
+        be adding older records alongside, wait for the next merge, so
+        every merge extends the history in timestamp order. complete
+        merges everything. Buffers of threads that have exited are
+        dropped once drained.
+        """
+        try:
+            cutoff = _now_ns() + 1000
+            chunks, self._carried = self._carried, []
+            for buffer in list(self._thread_buffers):
+                chunks += buffer.drain()
+                if not buffer.thread.is_alive():
+                    self._thread_buffers.remove(buffer)
+            if not chunks:
+                return
+            block = chunks_to_block(chunks)
+            order = np.argsort(block.timestamp, kind='stable')
+            split = block.size if complete else int(np.searchsorted(block.timestamp[order], cutoff))
+            if split < block.size:
+                later = order[split:]
+                self._carried = [(block.timestamp[later], block.labels()[later].tolist(),
+                                  block.x[later], block.y[later], block.result[later])]
+                order = order[:split]
+                if not split:
+                    return
+            block = RecordBlock(*(getattr(block, name)[order] for name in COLUMNS),
+                                block.operation_names)
+            codes = self._buffer_codes(block)
+            self._buffer.extend(block.timestamp, codes, block.x, block.y, block.result)
+            self._stats.add_many(self._buffer.operation_names, codes, block.result)
+            self._writer.submit((block.timestamp, block.labels().tolist(), block.x, block.y,
+                                 block.result), block.size)
+            logger.log(operation_log_level(), "Merged %d record(s) from %d thread(s)",
+                       block.size, len(self._thread_buffers))
+        except Exception as e:
+            logger.error("Error merging thread history buffers: %s", e)
+            raise
+    
+    def _write_batch(self, records: List[Tuple]) -> None:
+        """Persist a batch of new records according to the storage mode."""
+        if self.append_only:
+            self._append_records(records)
+        else:
+            self._save_history()
+    
+    @_merged
+    def flush(self) -> None:
+        """Write any records still buffered by the write-behind writer."""
+        self._writer.flush()
+    
+    @_merged
+    def close(self) -> None:
+        """Flush buffered records and stop the background writer and compaction."""
+        if self._compactor is not None:
+            self._stop_compaction.set()
+            self._compactor.join()
+            self._compactor = None
+        if self._thread_buffers is not None:
+            self._merge_thread_buffers(complete=True)
+        self._writer.close()
+        if isinstance(self._storage, ShardedHistoryFile):
+            self._storage.close()
+        if self._thread_buffers is not None:
+            atexit.unregister(self.close)
+    
+    def _run_compaction(self, interval: float) -> None:
+        """Background loop folding the shards of exited processes into the main file."""
+        while not self._stop_compaction.wait(interval):
+            try:
+                self._storage.compact()
+            except Exception as e:
+                logger.error("Error compacting history shards: %s", e)
+    
+    def _reload(self) -> None:
+        """Drop the in-memory history and load the tail of the history file again."""
+        self._buffer.clear()
+        self._stats.clear()
+        self._unloaded_end = None
+        self._unloaded_counted = False
+        self._load_history(self._tail_rows)
+    
+    def _refresh_shards(self) -> None:
+        """Reload sharded history if other processes have written to it since it was loaded."""
+        if isinstance(self._storage, ShardedHistoryFile) and self._storage.changed():
+            self._writer.flush()
+            self._reload()
+            logger.info("Reloaded history shards of %s", self.history_file)
+    
+    @instrumented('history.append')
+    def _append_records(self, records: List[Tuple]) -> None:
+        """Append column chunks to the history file.
+
+        Each record chunk is a (timestamps, operations, xs, ys, results) tuple
+        of equal-length sequences.
+        """
+        try:
+            block = chunks_to_block(records)
+            self._storage.append(block)
+            logger.log(operation_log_level(), "Appended %d record(s) to %s",
+                       block.size, self.history_file)
+        except Exception as e:
+            logger.error("Error appending to history file: %s", e)
+            raise
+    
+    @instrumented('history.save')
+    def _save_history(self) -> None:
+        """Rewrite the history file from the in-memory history."""
+        try:
+            self._ensure_loaded()
+            columns = self._buffer.columns()
+            self._storage.rewrite(RecordBlock(
+                columns['timestamp'], columns['operation'], columns['x'], columns['y'],
+                columns['result'], list(self._buffer.operation_names)))
+            logger.info("Saved history to %s", self.history_file)
+        except Exception as e:
+            logger.error("Error saving history: %s", e)
+            raise
+    
+    @instrumented('history.save')
+    def _rewrite_from_file(self) -> None:
+        """Rewrite the history file from its own full-precision records.
+
+        Used by float32 history, whose buffer only holds rounded values;
+        with a ring buffer only the last max_records records are kept.
+        """
+        try:
+            self._ensure_loaded()
+            end = self._storage.end()
+            if self._buffer.maxlen is None:
+                block = self._storage.read(end)
+            else:
+                block, _ = self._storage.read_tail(end, self._buffer.maxlen)
+            self._storage.rewrite(block)
+            logger.info("Rewrote history file %s", self.history_file)
+        except Exception as e:
+            logger.error("Error saving history: %s", e)
+            raise
+    
+    @_merged
+    def get_history(self, limit: Optional[int] = None) -> 'pd.DataFrame':
+        """Retrieve calculation history, optionally limited to last N entries.
+
+        For binary and segmented history the records before the ones in
+        memory come straight from the files, without loading the rest.
+        """
+        self._refresh_shards()
+        if limit is not None:
+            missing = limit - len(self._buffer)
+            if missing > 0 and self._storage.supports_views and self._buffer.dropped:
+                return self._stored_frame(max(self._buffer.dropped - missing, 0))
+            if missing > 0:
+                self._ensure_loaded()
+            return self._buffer.to_frame(max(len(self._buffer) - limit, 0))
+        return self.history
+    
+    @_merged
+    def query(self, operations: Optional[Union[str, Sequence[str]]] = None,
+              since: Optional[Union[str, np.datetime64]] = None,
+              until: Optional[Union[str, np.datetime64]] = None,
+              conditions: Sequence[Tuple[str, str, float]] = (),
+              limit: Optional[int] = None) -> 'pd.DataFrame':
+        """Return the calculations matching all of the given filters.
+
+        operations is one operation or several; since and until bound the
+        timestamp to [since, until) and accept anything numpy can parse as a
+        datetime (e.g. '2025-03-10' or '2025-03-10 14:00'); conditions are
+        (column, operator, value) tuples on x, y or result, such as
+        ('result', '>', 100). With limit only the most recent matches are
+        returned. Rows keep their history index.
+
+        Uses the indexes maintained by the history buffer, so selective
+        queries do not scan the whole history. For binary and segmented
+        history, records no longer in memory are scanned from the files
+        (segments outside the time range are skipped) only when the
+        records in memory do not already satisfy the limit.
+        """
+        try:
+            self._refresh_shards()
+            if not self._storage.supports_views:
+                self._ensure_loaded()
+            if isinstance(operations, str):
+                operations = [operations]
+            since, until = [None if value is None else int(np.datetime64(value, 'ns').view(np.int64))
+                            for value in (since, until)]
+            positions = self._buffer.select(operations, since, until, conditions, limit)
+            columns = self._buffer.take(positions)
+            frame = columns_to_frame(columns, self._buffer.operation_names,
+                                     index=self._buffer.dropped + positions)
+            wanted = None if limit is None else limit - len(frame)
+            if self._storage.supports_views and self._buffer.dropped and wanted != 0:
+                self._writer.flush()
+                blocks, indexes = [], []
+                for offset, block in self._storage.scan(STATS_CHUNK_ROWS, self._buffer.dropped,
+                                                        since, until):
+                    matches = select_block(block, operations, since, until, conditions)
+                    if len(matches):
+                        blocks.append(RecordBlock(*(getattr(block, name)[matches] for name in COLUMNS),
+                                                  block.operation_names))
+                        indexes.append(offset + matches)
+                older = concat_blocks(blocks)
+                index = np.concatenate(indexes) if indexes else np.empty(0, dtype=np.int64)
+                if wanted is not None:
+                    older = RecordBlock(*(getattr(older, name)[-wanted:] for name in COLUMNS),
+                                        older.operation_names)
+                    index = index[-wanted:]
+                if older.size:
+                    import pandas as pd
+                    frame = pd.concat([columns_to_frame(older._asdict(), older.operation_names, index=index),
+                                       frame])
+            logger.info("History query matched %d record(s)", len(frame))
+            return frame
+        except Exception as e:
+            logger.error("Error querying history: %s", e)
+            raise
+    
+    def iter_records(self, chunk_size: int = TRANSFER_CHUNK_ROWS,
+                     operations: Optional[Union[str, Sequence[str]]] = None,
+                     since: Optional[Union[str, np.datetime64]] = None,
+                     until: Optional[Union[str, np.datetime64]] = None,
+                     conditions: Sequence[Tuple[str, str, float]] = ()) -> Iterator[RecordBlock]:
+        """Stream the history, oldest first, as record blocks of at most chunk_size rows.
+
+        Takes the same filters as query(). Records not yet loaded are read
+        from the history file chunk by chunk rather than loaded, so memory
+        use does not grow with the size of the history. float32 history is
+        read entirely from the file, which keeps full precision.
+        """
+        if isinstance(operations, str):
+            operations = [operations]
+        since, until = [None if value is None else int(np.datetime64(value, 'ns').view(np.int64))
+                        for value in (since, until)]
+        self.flush_threads()
+        self._refresh_shards()
+        self._writer.flush()
+        full_precision = self._buffer.dtype != np.float32
+        if self._storage.supports_views:
+            stop = self._buffer.dropped if full_precision else None
+            older = (block for _, block in self._storage.scan(chunk_size, stop, since, until))
+        elif not full_precision:
+            older = self._storage.iter_blocks(chunk_size)
+        elif self._unloaded_end is not None:
+            older = self._storage.iter_blocks(chunk_size, self._unloaded_end)
+        else:
+            older = iter(())
+        for block in older:
+            matches = select_block(block, operations, since, until, conditions)
+            if len(matches) == block.size:
+                yield block
+            elif len(matches):
+                yield RecordBlock(*(getattr(block, name)[matches] for name in COLUMNS),
+                                  block.operation_names)
+        if not full_precision:
+            return
+        with self._lock if self._thread_buffers is not None else nullcontext():
+            positions = self._buffer.select(operations, since, until, conditions)
+            columns = self._buffer.take(positions)
+            names = list(self._buffer.operation_names)
+        for start in range(0, len(positions), chunk_size):
+            yield RecordBlock(*(columns[name][start:start + chunk_size] for name in COLUMNS), names)
+    
+    def export_history(self, path: str, file_format: Optional[str] = None,
+                       chunk_size: int = TRANSFER_CHUNK_ROWS, **filters) -> int:
+        """Write the history (filtered as in query()) to a file, chunk by chunk.
+
+        file_format is 'csv' or 'jsonl' (or another history storage
+        format); by default it follows the file extension, see
+        calculator.storage.open_transfer_file(). An existing file is
+        replaced. Returns the number of records exported.
+        """
+        try:
+            target = open_transfer_file(path, file_format)
+            target.rewrite(empty_block())
+            count = 0
+            for block in self.iter_records(chunk_size, **filters):
+                target.append(block)
+                count += block.size
+            logger.info("Exported %d record(s) to %s", count, path)
+            return count
+        except Exception as e:
+            logger.error("Error exporting history: %s", e)
+            raise
+    
+    @_merged
+    def import_history(self, path: str, file_format: Optional[str] = None,
+                       chunk_size: int = TRANSFER_CHUNK_ROWS) -> int:
+        """Append every record of a CSV, JSON lines or history file, keeping its timestamps.
+
+        The file is read in chunks and each chunk is added in one bulk
+        append, so nothing is rewritten. A chunk with an operation name the
+        history file cannot store is rejected before it is added (earlier
+        chunks stay imported). Returns the number of records imported.
+        """
+        try:
+            count = 0
+            for block in open_transfer_file(path, file_format).iter_blocks(chunk_size):
+                self._check_operations(block.operation_names)
+                codes = self._buffer_codes(block)
+                self._buffer.extend(block.timestamp, codes, block.x, block.y, block.result)
+                self._stats.add_many(self._buffer.operation_names, codes, block.result)
+                self._writer.submit((block.timestamp, block.labels().tolist(), block.x, block.y,
+                                     block.result), block.size)
+                count += block.size
+            logger.info("Imported %d record(s) from %s", count, path)
+            return count
+        except Exception as e:
+            logger.error("Error importing history: %s", e)
+            raise
+    
+    @_merged
+    def clear_history(self) -> None:
+        """Clear all calculation history.
+
+        Sharded history refuses while other processes are still writing
+        their shards.
+        """
+        try:
+            if isinstance(self._storage, ShardedHistoryFile) and self._storage.live_shards():
+                raise ValueError("Cannot clear history while other processes are writing to it")
+            self._buffer.clear()
+            self._stats.clear()
+            self._unloaded_end = None
+            self._unloaded_counted = False
+            self._writer.discard_and_run(self._save_history)
+            logger.info("Cleared calculation history")
+        except Exception as e:
+            logger.error("Error clearing history: %s", e)
+            raise
+    
+    @_merged
+    def compact(self, downsample: Optional[int] = None) -> int:
+        """Compact the history file and return the number of records removed.
+
+        Segmented history merges its sealed segments, keeping only every
+        downsample-th record when downsample is given. Sharded history
+        folds this process's shard and those of exited processes into the
+        main file, removing nothing. Other formats are rewritten from the
+        in-memory history.
+        """
+        try:
+            if isinstance(self._storage, ShardedHistoryFile) and downsample is None:
+                folded = self._writer.flush_and_run(lambda: self._storage.compact(include_own=True))
+                logger.info("Compacted calculation history, folded %d shard(s)", folded)
+                return 0
+            if not isinstance(self._storage, SegmentedHistoryFile):
+                if downsample is not None:
+                    raise ValueError("Downsampling requires segmented history storage")
+                if self._buffer.dtype == np.float32:
+                    self._writer.flush_and_run(self._rewrite_from_file)
+                else:
+                    self._writer.discard_and_run(self._save_history)
+                logger.info("Compacted calculation history")
+                return 0
+            self._writer.flush()
+            removed = self._storage.compact(downsample)
+            if removed:
+                # Record numbers have changed: reload the tail and recount
+                self._reload()
+            logger.info("Compacted calculation history, removed %d record(s)", removed)
+            return removed
+        except Exception as e:
+            logger.error("Error compacting history: %s", e)
+            raise
+    
+    @_merged
+    def memory_usage(self) -> Dict:
+        """Report the memory held by the in-memory history (see HistoryBuffer.memory_usage)."""
+        return self._buffer.memory_usage()
+    
+    @_merged
+    def get_statistics(self, extended: bool = False) -> Dict:
+        """Return statistics about calculations from the running aggregates.
+
+        The aggregates cover every recorded calculation, including ones a
+        ring buffer no longer holds. With extended=True the result variance,
+        standard deviation and per-operation means are included as well.
+        """
+        try:
+            self._refresh_shards()
+            self._ensure_statistics()
+            stats = self._stats.to_dict(extended)
+            logger.info("Generated calculation statistics")
+            return stats
+        except Exception as e:
+            logger.error("Error generating statistics: %s", e)
             raise
\ No newline at end of file
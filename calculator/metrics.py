@@ -0,0 +1,169 @@
+"""Latency and throughput instrumentation with JSON and Prometheus export."""
+
+import io
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import functools
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List
+from .config import get_metrics_enabled
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds: 1 us to 10 s, four per decade
+BUCKETS: List[float] = [10 ** (exponent / 4) * 1e-6 for exponent in range(29)]
+
+class Histogram:
+    """Fixed-bucket latency histogram with count, sum, min and max."""
+
+    def __init__(self):
+        """Initialize empty buckets (the last one counts values beyond BUCKETS)."""
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one duration."""
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket holding it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(BUCKETS + [self.max], self.buckets):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary of the histogram."""
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_s': self.sum,
+            'mean_s': self.sum / self.count if self.count else 0.0,
+            'min_s': self.min if self.count else 0.0,
+            'max_s': self.max,
+            'p50_s': self.quantile(0.50),
+            'p95_s': self.quantile(0.95),
+            'p99_s': self.quantile(0.99),
+        }
+
+class MetricsRegistry:
+    """Named latency histograms, recorded only while enabled.
+
+    Disabled by default (CALCULATOR_METRICS=1 enables it at startup); when
+    disabled, instrumented calls only pay for one attribute check.
+    """
+
+    def __init__(self, enabled: bool = False):
+        """Initialize an empty registry."""
+        self.enabled = enabled
+        self.histograms: Dict[str, Histogram] = {}
+        self.profile_next = False
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, error: bool = False) -> None:
+        """Record one duration (and whether it failed) under name."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+            histogram.errors += error
+
+    def reset(self) -> None:
+        """Drop all recorded data."""
+        with self._lock:
+            self.histograms.clear()
+            self.started = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """All histograms as summaries, with throughput since the last reset."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        with self._lock:
+            summaries = {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+        for summary in summaries.values():
+            summary['rate_per_s'] = summary['count'] / elapsed
+        return {'enabled': self.enabled, 'elapsed_s': elapsed, 'metrics': summaries}
+
+    def to_json(self) -> str:
+        """Export as JSON."""
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Export in the Prometheus text exposition format."""
+        lines = ['# HELP calculator_latency_seconds Latency of instrumented calculator calls.',
+                 '# TYPE calculator_latency_seconds histogram']
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            for name, histogram in histograms:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.buckets):
+                    cumulative += count
+                    lines.append(f'calculator_latency_seconds_bucket{{name="{name}",le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'calculator_latency_seconds_bucket{{name="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'calculator_latency_seconds_sum{{name="{name}"}} {histogram.sum:.9g}')
+                lines.append(f'calculator_latency_seconds_count{{name="{name}"}} {histogram.count}')
+            lines += ['# HELP calculator_errors_total Instrumented calls that raised an exception.',
+                      '# TYPE calculator_errors_total counter']
+            lines += [f'calculator_errors_total{{name="{name}"}} {histogram.errors}'
+                      for name, histogram in histograms]
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str, output_format: str = 'json') -> None:
+        """Write the metrics to a local file as 'json' or 'prometheus' text."""
+        if output_format not in ('json', 'prometheus'):
+            raise ValueError(f"Unknown metrics format: {output_format}")
+        text = self.to_json() if output_format == 'json' else self.to_prometheus()
+        with open(path, 'w') as f:
+            f.write(text)
+        logger.info("Exported metrics to %s", path)
+
+metrics = MetricsRegistry(get_metrics_enabled())
+
+def instrumented(name: str) -> Callable:
+    """Decorator recording the latency of each call under name while metrics are enabled."""
+    def decorate(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            error = False
+            try:
+                return function(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                metrics.observe(name, time.perf_counter() - start, error)
+        return wrapper
+    return decorate
+
+def profile_call(function: Callable, *args: Any, limit: int = 20) -> Any:
+    """Run function under cProfile and print the top entries by cumulative time."""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+        print(output.getvalue())
@@ -0,0 +1,26 @@
+"""Calculator plugins and plugin discovery."""
+
+import logging
+import importlib
+import pkgutil
+from types import ModuleType
+from typing import Any, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+def discover_plugins() -> Iterator[Tuple[str, ModuleType]]:
+    """Import and yield each plugin module, skipping ones that fail to load."""
+    for _, name, _ in pkgutil.iter_modules(__path__):
+        try:
+            yield name, importlib.import_module(f"{__name__}.{name}")
+        except Exception as e:
+            logger.error("Error loading plugin %s: %s", name, e)
+
+def register_plugin_operations(calculator: Any) -> None:
+    """Register the vectorized operations that plugins provide with a calculator."""
+    for name, plugin in discover_plugins():
+        if hasattr(plugin, 'register_operations'):
+            try:
+                plugin.register_operations(calculator)
+            except Exception as e:
+                logger.error("Error registering operations from plugin %s: %s", name, e)
@@ -1,45 +1,157 @@
-"""Scientific calculator plugin."""
-
-import math
-import logging
-from typing import Any
-
-logger = logging.getLogger(__name__)
-
-def register_commands(repl: Any) -> None:
-    """Register scientific calculator commands with the REPL."""
-    
-    def do_pow(self, arg: str) -> None:
-        """Calculate power: pow X Y (X raised to power Y)"""
-        try:
-            x, y = map(float, arg.split())
-            result = math.pow(x, y)
-            print(f"Result: {result}")
-            self.calculator.history.add_calculation('pow', x, y, result)
-        except ValueError as e:
-            print(f"Error: {str(e)}")
-            logger.error(f"Error in pow command: {str(e)}")
-        except Exception as e:
-            print("Invalid input. Format: pow X Y")
-            logger.error(f"Invalid input for pow command: {str(e)}")
-    
-    def do_sqrt(self, arg: str) -> None:
-        """Calculate square root: sqrt X"""
-        try:
-            x = float(arg)
-            if x < 0:
-                raise ValueError("Cannot calculate square root of negative number")
-            result = math.sqrt(x)
-            print(f"Result: {result}")
-            self.calculator.history.add_calculation('sqrt', x, 0, result)
-        except ValueError as e:
-            print(f"Error: {str(e)}")
-            logger.error(f"Error in sqrt command: {str(e)}")
-        except Exception as e:
-            print("Invalid input. Format: sqrt X")
-            logger.error(f"Invalid input for sqrt command: {str(e)}")
-    
-    # Add the new commands to the REPL
-    setattr(repl.__class__, 'do_pow', do_pow)
-    setattr(repl.__class__, 'do_sqrt', do_sqrt)
+"""Scientific calculator plugin."""
+
+import re
+import math
+import logging
+import numpy as np
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Largest number of values a single array command may generate
+MAX_VALUES = 10_000_000
+
+_VALUE_ITEM = re.compile(r'linspace\([^)]*\)|[^,\s]+')
+_LINSPACE = re.compile(r'^linspace\(([^,]+),([^,]+),([^,]+)\)$')
+
+# Reduction command -> NumPy function over the values
+REDUCTIONS = {
+    'sum': np.sum,
+    'mean': np.mean,
+    'prod': np.prod,
+    'norm': np.linalg.norm,
+}
+
+def parse_values(text: str) -> np.ndarray:
+    """Parse array command arguments into one float64 array.
+
+    Items are separated by spaces or commas and may be numbers, inclusive
+    ranges ``START..STOP`` or ``START..STOP:STEP`` (e.g. ``0..63`` or
+    ``0..1:0.25``) and ``linspace(START,STOP,COUNT)``.
+    """
+    parts = []
+    for item in _VALUE_ITEM.findall(text):
+        match = _LINSPACE.match(item)
+        if match:
+            start, stop, count = match.groups()
+            parts.append(np.linspace(float(start), float(stop), int(count)))
+        elif '..' in item:
+            start, _, rest = item.partition('..')
+            stop, _, step = rest.partition(':')
+            start, stop, step = float(start), float(stop), float(step) if step else 1.0
+            if step == 0 or (stop - start) / step < 0:
+                raise ValueError(f"Empty range: {item}")
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            if count > MAX_VALUES:
+                raise ValueError(f"Range too large: {item}")
+            parts.append(start + step * np.arange(count))
+        else:
+            parts.append(np.array([float(item)]))
+        if sum(len(part) for part in parts) > MAX_VALUES:
+            raise ValueError(f"Too many values (limit {MAX_VALUES})")
+    if not parts:
+        raise ValueError("No values given")
+    return np.concatenate(parts)
+
+def _scalar(text: str) -> Optional[float]:
+    """The number in text, or None if it is not a plain number."""
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def _calculate_array(repl: Any, operation: str, xs: np.ndarray, ys: np.ndarray) -> None:
+    """Evaluate and print an array command; results are recorded in one bulk append."""
+    batch = repl.calculator.calculate_many(operation, xs, ys)
+    print(f"Results ({len(batch.results)} values): {np.array2string(batch.results, separator=', ')}")
+    if batch.errors.any():
+        print(f"{int(batch.errors.sum())} value(s) had no result and were not recorded")
+
+def _pow_many(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Vectorized power. Infinite results of finite operands (where math.pow
+    raises OverflowError or ValueError) give NaN, so they are reported as errors."""
+    results = np.power(x, y)
+    results[np.isinf(results) & np.isfinite(x) & np.isfinite(y)] = np.nan
+    return results
+
+def _sqrt_many(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Vectorized square root; y is ignored. Negative inputs give NaN."""
+    return np.sqrt(x)
+
+def _sqrt(x: float) -> float:
+    """Square root that rejects negative numbers like the sqrt command."""
+    if x < 0:
+        raise ValueError("Cannot calculate square root of negative number")
+    return math.sqrt(x)
+
+def register_operations(calculator: Any) -> None:
+    """Register the scientific operations, with scalar and vectorized kernels, and reductions."""
+    calculator.registry.register('pow', math.pow, _pow_many,
+                                 description="Calculate power: pow X Y (X raised to power Y)")
+    calculator.registry.register('sqrt', _sqrt, _sqrt_many, arity=1,
+                                 description="Calculate square root: sqrt X",
+                                 error="Cannot calculate square root of negative number")
+    for name, function in REDUCTIONS.items():
+        calculator.registry.register_reduction(name, function)
+    logger.info("Scientific operations registered")
+
+def register_commands(repl: Any) -> None:
+    """Register scientific calculator commands with the REPL."""
+    
+    def do_pow(self, arg: str) -> None:
+        """Calculate power: pow X Y (X raised to power Y; X and Y may be arrays such as 2 0..63)"""
+        try:
+            args = arg.split()
+            if len(args) != 2:
+                raise TypeError("pow takes two arguments")
+            x, y = map(_scalar, args)
+            if x is None or y is None:
+                _calculate_array(self, 'pow', parse_values(args[0]), parse_values(args[1]))
+                return
+            result = self.calculator.calculate('pow', x, y)
+            print(f"Result: {result}")
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in pow command: {str(e)}")
+        except Exception as e:
+            print("Invalid input. Format: pow X Y")
+            logger.error(f"Invalid input for pow command: {str(e)}")
+    
+    def do_sqrt(self, arg: str) -> None:
+        """Calculate square root: sqrt X [X ...] (values may be lists, ranges or linspace)"""
+        try:
+            x = _scalar(arg)
+            if x is None:
+                _calculate_array(self, 'sqrt', parse_values(arg), np.zeros(1))
+                return
+            # Unary operations are recorded with y=0
+            result = self.calculator.calculate('sqrt', x, 0.0)
+            print(f"Result: {result}")
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in sqrt command: {str(e)}")
+        except Exception as e:
+            print("Invalid input. Format: sqrt X")
+            logger.error(f"Invalid input for sqrt command: {str(e)}")
+    
+    def make_reduction(name: str) -> Callable:
+        """Build the command for one reduction."""
+        def do_reduce(self, arg: str) -> None:
+            try:
+                result = self.calculator.reduce(name, parse_values(arg))
+                print(f"Result: {result}")
+            except ValueError as e:
+                print(f"Error: {str(e)}")
+                logger.error(f"Error in {name} command: {str(e)}")
+            except Exception as e:
+                print(f"Invalid input. Format: {name} X [X ...]")
+                logger.error(f"Invalid input for {name} command: {str(e)}")
+        do_reduce.__doc__ = f"Calculate the {name} of values: {name} X [X ...] (lists, ranges or linspace)"
+        return do_reduce
+    
+    # Add the new commands to the REPL
+    setattr(repl.__class__, 'do_pow', do_pow)
+    setattr(repl.__class__, 'do_sqrt', do_sqrt)
+    for name in REDUCTIONS:
+        setattr(repl.__class__, f'do_{name}', make_reduction(name))
     logger.info("Scientific calculator plugin registered")
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""Memory registers shared between processes through a memory-mapped file.
+
+File layout: a 64-byte header, a fixed table of register slots found by
+hashing the register name (open addressing with linear probing), then a
+data area holding float64 arrays. Writers serialize on an exclusive
+flock of the file and bracket every change with a per-slot sequence
+counter; readers take no lock and retry while the counter is odd or
+changed underneath them (a seqlock).
+"""
+
+import os
+import mmap
+import zlib
+import struct
+import logging
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Iterator, MutableMapping, Optional, Sequence, Tuple, Union
+from .config import get_memory_settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CALCREGS'
+VERSION = 1
+# magic, version, slot count, data area size, data area bytes used
+HEADER = struct.Struct('<8sHxxIQQ')
+HEADER_SIZE = 64
+# sequence, name, kind, scalar value, array offset, array length, array capacity
+SLOT = struct.Struct('<Q32sB7xdQQQ')
+SEQUENCE = struct.Struct('<Q')
+MAX_NAME_BYTES = 32
+
+EMPTY, SCALAR, ARRAY, DELETED = 0, 1, 2, 3
+# Lock-free read attempts before a reader falls back to the file lock
+READ_RETRIES = 100
+
+RegisterValue = Union[float, np.ndarray]
+
+class SharedRegisters(MutableMapping):
+    """Named float and float64-array registers in a memory-mapped file.
+
+    Behaves like a dict of register name -> value. Scalars are returned
+    as floats. Arrays are returned as read-only views into the shared
+    mapping, so they can be passed to Calculator.calculate_many without a
+    copy. A view sees later stores of an array that fits the same space,
+    so pass copy=True to get_array() for a snapshot.
+
+    Any number of processes on one host can open the same file. Stores
+    take an exclusive flock (a thread lock where flock is unavailable), and
+    recalls are lock-free. Array space is reused when a new value fits;
+    otherwise fresh space is taken from the data area, which is only
+    reclaimed by clear().
+    """
+
+    def __init__(self, path: str, slots: int = 1024, data_bytes: int = 64 << 20):
+        """Open the register file, creating it with the given sizes if needed.
+
+        The sizes of an existing file take precedence over the arguments.
+        """
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._locked():
+                if os.fstat(self._fd).st_size == 0:
+                    if slots < 1 or data_bytes < 0:
+                        raise ValueError("Invalid register file size")
+                    size = HEADER_SIZE + slots * SLOT.size + data_bytes
+                    os.ftruncate(self._fd, size)
+                    os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, slots, data_bytes, 0), 0)
+                    logger.info("Created register file %s with %d slot(s)", path, slots)
+                magic, version, self.slots, self.data_bytes, _ = HEADER.unpack(
+                    os.pread(self._fd, HEADER.size, 0))
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError(f"Not a calculator register file: {path}")
+            self._data_start = HEADER_SIZE + self.slots * SLOT.size
+            self._map = mmap.mmap(self._fd, self._data_start + self.data_bytes)
+        except Exception as e:
+            logger.error("Error opening register file %s: %s", path, e)
+            os.close(self._fd)
+            raise
+        self._positions = {}
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the writer lock: the thread lock plus an exclusive flock."""
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _encode(name: str) -> bytes:
+        """Encode a register name for the slot table."""
+        encoded = name.encode()
+        if not encoded or len(encoded) > MAX_NAME_BYTES or b'\0' in encoded:
+            raise ValueError(f"Register names must be 1 to {MAX_NAME_BYTES} bytes: {name!r}")
+        return encoded
+
+    @staticmethod
+    def _slot_offset(slot: int) -> int:
+        return HEADER_SIZE + slot * SLOT.size
+
+    def _find(self, encoded: bytes, insert: bool = False) -> Optional[int]:
+        """Probe for a name's slot; with insert, return a free slot if it is absent."""
+        start = zlib.crc32(encoded) % self.slots
+        free = None
+        for probe in range(self.slots):
+            slot = (start + probe) % self.slots
+            _, name, kind, *_ = SLOT.unpack_from(self._map, self._slot_offset(slot))
+            if kind == EMPTY:
+                return (free if free is not None else slot) if insert else None
+            if kind == DELETED:
+                if free is None:
+                    free = slot
+            elif name.rstrip(b'\0') == encoded:
+                self._positions[encoded] = slot
+                return slot
+        if insert and free is not None:
+            return free
+        if insert:
+            raise ValueError("Register table is full")
+        return None
+
+    def _read(self, slot: int, copy: bool) -> Tuple[bytes, int, RegisterValue]:
+        """Read a slot's name, kind and value, retrying while a writer changes it."""
+        offset = self._slot_offset(slot)
+        for _ in range(READ_RETRIES):
+            fields = SLOT.unpack_from(self._map, offset)
+            if fields[0] & 1:
+                continue
+            value = self._decode(fields, copy)
+            if SEQUENCE.unpack_from(self._map, offset)[0] == fields[0]:
+                return fields[1].rstrip(b'\0'), fields[2], value
+        # Writers keep interfering: read under the lock instead
+        with self._locked():
+            fields = SLOT.unpack_from(self._map, offset)
+            return fields[1].rstrip(b'\0'), fields[2], self._decode(fields, copy)
+
+    def _decode(self, fields: Sequence, copy: bool) -> RegisterValue:
+        """Turn unpacked slot fields into a value."""
+        _, _, kind, value, start, length, _ = fields
+        if kind != ARRAY:
+            return value
+        array = np.frombuffer(self._map, dtype=np.float64, count=length,
+                              offset=self._data_start + start)
+        if copy:
+            return array.copy()
+        array.flags.writeable = False
+        return array
+
+    def _lookup(self, name: str, copy: bool = False) -> Tuple[int, RegisterValue]:
+        """Find and read a live register, raising KeyError if it does not exist."""
+        encoded = self._encode(name)
+        slot = self._positions.get(encoded)
+        if slot is not None:
+            current, kind, value = self._read(slot, copy)
+            if current == encoded and kind in (SCALAR, ARRAY):
+                return kind, value
+        slot = self._find(encoded)
+        if slot is not None:
+            current, kind, value = self._read(slot, copy)
+            if current == encoded and kind in (SCALAR, ARRAY):
+                return kind, value
+        raise KeyError(name)
+
+    def get_array(self, name: str, copy: bool = False) -> np.ndarray:
+        """Return a register as a float64 array (a shared read-only view unless copy)."""
+        kind, value = self._lookup(name, copy)
+        return value if kind == ARRAY else np.array([value])
+
+    def __getitem__(self, name: str) -> RegisterValue:
+        return self._lookup(name)[1]
+
+    def __setitem__(self, name: str, value: Union[float, Sequence[float], np.ndarray]) -> None:
+        encoded = self._encode(name)
+        array = None if np.isscalar(value) else np.ravel(np.asarray(value, dtype=np.float64))
+        with self._locked():
+            slot = self._positions.get(encoded)
+            if slot is None or SLOT.unpack_from(self._map, self._slot_offset(slot))[1].rstrip(b'\0') != encoded:
+                slot = self._find(encoded, insert=True)
+            offset = self._slot_offset(slot)
+            sequence, current, kind, _, start, _, capacity = SLOT.unpack_from(self._map, offset)
+            if current.rstrip(b'\0') != encoded or kind != ARRAY:
+                start, capacity = 0, 0
+            if array is not None and len(array) > capacity:
+                start, capacity = self._allocate(len(array)), len(array)
+            SEQUENCE.pack_into(self._map, offset, sequence + 1)
+            if array is None:
+                SLOT.pack_into(self._map, offset, sequence + 1, encoded, SCALAR, float(value),
+                               start, 0, capacity)
+            else:
+                np.frombuffer(self._map, dtype=np.float64, count=len(array),
+                              offset=self._data_start + start)[:] = array
+                SLOT.pack_into(self._map, offset, sequence + 1, encoded, ARRAY, 0.0,
+                               start, len(array), capacity)
+            SEQUENCE.pack_into(self._map, offset, sequence + 2)
+        self._positions[encoded] = slot
+
+    def _allocate(self, count: int) -> int:
+        """Take space for count float64 values from the data area (writer lock held)."""
+        magic, version, slots, data_bytes, used = HEADER.unpack_from(self._map, 0)
+        if used + count * 8 > data_bytes:
+            raise ValueError("Register data area is full")
+        HEADER.pack_into(self._map, 0, magic, version, slots, data_bytes, used + count * 8)
+        return used
+
+    def __delitem__(self, name: str) -> None:
+        encoded = self._encode(name)
+        with self._locked():
+            slot = self._find(encoded)
+            if slot is None:
+                raise KeyError(name)
+            offset = self._slot_offset(slot)
+            sequence, *_ = SLOT.unpack_from(self._map, offset)
+            SEQUENCE.pack_into(self._map, offset, sequence + 1)
+            SLOT.pack_into(self._map, offset, sequence + 1, encoded, DELETED, 0.0, 0, 0, 0)
+            SEQUENCE.pack_into(self._map, offset, sequence + 2)
+
+    def _names(self) -> Iterator[str]:
+        for slot in range(self.slots):
+            _, name, kind, *_ = SLOT.unpack_from(self._map, self._slot_offset(slot))
+            if kind in (SCALAR, ARRAY):
+                yield name.rstrip(b'\0').decode()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self._names()))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._names())
+
+    def clear(self) -> None:
+        """Remove every register and reclaim the whole data area."""
+        with self._locked():
+            for slot in range(self.slots):
+                offset = self._slot_offset(slot)
+                sequence, _, kind, *_ = SLOT.unpack_from(self._map, offset)
+                if kind != EMPTY:
+                    SEQUENCE.pack_into(self._map, offset, sequence + 1)
+                    SLOT.pack_into(self._map, offset, sequence + 1, b'', EMPTY, 0.0, 0, 0, 0)
+                    SEQUENCE.pack_into(self._map, offset, sequence + 2)
+            magic, version, slots, data_bytes, _ = HEADER.unpack_from(self._map, 0)
+            HEADER.pack_into(self._map, 0, magic, version, slots, data_bytes, 0)
+        self._positions.clear()
+
+    def close(self) -> None:
+        """Unmap and close the file (the mapping stays alive while array views exist)."""
+        try:
+            self._map.close()
+        except BufferError:
+            logger.warning("Register file %s is still referenced by array views", self.path)
+        os.close(self._fd)
+
+    def __repr__(self) -> str:
+        return f"SharedRegisters({self.path!r})"
+
+def open_registers() -> Optional[SharedRegisters]:
+    """Open the shared registers configured by CALCULATOR_MEMORY_FILE, if any."""
+    settings = get_memory_settings()
+    if settings['memory_file'] is None:
+        return None
+    return SharedRegisters(settings['memory_file'], settings['slots'], settings['data_bytes'])
@@ -0,0 +1,157 @@
+"""Registry of calculator operations shared by the REPL, batch mode, server and bulk APIs."""
+
+import logging
+import numpy as np
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Commands of the operations that ship with the calculator (core and bundled
+# plugins), for parsing commands without a calculator at hand
+BUILTIN_COMMANDS: Dict[str, Tuple[str, int]] = {
+    'add': ('+', 2),
+    'subtract': ('-', 2),
+    'multiply': ('*', 2),
+    'divide': ('/', 2),
+    'pow': ('pow', 2),
+    'sqrt': ('sqrt', 1),
+}
+
+class Operation:
+    """One registered operation: its history name, command, arity and kernels."""
+    __slots__ = ('name', 'command', 'arity', 'scalar', 'vector', 'description', 'error')
+
+    def __init__(self, name: str, command: str, arity: int, scalar: Callable,
+                 vector: Callable, description: str, error: str):
+        self.name = name
+        self.command = command
+        self.arity = arity
+        self.scalar = scalar
+        self.vector = vector
+        self.description = description
+        self.error = error
+
+    @property
+    def usage(self) -> str:
+        """Command syntax, such as 'add X Y'."""
+        return ' '.join([self.command] + ['X', 'Y'][:self.arity])
+
+    def __repr__(self) -> str:
+        return f"Operation({self.name!r}, command={self.command!r}, arity={self.arity})"
+
+class _Unary:
+    """Scalar kernel of (x, y) that ignores y, for unary operations."""
+
+    def __init__(self, function: Callable):
+        self.function = function
+
+    def __call__(self, x: float, y: float) -> float:
+        return self.function(x)
+
+class _ScalarLoop:
+    """Vectorized kernel that applies a scalar kernel element by element.
+
+    Used for operations registered without a vectorized kernel; elements
+    whose scalar call fails give NaN, which the bulk APIs report as errors.
+    Picklable when the scalar kernel is, so it works in worker processes.
+    """
+
+    def __init__(self, function: Callable, arity: int):
+        self.function = function
+        self.arity = arity
+
+    def __call__(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        results = np.empty(len(xs), dtype=np.float64)
+        for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+            try:
+                results[i] = self.function(*(x, y)[:self.arity])
+            except (ValueError, ArithmeticError):
+                results[i] = np.nan
+        return results
+
+class OperationRegistry:
+    """Operations keyed by the name recorded in history.
+
+    Alongside the Operation entries it keeps the flat tables the hot paths
+    dispatch through, updated on every registration:
+
+    - ``operations``: name -> scalar kernel of (x, y), used by calculate()
+    - ``vector_operations``: name -> kernel of (xs, ys) arrays, used by
+      calculate_many(), batch mode and worker processes
+    - ``commands``: command or name -> (name, arity), used to parse REPL,
+      batch and server requests
+    - ``functions``: expression functions (operations whose name is an
+      identifier, such as pow)
+    - ``errors``: name -> message reported for elements the vectorized
+      kernel cannot calculate, used by batch mode
+    - ``reductions``: name -> function reducing an array of values to one
+      number, used by Calculator.reduce()
+    """
+
+    def __init__(self):
+        """Initialize empty tables."""
+        self._entries: Dict[str, Operation] = {}
+        self.operations: Dict[str, Callable] = {}
+        self.vector_operations: Dict[str, Callable] = {}
+        self.commands: Dict[str, Tuple[str, int]] = {}
+        self.functions: Dict[str, Callable] = {}
+        self.errors: Dict[str, str] = {}
+        self.reductions: Dict[str, Callable] = {}
+
+    def register(self, name: str, scalar: Callable, vector: Optional[Callable] = None,
+                 arity: int = 2, command: Optional[str] = None,
+                 description: Optional[str] = None, error: Optional[str] = None) -> Operation:
+        """Register (or replace) an operation.
+
+        scalar takes arity float arguments. vector takes two equal-length
+        float64 arrays (y is all zeros for unary operations) and returns
+        the results, with NaN for elements it cannot calculate; without
+        one, the scalar kernel is applied element by element. command is
+        the REPL and batch command name (the name by default) and
+        description its one-line help text. error is the message batch
+        mode reports for elements the vectorized kernel gives NaN for (by
+        default "Invalid operands for <name>"); make it match what the
+        scalar kernel raises.
+        """
+        if arity not in (1, 2):
+            raise ValueError(f"Operations take one or two operands, not {arity}")
+        command = command or name
+        if not command.isidentifier():
+            raise ValueError(f"Invalid command name: {command}")
+        operation = Operation(name, command, arity, scalar,
+                              vector if vector is not None else _ScalarLoop(scalar, arity),
+                              description or f"Calculate {name}: {' '.join([command] + ['X', 'Y'][:arity])}",
+                              error or f"Invalid operands for {name}")
+        self._entries[name] = operation
+        self.operations[name] = scalar if arity == 2 else _Unary(scalar)
+        self.vector_operations[name] = operation.vector
+        self.errors[name] = operation.error
+        self.commands[command] = self.commands[name] = (name, arity)
+        if name.isidentifier():
+            self.functions[name] = scalar
+        logger.debug("Registered operation %s", name)
+        return operation
+
+    def register_reduction(self, name: str, function: Callable) -> None:
+        """Register (or replace) a reduction such as sum, taking a float64 array."""
+        self.reductions[name] = function
+        logger.debug("Registered reduction %s", name)
+
+    def __getitem__(self, name: str) -> Operation:
+        return self._entries[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._entries
+
+    def __iter__(self) -> Iterator[Operation]:
+        return iter(list(self._entries.values()))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def resolve(self, command: str) -> Tuple[str, int]:
+        """Return (name, arity) for a command or operation name."""
+        try:
+            return self.commands[command]
+        except (KeyError, TypeError):
+            raise ValueError(f"Unknown operation: {command}") from None
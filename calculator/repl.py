@@ -1,15 +1,75 @@
 """REPL interface for the calculator application."""
 
+import re
 import cmd
+import time
 import logging
-import importlib
-import pkgutil
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Mapping, Tuple
+from .batch import COMMANDS
 from .core import Calculator
 from .config import setup_logging
+from .metrics import instrumented, metrics, profile_call
+from .plugins import discover_plugins
+from .registry import Operation
+from .replay import format_report, replay_history
 
 logger = logging.getLogger(__name__)
 
+_QUERY_TERM = re.compile(r'^(\w+)(<=|>=|!=|=|<|>)(.+)$')
+
+def parse_history_query(arg: str, commands: Mapping[str, Tuple[str, int]] = COMMANDS) -> Dict[str, Any]:
+    """Parse `history` arguments into CalculationHistory.query() keywords.
+
+    Accepts a bare limit (``history 10``) or terms such as ``op=/``
+    (several with ``op=+,-``; command names from ``commands`` like
+    ``op=divide`` work too), ``since=2025-03-10``,
+    ``until=2025-03-11T12:00``, ``limit=50`` and comparisons on x, y or
+    result such as ``result>100``.
+    """
+    query: Dict[str, Any] = {'conditions': []}
+    for term in arg.split():
+        if term.isdigit():
+            query['limit'] = int(term)
+            continue
+        match = _QUERY_TERM.match(term)
+        if match is None:
+            raise ValueError(f"Invalid history filter: {term}")
+        key, operator, value = match.groups()
+        if key in ('x', 'y', 'result'):
+            query['conditions'].append((key, operator, float(value)))
+        elif operator != '=':
+            raise ValueError(f"Invalid history filter: {term}")
+        elif key == 'op':
+            query['operations'] = [commands[name][0] if name in commands else name
+                                   for name in value.split(',')]
+        elif key in ('since', 'until'):
+            query[key] = value
+        elif key == 'limit':
+            query['limit'] = int(value)
+        else:
+            raise ValueError(f"Invalid history filter: {term}")
+    return query
+
+def operation_command(operation: Operation) -> Callable[[cmd.Cmd, str], None]:
+    """Build the REPL command for a registered operation."""
+    def do_operation(self, arg: str) -> None:
+        try:
+            values = [float(value) for value in arg.split()]
+            if len(values) != operation.arity:
+                raise TypeError(f"{operation.command} takes {operation.arity} operand(s)")
+            # Unary operations are recorded with y=0
+            result = self.calculator.calculate(operation.name, *values, *[0.0] * (2 - operation.arity))
+            print(f"Result: {result}")
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in {operation.command} command: {str(e)}")
+        except Exception as e:
+            print(f"Invalid input. Format: {operation.usage}")
+            logger.error(f"Invalid input for {operation.command} command: {str(e)}")
+    do_operation.__doc__ = operation.description
+    do_operation.__name__ = f'do_{operation.command}'
+    return do_operation
+
 class CalculatorREPL(cmd.Cmd):
     """Command-line interface for the calculator."""
     
@@ -23,63 +83,56 @@ class CalculatorREPL(cmd.Cmd):
         self.calculator = Calculator()
         self.plugins: Dict[str, Any] = {}
         self._load_plugins()
+        self._install_operation_commands()
         logger.info("Calculator REPL initialized")
     
-    def do_add(self, arg: str) -> None:
-        """Add two numbers: add X Y"""
-        try:
-            x, y = map(float, arg.split())
-            result = self.calculator.calculate('+', x, y)
-            print(f"Result: {result}")
-        except ValueError as e:
-            print(f"Error: {str(e)}")
-            logger.error(f"Error in add command: {str(e)}")
-        except Exception as e:
-            print("Invalid input. Format: add X Y")
-            logger.error(f"Invalid input for add command: {str(e)}")
-    
-    def do_subtract(self, arg: str) -> None:
-        """Subtract two numbers: subtract X Y"""
-        try:
-            x, y = map(float, arg.split())
-            result = self.calculator.calculate('-', x, y)
-            print(f"Result: {result}")
-        except ValueError as e:
-            print(f"Error: {str(e)}")
-            logger.error(f"Error in subtract command: {str(e)}")
-        except Exception as e:
-            print("Invalid input. Format: subtract X Y")
-            logger.error(f"Invalid input for subtract command: {str(e)}")
+    def _install_operation_commands(self) -> None:
+        """Add a command for every registered operation that has none yet.
+
+        Core operations and plugin operations without their own command
+        all go through Calculator.calculate, so they share its caching,
+        history and metrics.
+        """
+        for operation in self.calculator.registry:
+            if not hasattr(self.__class__, f'do_{operation.command}'):
+                setattr(self.__class__, f'do_{operation.command}', operation_command(operation))
     
-    def do_multiply(self, arg: str) -> None:
-        """Multiply two numbers: multiply X Y"""
-        try:
-            x, y = map(float, arg.split())
-            result = self.calculator.calculate('*', x, y)
-            print(f"Result: {result}")
-        except ValueError as e:
-            print(f"Error: {str(e)}")
-            logger.error(f"Error in multiply command: {str(e)}")
-        except Exception as e:
-            print("Invalid input. Format: multiply X Y")
-            logger.error(f"Invalid input for multiply command: {str(e)}")
+    def onecmd(self, line: str) -> bool:
+        """Run one command, timing it while metrics are enabled.
+
+        Covers every do_* command, including ones added by plugins. After
+        `metrics profile` the next command runs under cProfile.
+        """
+        if metrics.profile_next and self.parseline(line)[0] != 'metrics':
+            metrics.profile_next = False
+            return profile_call(self._timed_onecmd, line)
+        return self._timed_onecmd(line)
     
-    def do_divide(self, arg: str) -> None:
-        """Divide two numbers: divide X Y"""
+    def _timed_onecmd(self, line: str) -> bool:
+        """Dispatch a command, recording its latency under command.<name>."""
+        if not metrics.enabled:
+            return super().onecmd(line)
+        name = self.parseline(line)[0] or 'emptyline'
+        if name != 'emptyline' and not hasattr(self, f'do_{name}'):
+            name = 'unknown'
+        start = time.perf_counter()
+        error = False
         try:
-            x, y = map(float, arg.split())
-            result = self.calculator.calculate('/', x, y)
-            print(f"Result: {result}")
-        except ValueError as e:
-            print(f"Error: {str(e)}")
-            logger.error(f"Error in divide command: {str(e)}")
-        except Exception as e:
-            print("Invalid input. Format: divide X Y")
-            logger.error(f"Invalid input for divide command: {str(e)}")
+            return super().onecmd(line)
+        except Exception:
+            error = True
+            raise
+        finally:
+            metrics.observe(f'command.{name}', time.perf_counter() - start, error)
     
     def do_quit(self, arg: str) -> bool:
         """Exit the calculator"""
         logger.info("Exiting calculator")
+        try:
+            self.calculator.history.close()
+        except Exception as e:
+            print(f"Error: could not save history: {str(e)}")
+            logger.error("Error saving history on exit: %s", e)
         print("Goodbye!")
         return True
     
@@ -88,26 +141,30 @@ class CalculatorREPL(cmd.Cmd):
         return self.do_quit(arg)
     
     def do_history(self, arg: str) -> None:
-        """Show calculation history: history [limit]"""
+        """Show calculation history: history [limit] [op=OP] [since=DATE] [until=DATE] [result>N] [limit=N]"""
         try:
-            limit = int(arg) if arg else None
-            history = self.calculator.history.get_history(limit)
+            query = parse_history_query(arg, self.calculator.registry.commands)
+            if set(query) <= {'conditions', 'limit'} and not query['conditions']:
+                history = self.calculator.history.get_history(query.get('limit'))
+            else:
+                history = self.calculator.history.query(**query)
             if history.empty:
                 print("No calculations in history.")
                 return
             print("\nCalculation History:")
             print(history.to_string(index=False))
-        except ValueError:
-            print("Invalid limit value. Please provide a number.")
-            logger.error("Invalid history limit provided")
+        except ValueError as e:
+            print(f"Invalid history query: {str(e)}")
+            logger.error(f"Invalid history query: {str(e)}")
         except Exception as e:
             print(f"Error retrieving history: {str(e)}")
             logger.error(f"Error in history command: {str(e)}")
     
     def do_stats(self, arg: str) -> None:
-        """Show calculation statistics"""
+        """Show calculation statistics: stats [extended]"""
         try:
-            stats = self.calculator.history.get_statistics()
+            extended = arg.strip() == 'extended'
+            stats = self.calculator.history.get_statistics(extended)
             print("\nCalculation Statistics:")
             print(f"Total calculations: {stats['total_calculations']}")
             print("\nOperations breakdown:")
@@ -116,6 +173,21 @@ class CalculatorREPL(cmd.Cmd):
             print(f"\nAverage result: {stats['average_result']:.2f}")
             print(f"Maximum result: {stats['max_result']}")
             print(f"Minimum result: {stats['min_result']}")
+            if extended:
+                print(f"Result variance: {stats['result_variance']}")
+                print(f"Result std dev: {stats['result_std']}")
+                print("\nAverage result by operation:")
+                for op, mean in stats['operation_means'].items():
+                    print(f"  {op}: {mean:.2f}")
+            memory = self.calculator.history.memory_usage()
+            print(f"\nMemory footprint: {memory['total_bytes'] / 1e6:.2f} MB for {memory['rows']} "
+                  f"row(s) in memory, capacity {memory['capacity']} "
+                  f"({memory['record_bytes']} bytes/row with {memory['value_dtype']} values, "
+                  f"{memory['record_bytes']:.0f} MB per million rows)")
+            if extended:
+                for name, nbytes in memory['columns'].items():
+                    print(f"  {name}: {nbytes / 1e6:.2f} MB")
+                print(f"  indexes: {memory['index_bytes'] / 1e6:.2f} MB")
         except Exception as e:
             print(f"Error retrieving statistics: {str(e)}")
             logger.error(f"Error in stats command: {str(e)}")
@@ -129,21 +201,182 @@ class CalculatorREPL(cmd.Cmd):
             print(f"Error clearing history: {str(e)}")
             logger.error(f"Error in clear command: {str(e)}")
     
+    def do_export(self, arg: str) -> None:
+        """Export history in chunks: export FILE [format=csv|jsonl] [op=OP] [since=DATE] [until=DATE] [result>N]"""
+        try:
+            args = arg.split()
+            if not args:
+                raise ValueError("Format: export FILE [format=csv|jsonl] [op=OP] [since=DATE] [until=DATE]")
+            path, terms = args[0], args[1:]
+            file_format = None
+            for term in [term for term in terms if term.startswith('format=')]:
+                file_format = term.split('=', 1)[1]
+                terms.remove(term)
+            query = parse_history_query(' '.join(terms), self.calculator.registry.commands)
+            if 'limit' in query:
+                raise ValueError("export does not take a limit")
+            count = self.calculator.history.export_history(path, file_format, **query)
+            print(f"Exported {count} calculation(s) to {path}")
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in export command: {str(e)}")
+        except Exception as e:
+            print(f"Error exporting history: {str(e)}")
+            logger.error(f"Error in export command: {str(e)}")
+    
+    def do_import(self, arg: str) -> None:
+        """Append calculations from a file to history: import FILE [format=csv|jsonl]"""
+        try:
+            args = arg.split()
+            if len(args) not in (1, 2) or (len(args) == 2 and not args[1].startswith('format=')):
+                raise ValueError("Format: import FILE [format=csv|jsonl]")
+            file_format = args[1].split('=', 1)[1] if len(args) == 2 else None
+            count = self.calculator.history.import_history(args[0], file_format)
+            print(f"Imported {count} calculation(s) from {args[0]}")
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in import command: {str(e)}")
+        except Exception as e:
+            print(f"Error importing history: {str(e)}")
+            logger.error(f"Error in import command: {str(e)}")
+    
+    def do_compact(self, arg: str) -> None:
+        """Compact the history file: compact [downsample=N]"""
+        try:
+            args = arg.split()
+            downsample = None
+            if args:
+                if len(args) != 1 or not args[0].startswith('downsample='):
+                    raise ValueError("Format: compact [downsample=N]")
+                downsample = int(args[0].split('=', 1)[1])
+            removed = self.calculator.history.compact(downsample)
+            print(f"History compacted ({removed} record(s) removed).")
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in compact command: {str(e)}")
+        except Exception as e:
+            print(f"Error compacting history: {str(e)}")
+            logger.error(f"Error in compact command: {str(e)}")
+    
+    def do_replay(self, arg: str) -> None:
+        """Recompute stored results and report mismatches: replay [FILE] [format=csv|jsonl] [rtol=R] [atol=A]"""
+        try:
+            path, options = None, {}
+            for term in arg.split():
+                key, separator, value = term.partition('=')
+                if not separator and path is None:
+                    path = term
+                elif key == 'format' and value:
+                    options['file_format'] = value
+                elif key in ('rtol', 'atol') and value:
+                    options[key] = float(value)
+                else:
+                    raise ValueError("Format: replay [FILE] [format=csv|jsonl] [rtol=R] [atol=A]")
+            report = replay_history(self.calculator, path, **options)
+            print(format_report(report))
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in replay command: {str(e)}")
+        except Exception as e:
+            print(f"Error replaying history: {str(e)}")
+            logger.error(f"Error in replay command: {str(e)}")
+    
+    def do_eval(self, arg: str) -> None:
+        """Evaluate an expression: eval EXPRESSION (memory values can be used by name)"""
+        try:
+            if not arg.strip():
+                raise ValueError("Format: eval EXPRESSION")
+            result = self.calculator.evaluate(arg, getattr(self, 'memory', None))
+            print(f"Result: {result}")
+        except (ValueError, ArithmeticError) as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in eval command: {str(e)}")
+        except Exception as e:
+            print(f"Error evaluating expression: {str(e)}")
+            logger.error(f"Error in eval command: {str(e)}")
+    
+    def do_cache(self, arg: str) -> None:
+        """Show or control the result cache: cache [size N | off | clear]"""
+        try:
+            args = arg.split()
+            cache = self.calculator.cache
+            if args[:1] == ['size'] and len(args) == 2:
+                cache.resize(int(args[1]))
+            elif args == ['off']:
+                cache.resize(0)
+            elif args == ['clear']:
+                cache.clear()
+            elif args:
+                raise ValueError
+            stats = cache.stats()
+            print("\nResult Cache:")
+            print(f"Enabled: {'yes' if stats['enabled'] else 'no'}")
+            print(f"Entries: {stats['size']} / {stats['maxsize']}")
+            print(f"Hits: {stats['hits']}")
+            print(f"Misses: {stats['misses']}")
+            print(f"Evictions: {stats['evictions']}")
+            print(f"Hit rate: {stats['hit_rate']:.1%}")
+        except ValueError:
+            print("Invalid input. Format: cache [size N | off | clear]")
+            logger.error("Invalid cache command")
+        except Exception as e:
+            print(f"Error in cache command: {str(e)}")
+            logger.error(f"Error in cache command: {str(e)}")
+    
+    def do_metrics(self, arg: str) -> None:
+        """Show or control instrumentation: metrics [on | off | reset | profile | export FILE [json|prometheus]]"""
+        try:
+            args = arg.split()
+            if args == ['on'] or args == ['off']:
+                metrics.enabled = args[0] == 'on'
+                print(f"Metrics {'enabled' if metrics.enabled else 'disabled'}.")
+                return
+            if args == ['reset']:
+                metrics.reset()
+                print("Metrics reset.")
+                return
+            if args == ['profile']:
+                metrics.profile_next = True
+                print("The next command will be profiled.")
+                return
+            if args[:1] == ['export'] and len(args) in (2, 3):
+                metrics.export(args[1], args[2] if len(args) == 3 else 'json')
+                print(f"Metrics exported to {args[1]}")
+                return
+            if args:
+                raise ValueError("Format: metrics [on | off | reset | profile | export FILE [json|prometheus]]")
+            summary = metrics.to_dict()
+            print(f"\nMetrics ({'enabled' if summary['enabled'] else 'disabled'}, "
+                  f"{summary['elapsed_s']:.1f}s):")
+            if not summary['metrics']:
+                print("  No data recorded.")
+            for name, values in summary['metrics'].items():
+                print(f"  {name:<24} count={values['count']:<8} errors={values['errors']:<4} "
+                      f"rate={values['rate_per_s']:.1f}/s p50={values['p50_s'] * 1e6:.1f}us "
+                      f"p95={values['p95_s'] * 1e6:.1f}us p99={values['p99_s'] * 1e6:.1f}us")
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            logger.error(f"Error in metrics command: {str(e)}")
+        except Exception as e:
+            print(f"Error in metrics command: {str(e)}")
+            logger.error(f"Error in metrics command: {str(e)}")
+    
+    @instrumented('plugins.load')
     def _load_plugins(self) -> None:
         """Load calculator plugins from the plugins directory."""
         try:
-            import calculator.plugins
-            for _, name, _ in pkgutil.iter_modules(calculator.plugins.__path__):
+            for name, plugin in discover_plugins():
                 try:
-                    plugin = importlib.import_module(f"calculator.plugins.{name}")
+                    if hasattr(plugin, 'register_operations'):
+                        plugin.register_operations(self.calculator)
                     if hasattr(plugin, 'register_commands'):
                         plugin.register_commands(self)
                         self.plugins[name] = plugin
-                        logger.info(f"Loaded plugin: {name}")
+                        logger.info("Loaded plugin: %s", name)
                 except Exception as e:
-                    logger.error(f"Error loading plugin {name}: {str(e)}")
+                    logger.error("Error loading plugin %s: %s", name, e)
         except Exception as e:
-            logger.error(f"Error loading plugins: {str(e)}")
+            logger.error("Error loading plugins: %s", e)
     
     def do_plugins(self, arg: str) -> None:
         """List all available plugins"""
@@ -156,14 +389,19 @@ class CalculatorREPL(cmd.Cmd):
 
 def main():
     """Main entry point for the calculator REPL."""
+    repl = None
     try:
-        CalculatorREPL().cmdloop()
+        repl = CalculatorREPL()
+        repl.cmdloop()
     except KeyboardInterrupt:
         print("\nGoodbye!")
         logger.info("Calculator terminated by keyboard interrupt")
     except Exception as e:
         logger.error(f"Unexpected error in calculator REPL: {str(e)}")
         raise
+    finally:
+        if repl is not None:
+            repl.calculator.history.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""Bulk replay of stored history to verify recorded results."""
+
+import logging
+import numpy as np
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Mapping, Optional
+from .buffer import columns_to_frame
+from .core import evaluate_vectorized
+from .storage import RecordBlock, concat_blocks, open_transfer_file, take_block
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from .core import Calculator
+
+logger = logging.getLogger(__name__)
+
+# Records per chunk when replaying history files
+REPLAY_CHUNK_ROWS = 1_000_000
+# Default tolerance of the comparison with the stored results (see numpy.isclose)
+DEFAULT_RTOL = 1e-9
+DEFAULT_ATOL = 1e-12
+# Mismatching records kept for the report
+DEFAULT_MAX_ROWS = 100
+
+class ReplayReport:
+    """Outcome of a replay: record counts and the first mismatching records."""
+
+    def __init__(self, max_rows: int = DEFAULT_MAX_ROWS):
+        """Initialize an empty report keeping at most max_rows mismatching records."""
+        self.max_rows = max_rows
+        self.checked = 0
+        self.mismatched = 0
+        self.mismatches: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+        self._rows: List[RecordBlock] = []
+        self._records: List[np.ndarray] = []
+        self._replayed: List[np.ndarray] = []
+        self._kept = 0
+
+    @property
+    def ok(self) -> bool:
+        """Whether every replayed record matched its stored result."""
+        return self.mismatched == 0
+
+    def add_mismatches(self, block: RecordBlock, positions: np.ndarray, offset: int,
+                       replayed: np.ndarray) -> None:
+        """Count mismatching records of a block and keep them while there is room.
+
+        positions are the records' positions in the block and replayed
+        their recomputed results.
+        """
+        for code, count in zip(*np.unique(block.operation[positions], return_counts=True)):
+            name = block.operation_names[code]
+            self.mismatches[name] = self.mismatches.get(name, 0) + int(count)
+        self.mismatched += len(positions)
+        kept = positions[:max(self.max_rows - self._kept, 0)]
+        if len(kept):
+            self._rows.append(take_block(block, kept))
+            self._records.append(offset + kept)
+            self._replayed.append(replayed[:len(kept)])
+            self._kept += len(kept)
+
+    def mismatch_frame(self) -> 'pd.DataFrame':
+        """The kept mismatching records, indexed by record number, with a replayed column."""
+        block = concat_blocks(self._rows)
+        frame = columns_to_frame(block._asdict(), block.operation_names,
+                                 index=np.concatenate(self._records) if self._records else None)
+        frame['replayed'] = np.concatenate(self._replayed) if self._replayed else np.empty(0)
+        return frame.sort_index()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summary of the counts."""
+        return {
+            'checked': self.checked,
+            'mismatched': self.mismatched,
+            'skipped': sum(self.skipped.values()),
+            'mismatches_by_operation': dict(sorted(self.mismatches.items())),
+            'skipped_by_operation': dict(sorted(self.skipped.items())),
+        }
+
+def format_report(report: ReplayReport) -> str:
+    """Describe a replay report for the REPL and the command line."""
+    lines = [f"Replayed {report.checked} calculation(s): {report.mismatched} mismatch(es)"]
+    if report.skipped:
+        lines.append("Skipped without a vectorized kernel: " + ', '.join(
+            f"{name} ({count})" for name, count in sorted(report.skipped.items())))
+    if report.mismatched:
+        lines.append("Mismatches: " + ', '.join(
+            f"{name} ({count})" for name, count in sorted(report.mismatches.items())))
+        frame = report.mismatch_frame()
+        title = "First mismatching records" if report.mismatched > len(frame) else "Mismatching records"
+        lines += ["", f"{title}:", frame.to_string()]
+    return '\n'.join(lines)
+
+def replay_blocks(blocks: Iterable[RecordBlock], vector_operations: Mapping[str, Callable],
+                  rtol: float = DEFAULT_RTOL, atol: float = DEFAULT_ATOL,
+                  max_rows: int = DEFAULT_MAX_ROWS) -> ReplayReport:
+    """Recompute each block's records with the vectorized kernels and compare the results.
+
+    Records are recomputed one operation group at a time; a result matches
+    when numpy.isclose(replayed, stored, rtol, atol) holds, NaN matching
+    NaN. Operations without a vectorized kernel (such as the scientific
+    plugin's reductions, recorded with the number of values as x) are
+    counted as skipped.
+    """
+    report = ReplayReport(max_rows)
+    offset = 0
+    for block in blocks:
+        for code, name in enumerate(block.operation_names):
+            positions = np.flatnonzero(block.operation == code)
+            if not len(positions):
+                continue
+            if name not in vector_operations:
+                report.skipped[name] = report.skipped.get(name, 0) + len(positions)
+                continue
+            replayed = evaluate_vectorized(vector_operations, name, block.x[positions],
+                                           block.y[positions]).results
+            matches = np.isclose(replayed, block.result[positions], rtol=rtol, atol=atol,
+                                 equal_nan=True)
+            report.checked += len(positions)
+            if not matches.all():
+                bad = np.flatnonzero(~matches)
+                report.add_mismatches(block, positions[bad], offset, replayed[bad])
+        offset += block.size
+    logger.info("Replayed %d record(s): %d mismatch(es), %d skipped",
+                report.checked, report.mismatched, sum(report.skipped.values()))
+    return report
+
+def replay_history(calculator: 'Calculator', path: Optional[str] = None,
+                   file_format: Optional[str] = None, chunk_size: int = REPLAY_CHUNK_ROWS,
+                   rtol: float = DEFAULT_RTOL, atol: float = DEFAULT_ATOL,
+                   max_rows: int = DEFAULT_MAX_ROWS) -> ReplayReport:
+    """Replay a history or exported file (or the calculator's own history) chunk by chunk.
+
+    Uses the calculator's registered vectorized kernels, so plugin
+    operations are replayed once their plugins are registered. Nothing is
+    recorded in history. file_format is chosen as for import (see
+    calculator.storage.open_transfer_file).
+    """
+    try:
+        if path is None:
+            blocks = calculator.history.iter_records(chunk_size)
+        else:
+            blocks = open_transfer_file(path, file_format).iter_blocks(chunk_size)
+        return replay_blocks(blocks, calculator.vector_operations, rtol, atol, max_rows)
+    except Exception as e:
+        logger.error("Error replaying history: %s", e)
+        raise
@@ -0,0 +1,132 @@
+"""Asyncio JSON-lines calculation server."""
+
+import json
+import asyncio
+import logging
+from collections import ChainMap
+import numpy as np
+from typing import Any, Dict, Optional
+from .core import Calculator
+from .history import CalculationHistory
+from .config import get_history_settings
+from .plugins import register_plugin_operations
+from .registers import open_registers
+
+logger = logging.getLogger(__name__)
+
+def _server_calculator() -> Calculator:
+    """Create a calculator whose history is written by the background writer.
+
+    Synchronous durability is upgraded to batched so that disk writes never
+    happen on the event loop.
+    """
+    durability = get_history_settings()['durability']
+    history = CalculationHistory(durability='batched' if durability == 'sync' else durability)
+    calculator = Calculator(history=history)
+    register_plugin_operations(calculator)
+    return calculator
+
+class CalculationServer:
+    """Serves calculations over TCP or a Unix socket as JSON lines.
+
+    Each request line is a JSON object such as
+    {"id": 1, "operation": "add", "operands": [2, 3]} or
+    {"id": 2, "expression": "x * 2", "variables": {"x": 4}}, and each
+    response line carries the same id (under "id" or "request_id", as
+    sent) with either "result" or "error". Clients may pipeline any number
+    of requests per connection; responses come back in request order.
+    Expressions can also use the shared memory registers by name when
+    CALCULATOR_MEMORY_FILE is set.
+    """
+
+    def __init__(self, calculator: Optional[Calculator] = None):
+        """Initialize the server around a calculator (a new one by default)."""
+        self.calculator = calculator or _server_calculator()
+        self.registers = open_registers()
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluate one decoded request and build its response."""
+        if 'expression' in request:
+            variables = request.get('variables') or {}
+            if self.registers is not None:
+                variables = ChainMap(variables, self.registers)
+            result = self.calculator.evaluate(request['expression'], variables)
+            # Array registers give array results
+            return {'result': result.tolist() if isinstance(result, np.ndarray) else result}
+        name = request.get('operation')
+        operation, arity = self.calculator.registry.resolve(name)
+        operands = request.get('operands', [])
+        if not isinstance(operands, list) or len(operands) != arity:
+            raise ValueError(f"{name} takes {arity} operand(s)")
+        # Unary operations are recorded with y=0, like the REPL commands
+        x, y = (float(value) for value in (operands + [0.0])[:2])
+        return {'result': self.calculator.calculate(operation, x, y)}
+
+    def respond(self, line: bytes) -> bytes:
+        """Turn one request line into one encoded response line."""
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+        except ValueError as e:
+            return json.dumps({'id': None, 'error': f"Invalid request: {e}"}).encode() + b'\n'
+        key = 'request_id' if 'request_id' in request and 'id' not in request else 'id'
+        try:
+            response = {key: request.get(key), **self.handle(request)}
+        except Exception as e:
+            logger.error("Error handling request %s: %s", request.get(key), e)
+            response = {key: request.get(key), 'error': str(e)}
+        return json.dumps(response).encode() + b'\n'
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer request lines from one connection until it closes."""
+        peer = writer.get_extra_info('peername') or 'unix socket'
+        logger.info("Connection from %s", peer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(self.respond(line))
+                # Only wait for the client when the send buffer is full
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning("Connection from %s lost: %s", peer, e)
+        finally:
+            writer.close()
+            logger.info("Connection from %s closed", peer)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765,
+                    path: Optional[str] = None) -> asyncio.AbstractServer:
+        """Start listening on a Unix socket path or a TCP host and port."""
+        limit = 1 << 20
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve_connection, path, limit=limit)
+        else:
+            self._server = await asyncio.start_server(self._serve_connection, host, port, limit=limit)
+        logger.info("Calculation server listening on %s",
+                    path or ', '.join(str(s.getsockname()) for s in self._server.sockets))
+        return self._server
+
+    async def serve_forever(self, host: str = '127.0.0.1', port: int = 8765,
+                            path: Optional[str] = None) -> None:
+        """Serve until cancelled, then flush history."""
+        server = await self.start(host, port, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.calculator.history.close()
+
+def serve(host: str = '127.0.0.1', port: int = 8765, path: Optional[str] = None) -> None:
+    """Run a calculation server until interrupted."""
+    server = CalculationServer()
+    print(f"Serving on {path or f'{host}:{port}'}")
+    try:
+        asyncio.run(server.serve_forever(host, port, path))
+    except KeyboardInterrupt:
+        logger.info("Calculation server stopped")
@@ -0,0 +1,148 @@
+"""Incrementally maintained statistics over calculation results."""
+
+import math
+import numpy as np
+from typing import Dict, List, Sequence
+
+def _neumaier_add(total: float, compensation: float, value: float):
+    """Add value to a compensated (Neumaier) running sum."""
+    new_total = total + value
+    if abs(total) >= abs(value):
+        compensation += (total - new_total) + value
+    else:
+        compensation += (value - new_total) + total
+    return new_total, compensation
+
+class RunningStats:
+    """Running aggregates over calculation results.
+
+    Keeps the total count, per-operation counts and sums, a compensated sum
+    of results, Welford mean/variance accumulators and the min/max, so that
+    statistics never need a scan over the history rows. NaN results are
+    counted as calculations but excluded from the numeric aggregates.
+    """
+
+    def __init__(self):
+        """Initialize empty aggregates."""
+        self.clear()
+
+    def clear(self) -> None:
+        """Reset all aggregates."""
+        self.count = 0
+        self.valid = 0
+        self.operations_count: Dict[str, int] = {}
+        self._operation_sums: Dict[str, List[float]] = {}
+        self._sum = 0.0
+        self._compensation = 0.0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.nan
+        self.max = math.nan
+
+    def add(self, operation: str, value: float) -> None:
+        """Update the aggregates with a single result."""
+        self.count += 1
+        self.operations_count[operation] = self.operations_count.get(operation, 0) + 1
+        if value != value:
+            return
+        self.valid += 1
+        self._sum, self._compensation = _neumaier_add(self._sum, self._compensation, value)
+        sums = self._operation_sums.setdefault(operation, [0.0, 0.0])
+        sums[0], sums[1] = _neumaier_add(sums[0], sums[1], value)
+        delta = value - self._mean
+        self._mean += delta / self.valid
+        self._m2 += delta * (value - self._mean)
+        if not value >= self.min:
+            self.min = value
+        if not value <= self.max:
+            self.max = value
+
+    def add_many(self, operation_names: Sequence[str], codes: np.ndarray, values: np.ndarray) -> None:
+        """Update the aggregates with many results in one vectorized pass.
+
+        ``codes`` index into ``operation_names`` for each value.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        codes = np.asarray(codes)
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        valid = ~np.isnan(values)
+        counts = np.bincount(codes, minlength=len(operation_names))
+        sums = np.bincount(codes[valid], weights=values[valid], minlength=len(operation_names))
+        for name, count, total in zip(operation_names, counts.tolist(), sums.tolist()):
+            if count:
+                self.operations_count[name] = self.operations_count.get(name, 0) + count
+                op_sums = self._operation_sums.setdefault(name, [0.0, 0.0])
+                op_sums[0], op_sums[1] = _neumaier_add(op_sums[0], op_sums[1], total)
+        values = values[valid]
+        if len(values) == 0:
+            return
+        self._combine(len(values), float(np.sum(values)), float(np.mean(values)),
+                      float(np.sum((values - np.mean(values)) ** 2)),
+                      float(np.min(values)), float(np.max(values)))
+
+    def merge(self, other: 'RunningStats') -> None:
+        """Fold another set of aggregates into this one."""
+        self.count += other.count
+        for name, count in other.operations_count.items():
+            self.operations_count[name] = self.operations_count.get(name, 0) + count
+        for name, (total, compensation) in other._operation_sums.items():
+            sums = self._operation_sums.setdefault(name, [0.0, 0.0])
+            sums[0], sums[1] = _neumaier_add(sums[0], sums[1], total)
+            sums[1] += compensation
+        if other.valid:
+            self._combine(other.valid, other._sum, other._mean, other._m2, other.min, other.max)
+            self._compensation += other._compensation
+
+    def _combine(self, count: int, total: float, mean: float, m2: float,
+                 minimum: float, maximum: float) -> None:
+        """Merge a group's aggregates using Chan's parallel update."""
+        combined = self.valid + count
+        delta = mean - self._mean
+        self._m2 += m2 + delta * delta * self.valid * count / combined
+        self._mean += delta * count / combined
+        self.valid = combined
+        self._sum, self._compensation = _neumaier_add(self._sum, self._compensation, total)
+        if not minimum >= self.min:
+            self.min = minimum
+        if not maximum <= self.max:
+            self.max = maximum
+
+    @property
+    def mean(self) -> float:
+        """Mean of all non-NaN results."""
+        if not self.valid:
+            return math.nan
+        return (self._sum + self._compensation) / self.valid
+
+    @property
+    def variance(self) -> float:
+        """Sample variance of all non-NaN results."""
+        if self.valid < 2:
+            return math.nan
+        return self._m2 / (self.valid - 1)
+
+    def operation_means(self) -> Dict[str, float]:
+        """Mean result for each operation."""
+        means = {}
+        for name, count in self.operations_count.items():
+            total, compensation = self._operation_sums.get(name, (math.nan, 0.0))
+            means[name] = (total + compensation) / count
+        return means
+
+    def to_dict(self, extended: bool = False) -> Dict:
+        """Return the aggregates in the CalculationHistory.get_statistics() layout."""
+        stats = {
+            'total_calculations': self.count,
+            'operations_count': dict(sorted(self.operations_count.items(),
+                                            key=lambda item: item[1], reverse=True)),
+            'average_result': self.mean,
+            'max_result': self.max,
+            'min_result': self.min
+        }
+        if extended:
+            stats['result_variance'] = self.variance
+            stats['result_std'] = math.sqrt(self.variance) if self.valid > 1 else math.nan
+            stats['operation_means'] = self.operation_means()
+        return stats
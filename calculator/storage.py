@@ -0,0 +1,978 @@
+"""On-disk history formats: CSV and a binary, memory-mapped record file, alone or sharded."""
+
+import os
+import csv
+import glob
+import json
+import math
+import logging
+from contextlib import contextmanager
+from itertools import chain
+import numpy as np
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from .buffer import COLUMNS, COMPARISONS
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class RecordBlock(NamedTuple):
+    """A block of history records in columnar form.
+
+    timestamp holds int64 epoch-ns values and operation holds uint8 codes
+    into operation_names; the remaining columns are float64.
+    """
+    timestamp: np.ndarray
+    operation: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    result: np.ndarray
+    operation_names: List[str]
+
+    @property
+    def size(self) -> int:
+        """Number of records in the block."""
+        return len(self.timestamp)
+
+    def labels(self) -> np.ndarray:
+        """Operation names for each record as an object array."""
+        return np.array(self.operation_names, dtype=object)[self.operation]
+
+def encode_names(names: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """Convert operation names to uint8 codes and the code table."""
+    unique, inverse = np.unique(np.asarray(names, dtype=object).astype(str), return_inverse=True)
+    if len(unique) > 256:
+        raise ValueError("Too many distinct operations in history")
+    return inverse.astype(np.uint8), [str(name) for name in unique]
+
+def empty_block() -> RecordBlock:
+    """A block with no records."""
+    return RecordBlock(np.empty(0, np.int64), np.empty(0, np.uint8), np.empty(0),
+                       np.empty(0), np.empty(0), [])
+
+def concat_blocks(blocks: Sequence[RecordBlock]) -> RecordBlock:
+    """Concatenate blocks, merging their operation tables."""
+    if len(blocks) == 1:
+        return blocks[0]
+    if not blocks:
+        return empty_block()
+    names: List[str] = []
+    codes = []
+    for block in blocks:
+        for name in block.operation_names:
+            if name not in names:
+                names.append(name)
+        table = np.array([names.index(name) for name in block.operation_names], dtype=np.uint8)
+        codes.append(table[block.operation] if len(table) else block.operation.astype(np.uint8))
+    return RecordBlock(*(np.concatenate([getattr(block, name) for block in blocks])
+                         if name != 'operation' else np.concatenate(codes) for name in COLUMNS),
+                       names)
+
+def select_block(block: RecordBlock, operations: Optional[Sequence[str]] = None,
+                 since: Optional[int] = None, until: Optional[int] = None,
+                 conditions: Sequence[Tuple[str, str, float]] = ()) -> np.ndarray:
+    """Return positions in a block matching the HistoryBuffer.select() filters."""
+    mask = np.ones(block.size, dtype=bool)
+    if operations is not None:
+        codes = [code for code, name in enumerate(block.operation_names) if name in operations]
+        mask &= np.isin(block.operation, codes)
+    if since is not None:
+        mask &= block.timestamp >= since
+    if until is not None:
+        mask &= block.timestamp < until
+    for column, operator, value in conditions:
+        mask &= COMPARISONS[operator](getattr(block, column), value)
+    return np.flatnonzero(mask)
+
+def chunks_to_block(chunks: Iterable[Tuple]) -> RecordBlock:
+    """Combine write-behind chunks of (timestamps, operations, xs, ys, results)."""
+    timestamps, operations, xs, ys, results = (
+        list(chain.from_iterable(column)) for column in zip(*chunks))
+    codes, names = encode_names(operations)
+    return RecordBlock(np.asarray(timestamps, dtype=np.int64), codes,
+                       np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64),
+                       np.asarray(results, dtype=np.float64), names)
+
+def take_block(block: RecordBlock, index: np.ndarray) -> RecordBlock:
+    """Select records of a block by position array or boolean mask."""
+    return RecordBlock(*(getattr(block, name)[index] for name in COLUMNS), block.operation_names)
+
+def sort_block(block: RecordBlock) -> RecordBlock:
+    """Order a block's records by timestamp, keeping the order of equal timestamps."""
+    if block.size < 2 or (np.diff(block.timestamp) >= 0).all():
+        return block
+    return take_block(block, np.argsort(block.timestamp, kind='stable'))
+
+def merge_blocks(streams: Sequence[Iterable[RecordBlock]]) -> Iterator[RecordBlock]:
+    """K-way merge of block streams that are each in timestamp order.
+
+    Every round emits, as one sorted block, the pending records of all
+    streams up to the smallest of their latest timestamps; the rest waits
+    for the next round. Memory is bounded by about one block per stream,
+    and on ties earlier streams come first.
+    """
+    iterators: List[Optional[Iterator[RecordBlock]]] = [iter(stream) for stream in streams]
+    pending = [empty_block()] * len(iterators)
+    while True:
+        for i, iterator in enumerate(iterators):
+            while iterator is not None and not pending[i].size:
+                block = next(iterator, None)
+                if block is None:
+                    iterators[i] = iterator = None
+                else:
+                    pending[i] = block
+        active = [i for i, block in enumerate(pending) if block.size]
+        if not active:
+            return
+        watermark = min(pending[i].timestamp.max() for i in active)
+        parts = []
+        for i in active:
+            ready = pending[i].timestamp <= watermark
+            parts.append(take_block(pending[i], ready))
+            pending[i] = take_block(pending[i], ~ready)
+        yield sort_block(concat_blocks(parts))
+
+def format_timestamps(timestamps: np.ndarray) -> np.ndarray:
+    """Format epoch-ns timestamps the way the history CSV stores them."""
+    text = np.datetime_as_string(np.asarray(timestamps, dtype=np.int64).view('datetime64[ns]').astype('datetime64[us]'))
+    if text.size == 0:
+        return text
+    return np.char.replace(text, 'T', ' ')
+
+def parse_timestamps(values: np.ndarray) -> np.ndarray:
+    """Parse timestamp strings from the history CSV into epoch-ns integers."""
+    try:
+        parsed = np.asarray(values, dtype=str).astype('datetime64[ns]')
+    except ValueError:
+        import pandas as pd
+        parsed = pd.to_datetime(pd.Series(values)).to_numpy().astype('datetime64[ns]')
+    return parsed.view(np.int64)
+
+def _parse_floats(values: Sequence[str]) -> np.ndarray:
+    """Parse CSV float fields, treating empty fields as NaN."""
+    return np.array([float(value) if value else math.nan for value in values], dtype=np.float64)
+
+class _BoundedReader:
+    """Binary file wrapper that stops reading at a byte offset."""
+
+    def __init__(self, file: BinaryIO, limit: int):
+        self._file = file
+        self._remaining = limit
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+class CsvHistoryFile:
+    """History stored as CSV text with the timestamp,operation,x,y,result columns.
+
+    Positions ("ends") in this format are byte offsets.
+    """
+
+    supports_views = False
+    # Longest operation name (in UTF-8 bytes) the format can store, if limited
+    max_operation_bytes: Optional[int] = None
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def end(self) -> int:
+        """Current end position of the file."""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def read_tail(self, end: int, rows: int) -> Tuple[RecordBlock, Optional[int]]:
+        """Read up to the last ``rows`` records before position ``end``.
+
+        Scans backwards from ``end`` with the csv module, without parsing
+        anything before the tail. Returns the records and the position
+        where they start, or None if they start right after the header.
+        """
+        with open(self.path, 'rb') as f:
+            header = next(csv.reader([f.readline().decode()]))
+            header_end = f.tell()
+            position = end
+            step = 65536
+            data = b''
+            while position > header_end and data.count(b'\n') <= rows:
+                step = min(step * 2, position - header_end)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+        lines = data.split(b'\n')
+        if lines and lines[-1] == b'':
+            lines.pop()
+        # The first line is partial unless the scan reached the header
+        first = 1 if position > header_end else 0
+        keep = max(first, len(lines) - rows)
+        start = position + sum(len(line) + 1 for line in lines[:keep])
+        records = list(csv.reader(line.decode() for line in lines[keep:]))
+        fields = {name: [record[i] for record in records] for i, name in enumerate(header)}
+        codes, names = encode_names(fields['operation'])
+        block = RecordBlock(parse_timestamps(np.array(fields['timestamp'])), codes,
+                            _parse_floats(fields['x']), _parse_floats(fields['y']),
+                            _parse_floats(fields['result']), names)
+        return block, start if start > header_end else None
+
+    def _frame_to_block(self, frame) -> RecordBlock:
+        """Convert a DataFrame read from the CSV into a record block."""
+        codes, names = encode_names(frame['operation'].to_numpy())
+        return RecordBlock(parse_timestamps(frame['timestamp'].to_numpy()), codes,
+                           frame['x'].to_numpy(dtype=np.float64),
+                           frame['y'].to_numpy(dtype=np.float64),
+                           frame['result'].to_numpy(dtype=np.float64), names)
+
+    def read(self, end: int) -> RecordBlock:
+        """Read every record before position ``end`` with pandas."""
+        import pandas as pd
+        with open(self.path, 'rb') as f:
+            return self._frame_to_block(pd.read_csv(_BoundedReader(f, end)))
+
+    def iter_blocks(self, chunk_size: int, stop: Optional[int] = None) -> Iterator[RecordBlock]:
+        """Stream the file (up to position stop) as blocks of at most chunk_size records."""
+        import pandas as pd
+        end = self.end() if stop is None else stop
+        if end == 0:
+            return
+        with open(self.path, 'rb') as f:
+            for frame in pd.read_csv(_BoundedReader(f, end), chunksize=chunk_size):
+                yield self._frame_to_block(frame)
+
+    def append(self, block: RecordBlock) -> None:
+        """Append records, writing the header first for a new file."""
+        write_header = self.end() == 0
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(COLUMNS)
+            writer.writerows(zip(format_timestamps(block.timestamp).tolist(), block.labels(),
+                                 block.x.tolist(), block.y.tolist(), block.result.tolist()))
+
+    def rewrite(self, block: RecordBlock) -> None:
+        """Replace the file with the given records."""
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', newline=''):
+            pass
+        CsvHistoryFile(temporary).append(block)
+        os.replace(temporary, self.path)
+
+MAGIC = b'CALCHIST'
+VERSION = 1
+HEADER_SIZE = 4096
+MAX_OPERATIONS = 256
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u2'),
+    ('record_size', '<u2'),
+    ('operation_count', '<u2'),
+    ('reserved', 'S2'),
+    ('operations', 'S8', (MAX_OPERATIONS,)),
+])
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('operation', 'u1'),
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('result', '<f8'),
+])
+
+class BinaryHistoryFile:
+    """History stored as fixed-width binary records behind a small header.
+
+    The 4096-byte header holds a magic string, the format version, the
+    record size and the operation name table (up to 256 names of at most 8
+    bytes). Each 33-byte record is an int64 timestamp, a uint8 operation
+    code and float64 x, y and result. Reads memory-map the records, so
+    views are zero-copy. Positions ("ends") in this format are record
+    counts.
+    """
+
+    supports_views = True
+    max_operation_bytes = 8
+
+    def __init__(self, path: str):
+        self.path = path
+        self._operation_names: Optional[List[str]] = None
+
+    def end(self) -> int:
+        """Number of complete records in the file."""
+        if not os.path.exists(self.path):
+            return 0
+        return max(os.path.getsize(self.path) - HEADER_SIZE, 0) // RECORD_DTYPE.itemsize
+
+    @property
+    def operation_names(self) -> List[str]:
+        """Operation name table from the file header."""
+        if self._operation_names is None:
+            self._operation_names = self._read_header() if os.path.exists(self.path) else []
+        return self._operation_names
+
+    def _read_header(self) -> List[str]:
+        """Read and validate the header, returning the operation names."""
+        with open(self.path, 'rb') as f:
+            data = f.read(HEADER_DTYPE.itemsize)
+        if len(data) < HEADER_DTYPE.itemsize:
+            raise ValueError(f"{self.path} is not a binary history file")
+        header = np.frombuffer(data, dtype=HEADER_DTYPE)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f"{self.path} is not a binary history file")
+        if header['version'] != VERSION or header['record_size'] != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Unsupported binary history version in {self.path}")
+        return [name.decode() for name in header['operations'][:header['operation_count']]]
+
+    @staticmethod
+    def _header_bytes(names: List[str]) -> bytes:
+        """Build a header for the given operation name table."""
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['version'] = VERSION
+        header['record_size'] = RECORD_DTYPE.itemsize
+        header['operation_count'] = len(names)
+        header['operations'][0, :len(names)] = [name.encode() for name in names]
+        return header.tobytes().ljust(HEADER_SIZE, b'\0')
+
+    def view(self, start: int = 0, stop: Optional[int] = None) -> RecordBlock:
+        """Memory-map records [start, stop) and return zero-copy column views."""
+        end = self.end()
+        start, stop, _ = slice(start, stop).indices(end)
+        if stop <= start:
+            block = empty_block()
+            return block._replace(operation_names=self.operation_names)
+        records = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r',
+                            offset=HEADER_SIZE + start * RECORD_DTYPE.itemsize,
+                            shape=(stop - start,))
+        return RecordBlock(records['timestamp'], records['operation'], records['x'],
+                           records['y'], records['result'], list(self.operation_names))
+
+    def read_tail(self, end: int, rows: int) -> Tuple[RecordBlock, Optional[int]]:
+        """Return the last ``rows`` records before record ``end`` and where they start."""
+        start = max(end - rows, 0)
+        return self.view(start, end), start or None
+
+    def read(self, end: int) -> RecordBlock:
+        """Return zero-copy views of every record before record ``end``."""
+        return self.view(0, end)
+
+    def iter_blocks(self, chunk_size: int, stop: Optional[int] = None) -> Iterator[RecordBlock]:
+        """Stream records (up to record stop) as blocks of at most chunk_size records."""
+        for _, block in self.scan(chunk_size, stop):
+            yield block
+
+    def scan(self, chunk_size: int, stop: Optional[int] = None, since: Optional[int] = None,
+             until: Optional[int] = None) -> Iterator[Tuple[int, RecordBlock]]:
+        """Yield (first record number, block) pairs for records before stop.
+
+        since and until are accepted for compatibility with segmented
+        storage, which uses them to skip whole segments.
+        """
+        end = self.end() if stop is None else min(stop, self.end())
+        for start in range(0, end, chunk_size):
+            yield start, self.view(start, min(start + chunk_size, end))
+
+    def append(self, block: RecordBlock) -> None:
+        """Append records, extending the header's operation table if needed."""
+        if self.end() == 0 and (not os.path.exists(self.path)
+                                or os.path.getsize(self.path) < HEADER_SIZE):
+            with open(self.path, 'wb') as f:
+                f.write(self._header_bytes([]))
+            self._operation_names = []
+        names = list(self.operation_names)
+        mapping = []
+        for name in block.operation_names:
+            if name not in names:
+                if len(name.encode()) > self.max_operation_bytes or len(names) == MAX_OPERATIONS:
+                    raise ValueError(f"Operation cannot be stored in binary history: {name}")
+                names.append(name)
+            mapping.append(names.index(name))
+        records = np.empty(block.size, dtype=RECORD_DTYPE)
+        records['timestamp'] = block.timestamp
+        records['operation'] = np.asarray(mapping, dtype=np.uint8)[block.operation] if mapping else 0
+        records['x'] = block.x
+        records['y'] = block.y
+        records['result'] = block.result
+        with open(self.path, 'r+b') as f:
+            if names != self.operation_names:
+                f.write(self._header_bytes(names))
+            # Drop any partial record left by an interrupted write
+            f.seek(HEADER_SIZE + self.end() * RECORD_DTYPE.itemsize)
+            f.truncate()
+            f.write(records.tobytes())
+        self._operation_names = names
+
+    def rewrite(self, block: RecordBlock) -> None:
+        """Replace the file with the given records.
+
+        The new file is written next to the old one and renamed over it, so
+        existing memory maps keep seeing the old records.
+        """
+        temporary = BinaryHistoryFile(self.path + '.tmp')
+        if os.path.exists(temporary.path):
+            os.remove(temporary.path)
+        temporary.append(block)
+        os.replace(temporary.path, self.path)
+        self._operation_names = temporary.operation_names
+
+class SegmentedHistoryFile:
+    """History split across binary segment files in a directory.
+
+    New records go to the last (active) segment; a new segment is started
+    once the active one holds segment_rows records or, with segment_seconds
+    set, spans that much time. Sealed segments are never modified except by
+    compact(), so their record counts and time ranges are cached, and
+    segments outside a requested time range are skipped without being
+    read. Positions ("ends") are record counts across all segments.
+    """
+
+    supports_views = True
+    max_operation_bytes = BinaryHistoryFile.max_operation_bytes
+
+    def __init__(self, path: str, segment_rows: int = 1_000_000,
+                 segment_seconds: Optional[float] = None):
+        """Open (without creating) a segment directory."""
+        if segment_rows < 1:
+            raise ValueError("Segments must hold at least one record")
+        self.path = path.rstrip('/' + os.sep) or path
+        self.segment_rows = segment_rows
+        self.segment_ns = None if not segment_seconds else int(segment_seconds * 1e9)
+        self._bounds: Dict[str, Tuple[int, int, int]] = {}
+        self._files: Dict[str, BinaryHistoryFile] = {}
+
+    def segments(self) -> List[BinaryHistoryFile]:
+        """Segment files, oldest first."""
+        paths = sorted(glob.glob(os.path.join(self.path, 'segment-*.bin')))
+        for path in paths:
+            if path not in self._files:
+                self._files[path] = BinaryHistoryFile(path)
+        return [self._files[path] for path in paths]
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.path, f'segment-{number:06d}.bin')
+
+    @staticmethod
+    def _number(segment: BinaryHistoryFile) -> int:
+        return int(os.path.basename(segment.path)[8:14])
+
+    def _layout(self) -> List[Tuple[BinaryHistoryFile, int, int]]:
+        """(segment, first record number, record count) for every segment."""
+        layout = []
+        offset = 0
+        for segment in self.segments():
+            count = segment.end()
+            layout.append((segment, offset, count))
+            offset += count
+        return layout
+
+    def _time_bounds(self, segment: BinaryHistoryFile, count: int) -> Tuple[int, int]:
+        """Minimum and maximum timestamp of a segment, cached while its size is unchanged."""
+        cached = self._bounds.get(segment.path)
+        if cached is None or cached[0] != count:
+            timestamps = segment.view(0, count).timestamp
+            cached = (count, int(timestamps.min()), int(timestamps.max()))
+            self._bounds[segment.path] = cached
+        return cached[1], cached[2]
+
+    def end(self) -> int:
+        """Total number of records in all segments."""
+        return sum(segment.end() for segment in self.segments())
+
+    def view(self, start: int = 0, stop: Optional[int] = None) -> RecordBlock:
+        """Records [start, stop) across segments (zero-copy within one segment)."""
+        layout = self._layout()
+        end = layout[-1][1] + layout[-1][2] if layout else 0
+        start, stop, _ = slice(start, stop).indices(end)
+        pieces = [segment.view(max(start - offset, 0), min(stop - offset, count))
+                  for segment, offset, count in layout
+                  if offset < stop and offset + count > start]
+        return concat_blocks(pieces)
+
+    def read_tail(self, end: int, rows: int) -> Tuple[RecordBlock, Optional[int]]:
+        """Return the last ``rows`` records before record ``end`` and where they start."""
+        start = max(end - rows, 0)
+        return self.view(start, end), start or None
+
+    def read(self, end: int) -> RecordBlock:
+        """Return every record before record ``end``."""
+        return self.view(0, end)
+
+    def iter_blocks(self, chunk_size: int, stop: Optional[int] = None) -> Iterator[RecordBlock]:
+        """Stream records (up to record stop) as blocks of at most chunk_size records."""
+        for _, block in self.scan(chunk_size, stop):
+            yield block
+
+    def scan(self, chunk_size: int, stop: Optional[int] = None, since: Optional[int] = None,
+             until: Optional[int] = None) -> Iterator[Tuple[int, RecordBlock]]:
+        """Yield (first record number, block) pairs for records before stop.
+
+        Segments whose time range lies outside [since, until) are skipped.
+        """
+        for segment, offset, count in self._layout():
+            count = count if stop is None else min(count, stop - offset)
+            if count <= 0:
+                break
+            if since is not None or until is not None:
+                first, last = self._time_bounds(segment, count)
+                if (since is not None and last < since) or (until is not None and first >= until):
+                    continue
+            for start in range(0, count, chunk_size):
+                yield offset + start, segment.view(start, min(start + chunk_size, count))
+
+    def append(self, block: RecordBlock) -> None:
+        """Append records, rotating to new segments by size or time."""
+        os.makedirs(self.path, exist_ok=True)
+        segments = self.segments()
+        active = segments[-1] if segments else None
+        position = 0
+        while position < block.size:
+            count = active.end() if active is not None else 0
+            if active is None or count >= self.segment_rows or (
+                    self.segment_ns is not None and count
+                    and block.timestamp[position] - active.view(0, 1).timestamp[0] >= self.segment_ns):
+                number = self._number(active) + 1 if active is not None else 1
+                active = self._files.setdefault(self._segment_path(number),
+                                                BinaryHistoryFile(self._segment_path(number)))
+                count = 0
+                logger.info("Started history segment %s", active.path)
+            stop = min(block.size, position + self.segment_rows - count)
+            if self.segment_ns is not None:
+                # Records spanning more than segment_seconds go to the next segment
+                first = active.view(0, 1).timestamp[0] if count else block.timestamp[position]
+                stop = position + max(int(np.searchsorted(block.timestamp[position:stop],
+                                                          first + self.segment_ns)), 1)
+            active.append(RecordBlock(*(getattr(block, name)[position:stop] for name in COLUMNS),
+                                      block.operation_names))
+            position = stop
+
+    def clear(self) -> None:
+        """Drop every segment; the cost depends on the number of segments, not records."""
+        for segment in self.segments():
+            os.remove(segment.path)
+        self._bounds.clear()
+        self._files.clear()
+
+    def rewrite(self, block: RecordBlock) -> None:
+        """Replace all segments with the given records."""
+        self.clear()
+        if block.size:
+            self.append(block)
+
+    def compact(self, downsample: Optional[int] = None, chunk_size: int = 1_000_000) -> int:
+        """Merge the sealed segments, optionally keeping only every downsample-th record.
+
+        The active segment is left alone. Merged segments hold up to
+        segment_rows records (or as many as the largest sealed segment) and
+        take over the numbers of the segments they replace, so ordering is
+        preserved. Returns the number of records removed.
+        """
+        if downsample is not None and downsample < 1:
+            raise ValueError("Downsampling factor must be at least 1")
+        sealed = self.segments()[:-1]
+        if not sealed:
+            return 0
+        before = sum(segment.end() for segment in sealed)
+        target = max([self.segment_rows] + [segment.end() for segment in sealed])
+        outputs: List[BinaryHistoryFile] = []
+        seen = 0
+        for segment in sealed:
+            for block in segment.iter_blocks(chunk_size):
+                if downsample is not None and downsample > 1:
+                    keep = np.flatnonzero((seen + np.arange(block.size)) % downsample == 0)
+                    seen += block.size
+                    block = RecordBlock(*(getattr(block, name)[keep] for name in COLUMNS),
+                                        block.operation_names)
+                position = 0
+                while position < block.size:
+                    if not outputs or outputs[-1].end() >= target:
+                        outputs.append(BinaryHistoryFile(
+                            os.path.join(self.path, f'compact-{len(outputs):06d}.tmp')))
+                        if os.path.exists(outputs[-1].path):
+                            os.remove(outputs[-1].path)
+                    stop = min(block.size, position + target - outputs[-1].end())
+                    outputs[-1].append(RecordBlock(*(getattr(block, name)[position:stop]
+                                                     for name in COLUMNS), block.operation_names))
+                    position = stop
+        for output, segment in zip(outputs, sealed):
+            os.replace(output.path, segment.path)
+        for segment in sealed[len(outputs):]:
+            os.remove(segment.path)
+        self._bounds.clear()
+        self._files.clear()
+        after = sum(output.end() for output in self.segments()[:len(outputs)])
+        logger.info("Compacted %d history segment(s) into %d", len(sealed), len(outputs))
+        return before - after
+
+class JsonLinesHistoryFile:
+    """History records as JSON lines, one object with the history columns per line.
+
+    Used for export and import. Positions ("ends") are byte offsets.
+    """
+
+    supports_views = False
+    # Longest operation name (in UTF-8 bytes) the format can store, if limited
+    max_operation_bytes: Optional[int] = None
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def end(self) -> int:
+        """Current end position of the file."""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    @staticmethod
+    def _lines_to_block(lines: List[bytes]) -> RecordBlock:
+        """Decode JSON lines into a record block."""
+        records = [json.loads(line) for line in lines]
+        codes, names = encode_names([record['operation'] for record in records])
+        return RecordBlock(parse_timestamps(np.array([record['timestamp'] for record in records])),
+                           codes, *(np.array([record[name] for record in records], dtype=np.float64)
+                                    for name in ('x', 'y', 'result')), names)
+
+    def iter_blocks(self, chunk_size: int, stop: Optional[int] = None) -> Iterator[RecordBlock]:
+        """Stream the file (up to position stop) as blocks of at most chunk_size records."""
+        end = self.end() if stop is None else stop
+        if end == 0:
+            return
+        with open(self.path, 'rb') as f:
+            lines: List[bytes] = []
+            position = 0
+            for line in f:
+                position += len(line)
+                if position > end:
+                    break
+                if line.strip():
+                    lines.append(line)
+                if len(lines) == chunk_size:
+                    yield self._lines_to_block(lines)
+                    lines = []
+            if lines:
+                yield self._lines_to_block(lines)
+
+    def read(self, end: int) -> RecordBlock:
+        """Read every record before position ``end``."""
+        return concat_blocks(list(self.iter_blocks(1_000_000, end)))
+
+    def append(self, block: RecordBlock) -> None:
+        """Append records as JSON lines."""
+        with open(self.path, 'a') as f:
+            f.writelines(json.dumps({'timestamp': timestamp, 'operation': operation,
+                                     'x': x, 'y': y, 'result': result}) + '\n'
+                         for timestamp, operation, x, y, result in zip(
+                             format_timestamps(block.timestamp).tolist(), block.labels(),
+                             block.x.tolist(), block.y.tolist(), block.result.tolist()))
+
+    def rewrite(self, block: RecordBlock) -> None:
+        """Replace the file with the given records."""
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w'):
+            pass
+        JsonLinesHistoryFile(temporary).append(block)
+        os.replace(temporary, self.path)
+
+def _complete_end(source) -> int:
+    """End position of the complete records of a file that may be being appended to."""
+    end = source.end()
+    if not isinstance(source, CsvHistoryFile) or end == 0:
+        return end
+    with open(source.path, 'rb') as f:
+        start = max(end - 65536, 0)
+        f.seek(start)
+        data = f.read(end - start)
+    return start + data.rfind(b'\n') + 1
+
+SHARD_DIRECTORY_SUFFIX = '.shards'
+
+class ShardedHistoryFile:
+    """History written by several processes: a main file plus one shard per writer.
+
+    Each writer appends only to its own shard file in <path>.shards/, so
+    processes sharing a history never overwrite each other and take no
+    lock to append. Reads k-way merge the main file and every shard by
+    timestamp. compact() folds the shards of writers that have exited
+    into the main file; a writer holds an flock on its shard while it is
+    open, which is how exited writers are told apart.
+
+    The main file and the shards are CSV or binary history files.
+    Positions ("ends") are tuples of (file, end) pairs, one per file with
+    records, or 0 when there are none.
+    """
+
+    supports_views = False
+
+    def __init__(self, path: str, storage: Optional[str] = None):
+        self.path = path
+        main = open_history_file(path, storage)
+        if isinstance(main, SegmentedHistoryFile):
+            raise ValueError("Sharded history requires CSV or binary storage")
+        self.storage = 'binary' if isinstance(main, BinaryHistoryFile) else 'csv'
+        self.max_operation_bytes = main.max_operation_bytes
+        self.directory = path + SHARD_DIRECTORY_SUFFIX
+        self.extension = '.bin' if self.storage == 'binary' else '.csv'
+        self._shard = None
+        self._shard_fd: Optional[int] = None
+        self._shard_pid: Optional[int] = None
+        self._state: Optional[Dict[str, Tuple[int, int, int]]] = None
+
+    def _open(self, path: str):
+        return open_history_file(path, self.storage)
+
+    def shard_paths(self) -> List[str]:
+        """Paths of the current shard files."""
+        return sorted(glob.glob(os.path.join(glob.escape(self.directory), 'shard-*' + self.extension)))
+
+    @contextmanager
+    def _locked(self, exclusive: bool = False) -> Iterator[None]:
+        """Hold the shard directory lock: shared to read, exclusive to fold or clear shards."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def _file_state(self) -> Dict[str, Tuple[int, int, int]]:
+        """Size, modification time and inode of the files written by others."""
+        own = self._shard.path if self._shard is not None else None
+        state = {}
+        for path in [self.path] + self.shard_paths():
+            if path != own and os.path.exists(path):
+                stat = os.stat(path)
+                state[path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return state
+
+    def changed(self) -> bool:
+        """Whether another process has written, folded or cleared records since end()."""
+        return self._file_state() != self._state
+
+    def end(self):
+        """Current (file, end) pairs of the main file and every shard with records."""
+        self._state = self._file_state()
+        ends = []
+        for path in [self.path] + self.shard_paths():
+            end = _complete_end(self._open(path))
+            if end:
+                ends.append((path, end))
+        return tuple(ends) or 0
+
+    def read_tail(self, end, rows: int):
+        """Return the last ``rows`` merged records before ``end`` and where they start."""
+        if not end:
+            return empty_block(), None
+        with self._locked():
+            sources = [(path, stop, self._open(path)) for path, stop in end]
+            tails = [source.read_tail(stop, rows) for _, stop, source in sources]
+            blocks = [block for block, _ in tails]
+            origin = np.repeat(np.arange(len(blocks)), [block.size for block in blocks])
+            order = np.argsort(np.concatenate([block.timestamp for block in blocks]),
+                               kind='stable')[-rows:] if rows else np.empty(0, dtype=np.int64)
+            kept = np.bincount(origin[order], minlength=len(blocks))
+            starts = []
+            for (path, stop, source), (block, start), count in zip(sources, tails, kept):
+                if count < block.size:
+                    start = source.read_tail(stop, count)[1] if count else stop
+                if start:
+                    starts.append((path, start))
+        tail = take_block(concat_blocks(blocks), order) if len(order) else empty_block()
+        return tail, tuple(starts) or None
+
+    def read(self, end) -> RecordBlock:
+        """Read and merge every record before ``end``."""
+        if not end:
+            return empty_block()
+        with self._locked():
+            return sort_block(concat_blocks([self._open(path).read(stop) for path, stop in end]))
+
+    def iter_blocks(self, chunk_size: int, stop=None) -> Iterator[RecordBlock]:
+        """Stream the merged records (up to stop) as blocks in timestamp order."""
+        with self._locked():
+            end = self.end() if stop is None else stop
+            yield from merge_blocks([self._open(path).iter_blocks(chunk_size, position)
+                                     for path, position in end or ()])
+
+    def _open_shard(self) -> None:
+        """Create this process's shard file and hold its lock while it is in use."""
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory,
+                            f"shard-{os.getpid()}-{os.urandom(4).hex()}{self.extension}")
+        self._shard_fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(self._shard_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._shard = self._open(path)
+        self._shard_pid = os.getpid()
+        logger.info("Writing history shard %s", path)
+
+    def append(self, block: RecordBlock) -> None:
+        """Append records to this process's shard, creating it if needed."""
+        if (self._shard is None or self._shard_pid != os.getpid()
+                or not os.path.exists(self._shard.path)):
+            self._open_shard()
+        self._shard.append(block)
+
+    def rewrite(self, block: RecordBlock) -> None:
+        """Replace the main file with the given records and remove every shard.
+
+        Raises ValueError, leaving the files untouched, while another
+        process still holds its shard: removing it would lose that
+        writer's records.
+        """
+        own = self._shard.path if self._shard is not None else None
+        with self._locked(exclusive=True):
+            paths, locks = self.shard_paths(), []
+            try:
+                for path in paths:
+                    if path == own or fcntl is None:
+                        continue
+                    fd = self._exited_writer(path)
+                    if fd is None and os.path.exists(path):
+                        raise ValueError(f"History shard is still being written: {path}")
+                    if fd is not None:
+                        locks.append(fd)
+                self._open(self.path).rewrite(block)
+                for path in paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.close()
+            finally:
+                for fd in locks:
+                    os.close(fd)
+
+    def _exited_writer(self, path: str) -> Optional[int]:
+        """Lock a shard whose writer has exited, returning the lock's descriptor."""
+        if fcntl is None:
+            return None
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+            return None
+
+    def live_shards(self) -> List[str]:
+        """Return the shards of other processes that are still writing."""
+        own = self._shard.path if self._shard is not None else None
+        live = []
+        if fcntl is None:
+            return live
+        for path in self.shard_paths():
+            if path == own:
+                continue
+            fd = self._exited_writer(path)
+            if fd is not None:
+                os.close(fd)
+            elif os.path.exists(path):
+                live.append(path)
+        return live
+
+    def compact(self, include_own: bool = False, chunk_size: int = 1_000_000) -> int:
+        """Fold the shards of exited writers (and this process's, with include_own) into the main file.
+
+        The main file and the folded shards are merged in chunks into a new
+        main file, which then replaces the old one. Returns the number of
+        shards folded.
+        """
+        own = self._shard.path if self._shard is not None else None
+        with self._locked(exclusive=True):
+            folded, locks = [], []
+            try:
+                for path in self.shard_paths():
+                    if path == own:
+                        if include_own:
+                            folded.append(path)
+                        continue
+                    fd = self._exited_writer(path)
+                    if fd is not None:
+                        locks.append(fd)
+                        folded.append(path)
+                if not folded:
+                    return 0
+                temporary = os.path.join(self.directory, 'compacting' + self.extension)
+                target = self._open(temporary)
+                target.rewrite(empty_block())
+                streams = []
+                for path in [self.path] + folded:
+                    source = self._open(path)
+                    end = _complete_end(source)
+                    if end:
+                        streams.append(source.iter_blocks(chunk_size, end))
+                for block in merge_blocks(streams):
+                    target.append(block)
+                os.replace(temporary, self.path)
+                for path in folded:
+                    os.remove(path)
+                if own in folded:
+                    self.close()
+            finally:
+                for fd in locks:
+                    os.close(fd)
+        logger.info("Folded %d history shard(s) into %s", len(folded), self.path)
+        return len(folded)
+
+    def close(self) -> None:
+        """Release this process's shard (it is left for compaction to fold)."""
+        if self._shard_fd is not None:
+            os.close(self._shard_fd)
+        self._shard = self._shard_fd = self._shard_pid = None
+
+BINARY_EXTENSIONS = ('.bin', '.calh')
+SEGMENTED_EXTENSIONS = ('.d', '/', os.sep)
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+def open_history_file(path: str, storage: Optional[str] = None, **options):
+    """Open a history file in the given format ('csv', 'binary' or 'segmented').
+
+    Without an explicit format, existing directories and paths ending in
+    .d or a separator are segmented, files ending in .bin or .calh are
+    binary and everything else is CSV. options are passed to
+    SegmentedHistoryFile (segment_rows, segment_seconds).
+    """
+    if storage is None:
+        if os.path.isdir(path) or path.endswith(SEGMENTED_EXTENSIONS):
+            storage = 'segmented'
+        else:
+            storage = 'binary' if path.endswith(BINARY_EXTENSIONS) else 'csv'
+    if storage == 'csv':
+        return CsvHistoryFile(path)
+    if storage == 'binary':
+        return BinaryHistoryFile(path)
+    if storage == 'segmented':
+        return SegmentedHistoryFile(path, **options)
+    raise ValueError(f"Unknown history storage format: {storage}")
+
+def open_transfer_file(path: str, file_format: Optional[str] = None, **options):
+    """Open a file for history export or import.
+
+    file_format is 'jsonl' or any open_history_file() format; without one,
+    files ending in .jsonl or .ndjson are JSON lines and anything else is
+    chosen by open_history_file().
+    """
+    if file_format == 'jsonl' or (file_format is None and path.endswith(JSON_LINES_EXTENSIONS)):
+        return JsonLinesHistoryFile(path)
+    return open_history_file(path, file_format, **options)
+
+def convert_history(source: str, destination: str, chunk_size: int = 1_000_000) -> int:
+    """Convert a history file between formats in fixed-size chunks.
+
+    The formats are chosen from the file extensions (see
+    open_history_file). Returns the number of records converted.
+    """
+    reader = open_history_file(source)
+    writer = open_history_file(destination)
+    writer.rewrite(empty_block())
+    count = 0
+    for block in reader.iter_blocks(chunk_size):
+        writer.append(block)
+        count += block.size
+    logger.info("Converted %d record(s) from %s to %s", count, source, destination)
+    return count
@@ -0,0 +1,151 @@
+"""Write-behind buffering for calculation history persistence."""
+
+import atexit
+import logging
+import threading
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_LEVELS = ('sync', 'batched', 'on-exit')
+
+class WriteBehindWriter:
+    """Queues history records and writes them to storage in batches.
+
+    Durability levels:
+      - ``sync``: every record is written on the caller's thread.
+      - ``batched``: a background thread writes once ``batch_size`` records
+        are pending or ``flush_interval`` seconds have passed.
+      - ``on-exit``: records are only written by flush()/close(), which is
+        also registered to run at interpreter exit.
+
+    A batch whose write fails is not retried: its records are moved to
+    ``failed`` and the error is raised to the caller, by flush() (or
+    close()) for batches written in the background.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Any]], None], durability: str = 'sync',
+                 batch_size: int = 1000, flush_interval: float = 1.0):
+        """Initialize the writer around a batch write function."""
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        self.write_batch = write_batch
+        self.durability = durability
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: List[Any] = []
+        self._pending_count = 0
+        self.failed: List[Any] = []
+        self._error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._io_lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = None
+        if durability == 'batched':
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+        if durability != 'sync':
+            atexit.register(self.close)
+        logger.info("History writer started with %s durability", durability)
+
+    @property
+    def pending(self) -> int:
+        """Number of records waiting to be written."""
+        return self._pending_count
+
+    def submit(self, record: Any, count: int = 1) -> None:
+        """Queue a record, writing it immediately in sync mode.
+
+        ``count`` is the number of history rows the record carries, so bulk
+        chunks count towards the batch size row by row.
+        """
+        if self.durability == 'sync' or self._closed:
+            with self._io_lock:
+                self.write_batch([record])
+            return
+        with self._lock:
+            self._pending.append(record)
+            self._pending_count += count
+            if self._pending_count >= self.batch_size:
+                self._wakeup.notify()
+
+    def flush(self) -> None:
+        """Write all pending records on the caller's thread.
+
+        Raises the error of a failed write, including one from a background
+        write since the last flush.
+        """
+        with self._io_lock:
+            self._write_pending()
+            with self._lock:
+                error, self._error = self._error, None
+            if error is not None:
+                raise error
+
+    def _write_pending(self) -> None:
+        """Write all pending records, setting the batch aside in failed if the write fails."""
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                count, self._pending_count = self._pending_count, 0
+            if not batch:
+                return
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                logger.error("Error writing history batch, %d record(s) set aside: %s", count, e)
+                with self._lock:
+                    self.failed.extend(batch)
+                raise
+            logger.info("Flushed %d pending history record(s)", count)
+
+    def flush_and_run(self, action: Callable[[], Any]) -> Any:
+        """Write all pending records, then run action before any later batch is written."""
+        with self._io_lock:
+            self.flush()
+            return action()
+
+    def discard_and_run(self, action: Callable[[], None]) -> None:
+        """Drop pending records and run action while no batch is being written.
+
+        Used for full rewrites of the history file, which already include
+        every pending record.
+        """
+        with self._io_lock:
+            with self._lock:
+                self._pending = []
+                self._pending_count = 0
+            action()
+
+    def close(self) -> None:
+        """Stop the background thread and write any remaining records."""
+        if self._closed:
+            return
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            if self.durability != 'sync':
+                atexit.unregister(self.close)
+            logger.info("History writer closed")
+
+    def _run(self) -> None:
+        """Background loop flushing full batches or on the flush interval."""
+        while True:
+            with self._lock:
+                if not self._closed and self._pending_count < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self._write_pending()
+            except Exception as e:
+                with self._lock:
+                    self._error = e
@@ -0,0 +1,74 @@
+"""Test suite for the streaming batch mode."""
+
+import io
+import json
+import pytest
+from calculator.__main__ import parse_args
+from calculator.batch import run_batch, parse_commands, read_lines
+from calculator.core import Calculator
+from calculator.history import CalculationHistory
+from calculator.plugins import register_plugin_operations
+
+@pytest.fixture
+def calc(tmp_path):
+    """Calculator with plugin operations and a temporary history file."""
+    calculator = Calculator()
+    calculator.history = CalculationHistory(str(tmp_path / "history.csv"))
+    register_plugin_operations(calculator)
+    return calculator
+
+def test_parse_commands():
+    """Test parsing skips comments and flags invalid lines."""
+    source = io.StringIO("add 1 2\n\n# comment\nsqrt 9\nadd 1\nfoo 1 2\n")
+    commands = list(parse_commands(read_lines(source)))
+    assert [(c.operation, c.x, c.y) for c in commands[:2]] == [('+', 1, 2), ('sqrt', 9, 0)]
+    assert commands[2].error.startswith("Invalid input")
+    assert commands[3].error == "Unknown command: foo"
+
+def test_batch_csv_output(calc):
+    """Test CSV output keeps input order across chunks."""
+    source = io.StringIO("add 1 2\ndivide 1 0\nmultiply 2 3\npow 2 10\nsqrt 16\n")
+    output = io.StringIO()
+    rows, errors = run_batch(source, output, 'csv', chunk_size=2, calculator=calc)
+    assert (rows, errors) == (5, 1)
+    lines = output.getvalue().splitlines()
+    assert lines[0] == 'command,x,y,result,error'
+    assert lines[1] == 'add,1.0,2.0,3.0,'
+    assert lines[2] == 'divide,1.0,0.0,,Cannot divide by zero'
+    assert lines[3:] == ['multiply,2.0,3.0,6.0,', 'pow,2.0,10.0,1024.0,', 'sqrt,16.0,0.0,4.0,']
+
+def test_batch_jsonl_output_and_history(calc):
+    """Test JSON lines output and that results are committed to history."""
+    source = io.StringIO("add 1 2\nsqrt -1\n")
+    output = io.StringIO()
+    run_batch(source, output, 'jsonl', calculator=calc)
+    rows = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert rows[0] == {'command': 'add', 'x': 1, 'y': 2, 'result': 3, 'error': None}
+    assert rows[1]['result'] is None
+    assert rows[1]['error'] == "Cannot calculate square root of negative number"
+    assert list(calc.history.get_history()['operation']) == ['+']
+
+def test_invalid_format(calc):
+    """Test unknown output formats are rejected."""
+    with pytest.raises(ValueError):
+        run_batch(io.StringIO(""), io.StringIO(), 'xml', calculator=calc)
+
+def test_invalid_chunk_size(calc):
+    """Test chunk sizes below 1 are rejected by run_batch and the command line."""
+    for chunk_size in (0, -1):
+        with pytest.raises(ValueError):
+            run_batch(io.StringIO("add 1 2\n"), io.StringIO(), chunk_size=chunk_size, calculator=calc)
+        with pytest.raises(SystemExit):
+            parse_args(['--batch', '--chunk-size', str(chunk_size)])
+
+def test_batch_parallel_matches_serial(calc):
+    """Test the process pool keeps input order and records every chunk."""
+    text = "".join(f"add {i} 1\ndivide {i} 0\nsqrt {i}\n" for i in range(30))
+    serial, parallel = io.StringIO(), io.StringIO()
+    run_batch(io.StringIO(text), serial, chunk_size=7, calculator=calc)
+    recorded = len(calc.history.get_history())
+    assert run_batch(io.StringIO(text), parallel, chunk_size=7, calculator=calc, workers=2) == (90, 30)
+    assert parallel.getvalue() == serial.getvalue()
+    history = calc.history.get_history()
+    assert len(history) == 2 * recorded
+    assert list(history['x'][recorded:]) == list(history['x'][:recorded])
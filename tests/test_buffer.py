@@ -0,0 +1,108 @@
+"""Test suite for the columnar history buffer."""
+
+import numpy as np
+import pytest
+from calculator.buffer import HistoryBuffer
+
+def _fill(buffer, count, start=0):
+    """Append count sequential records to the buffer."""
+    for i in range(start, start + count):
+        buffer.append(i, '+', i, 1, i + 1)
+
+def test_geometric_growth():
+    """Test capacity doubles as records are appended."""
+    buffer = HistoryBuffer(capacity=4)
+    _fill(buffer, 9)
+    assert len(buffer) == 9
+    assert buffer.capacity == 16
+    assert list(buffer.columns()['x']) == list(range(9))
+
+def test_extend_encodes_operations():
+    """Test bulk appends with operation codes."""
+    buffer = HistoryBuffer(capacity=2)
+    codes = buffer.encode_operations(['+', '/', '+'])
+    buffer.extend(np.arange(3), codes, np.ones(3), np.ones(3), np.ones(3))
+    frame = buffer.to_frame()
+    assert list(frame['operation']) == ['+', '/', '+']
+    assert buffer.operation_names == ['+', '/']
+
+def test_ring_buffer_keeps_last_records():
+    """Test ring mode keeps only the most recent records."""
+    buffer = HistoryBuffer(maxlen=4)
+    _fill(buffer, 6)
+    assert len(buffer) == 4
+    assert buffer.dropped == 2
+    assert list(buffer.columns()['x']) == [2, 3, 4, 5]
+    assert list(buffer.columns(1, 3)['x']) == [3, 4]
+    assert list(buffer.to_frame().index) == [2, 3, 4, 5]
+
+def test_ring_buffer_extend_wraps():
+    """Test bulk appends wrap around the ring."""
+    buffer = HistoryBuffer(maxlen=5)
+    _fill(buffer, 3)
+    codes = buffer.encode_operations(['*'] * 4)
+    buffer.extend(np.arange(3, 7), codes, np.arange(3, 7), np.ones(4), np.ones(4))
+    assert list(buffer.columns()['x']) == [2, 3, 4, 5, 6]
+    buffer.extend(np.arange(7, 15), buffer.encode_operations(['*'] * 8),
+                  np.arange(7, 15), np.ones(8), np.ones(8))
+    assert list(buffer.columns()['x']) == [10, 11, 12, 13, 14]
+    assert buffer.dropped == 10
+
+def test_invalid_ring_size():
+    """Test ring buffers need room for at least one record."""
+    with pytest.raises(ValueError):
+        HistoryBuffer(maxlen=0)
+
+def test_select_uses_indexes():
+    """Test operation, time and value filters with the maintained indexes."""
+    buffer = HistoryBuffer(capacity=2)
+    _fill(buffer, 10)
+    buffer.extend(np.arange(10, 14), buffer.encode_operations(['/', '+', '/', '*']),
+                  np.arange(10.0, 14), np.ones(4), np.arange(10.0, 14))
+    assert list(buffer.select(['/'])) == [10, 12]
+    assert list(buffer.select(['/', '*'], since=11)) == [12, 13]
+    assert list(buffer.select(since=3, until=6)) == [3, 4, 5]
+    assert list(buffer.select(['+'], conditions=[('result', '>', 5)], limit=2)) == [9, 11]
+    assert list(buffer.select(['missing'])) == []
+    with pytest.raises(ValueError):
+        buffer.select(conditions=[('timestamp', '>', 1)])
+
+def test_select_unsorted_and_ring():
+    """Test time filters without sorted timestamps and in ring mode."""
+    buffer = HistoryBuffer()
+    for timestamp in [5, 1, 7, 3]:
+        buffer.append(timestamp, '+', timestamp, 0, timestamp)
+    assert not buffer.time_sorted
+    assert list(buffer.select(since=3, until=7)) == [0, 3]
+    buffer.extend(np.array([6, 2, 4]), buffer.encode_operations(['/', '+', '/']),
+                  np.zeros(3), np.zeros(3), np.zeros(3))
+    buffer.append(0, '/', 0, 0, 0)
+    assert list(buffer.select(since=2, until=6)) == [0, 3, 5, 6]
+    assert list(buffer.select(['/'], since=4)) == [4, 6]
+    assert list(buffer.select(['/'], until=1)) == [7]
+    order, keys = buffer._time_index()
+    assert list(keys) == sorted(keys) and list(buffer.timestamp[order]) == list(keys)
+    ring = HistoryBuffer(maxlen=3)
+    _fill(ring, 5)
+    assert list(ring.select(['+'], since=3)) == [1, 2]
+    assert list(ring.take(np.array([0]))['x']) == [2]
+
+def test_compact_dtypes_and_memory_usage():
+    """Test the frame schema, the float32 option and the memory report."""
+    buffer = HistoryBuffer(capacity=4, dtype=np.float32)
+    _fill(buffer, 4)
+    buffer.append(4, '/', 0.1, 1, 0.1)
+    frame = buffer.to_frame()
+    assert str(frame['timestamp'].dtype) == 'datetime64[ns]'
+    assert str(frame['operation'].dtype) == 'category'
+    assert list(frame['operation'].cat.categories) == ['+', '/']
+    assert frame['x'].dtype == np.float32
+    assert frame['x'].iloc[-1] == np.float32(0.1)
+    usage = buffer.memory_usage()
+    assert usage['rows'] == 5 and usage['capacity'] == 8
+    assert usage['columns'] == {'timestamp': 64, 'operation': 8, 'x': 32, 'y': 32, 'result': 32}
+    assert usage['total_bytes'] == 168 + usage['index_bytes']
+    assert usage['record_bytes'] == 21
+    assert HistoryBuffer(dtype='float64').memory_usage()['value_dtype'] == 'float64'
+    with pytest.raises(ValueError):
+        HistoryBuffer(dtype=np.int32)
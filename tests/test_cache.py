@@ -0,0 +1,58 @@
+"""Test suite for the result cache."""
+
+import pytest
+from calculator.cache import LRUCache
+from calculator.core import Calculator
+from calculator.history import CalculationHistory
+
+def test_lru_eviction():
+    """Test the least recently used entry is evicted first."""
+    cache = LRUCache(2)
+    calls = []
+    compute = lambda x: calls.append(x) or x * 10
+    cache.get_or_compute('a', compute, 1)
+    cache.get_or_compute('b', compute, 2)
+    assert cache.get_or_compute('a', compute, 1) == 10
+    cache.get_or_compute('c', compute, 3)
+    cache.get_or_compute('b', compute, 2)
+    assert calls == [1, 2, 3, 2]
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 4
+    assert cache.stats()['evictions'] == 2
+
+def test_disabled_cache_stores_nothing():
+    """Test a zero-size cache always computes."""
+    cache = LRUCache(0)
+    assert cache.get_or_compute('a', abs, -1) == 1
+    assert len(cache) == 0
+    assert not cache.stats()['enabled']
+
+def test_resize_and_clear():
+    """Test shrinking evicts entries and clear resets counters."""
+    cache = LRUCache(3)
+    for key in range(3):
+        cache.get_or_compute(key, abs, key)
+    cache.resize(1)
+    assert len(cache) == 1
+    cache.clear()
+    assert cache.stats()['evictions'] == 0
+    with pytest.raises(ValueError):
+        cache.resize(-1)
+
+def test_exceptions_are_not_cached():
+    """Test failed computations are retried."""
+    cache = LRUCache(4)
+    with pytest.raises(ZeroDivisionError):
+        cache.get_or_compute('x', lambda: 1 / 0)
+    assert len(cache) == 0
+
+def test_calculator_cache_hits_are_recorded(tmp_path):
+    """Test cached results are still added to history."""
+    calc = Calculator(cache_size=8)
+    calc.history = CalculationHistory(str(tmp_path / "history.csv"))
+    assert calc.calculate('+', 2, 3) == 5
+    assert calc.calculate('+', 2, 3) == 5
+    assert calc.cache.stats()['hits'] == 1
+    assert calc.history.get_statistics()['total_calculations'] == 2
+    with pytest.raises(ValueError):
+        calc.calculate('/', 1, 0)
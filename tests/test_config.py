@@ -0,0 +1,50 @@
+"""Test suite for logging configuration."""
+
+import logging
+from calculator import config
+
+def _record(level=logging.INFO):
+    """Build a log record at the given level."""
+    return logging.LogRecord('calculator.core', level, __file__, 1, "msg %s", (1,), None)
+
+def test_sampling_filter_rate():
+    """Test the sampling filter keeps the configured fraction of records."""
+    sampler = config.SamplingFilter(0.25)
+    kept = sum(sampler.filter(_record()) for _ in range(100))
+    assert kept == 25
+
+def test_sampling_filter_keeps_warnings():
+    """Test warnings and errors are never sampled out."""
+    sampler = config.SamplingFilter(0.0)
+    assert not sampler.filter(_record())
+    assert sampler.filter(_record(logging.ERROR))
+
+def test_async_logging(tmp_path, monkeypatch):
+    """Test the queue-based pipeline writes records from the listener thread."""
+    log_file = tmp_path / "calculator.log"
+    monkeypatch.setenv('CALCULATOR_LOG_FILE', str(log_file))
+    monkeypatch.setenv('CALCULATOR_LOG_ASYNC', '1')
+    monkeypatch.setenv('CALCULATOR_OP_LOG_LEVEL', 'INFO')
+    try:
+        config.setup_logging(console=False)
+        assert config.operation_log_level() == logging.INFO
+        root = logging.getLogger()
+        assert isinstance(root.handlers[0], config.DeferredQueueHandler)
+        logging.getLogger('calculator.core').info("Adding %s and %s", 2, 3)
+    finally:
+        config._stop_queue_listener()
+        logging.getLogger().handlers.clear()
+    assert "Adding 2 and 3" in log_file.read_text()
+
+def test_unknown_operation_log_level(tmp_path, monkeypatch):
+    """Test an unknown CALCULATOR_OP_LOG_LEVEL falls back to DEBUG with a warning."""
+    log_file = tmp_path / "calculator.log"
+    monkeypatch.setenv('CALCULATOR_LOG_FILE', str(log_file))
+    monkeypatch.setenv('CALCULATOR_OP_LOG_LEVEL', 'verbose')
+    try:
+        config.setup_logging(console=False)
+        assert config.operation_log_level() == logging.DEBUG
+        logging.getLogger('calculator.core').log(config.operation_log_level(), "Adding")
+    finally:
+        logging.getLogger().handlers.clear()
+    assert "Unknown CALCULATOR_OP_LOG_LEVEL VERBOSE, using DEBUG" in log_file.read_text()
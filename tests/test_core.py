@@ -1,7 +1,9 @@
 """Test suite for core calculator functionality."""
 
+import numpy as np
 import pytest
 from calculator.core import Calculator
+from calculator.history import CalculationHistory
 
 def test_calculator_initialization():
     """Test calculator initialization and operations dictionary."""
@@ -54,4 +56,62 @@ def test_invalid_operation():
     """Test invalid operation raises ValueError."""
     calc = Calculator()
     with pytest.raises(ValueError):
-        calc.calculate('^', 2, 3)
\ No newline at end of file
+        calc.calculate('^', 2, 3)
+
+@pytest.fixture
+def batch_calc(tmp_path):
+    """Calculator writing its history to a temporary file."""
+    calc = Calculator()
+    calc.history = CalculationHistory(str(tmp_path / "history.csv"))
+    return calc
+
+def test_calculate_many_mixed_operations(batch_calc):
+    """Test bulk calculation with one operation per element."""
+    batch = batch_calc.calculate_many(['+', '-', '*', '/'], [2, 5, 2, 6], [3, 3, 3, 2])
+    assert list(batch.results) == [5, 2, 6, 3]
+    assert not batch.errors.any()
+    history = batch_calc.history.get_history()
+    assert list(history['operation']) == ['+', '-', '*', '/']
+    assert list(history['result']) == [5, 2, 6, 3]
+
+def test_calculate_many_single_operation(batch_calc):
+    """Test bulk calculation broadcasting a single operation and operand."""
+    batch = batch_calc.calculate_many('*', np.arange(5), 2)
+    assert list(batch.results) == [0, 2, 4, 6, 8]
+    assert batch_calc.history.get_statistics()['operations_count'] == {'*': 5}
+
+def test_calculate_many_division_by_zero(batch_calc):
+    """Test division by zero is reported per element."""
+    batch = batch_calc.calculate_many('/', [6, 1, 4], [2, 0, 4])
+    assert list(batch.errors) == [False, True, False]
+    assert np.isnan(batch.results[1])
+    assert list(batch_calc.history.get_history()['result']) == [3, 1]
+    
+    with pytest.raises(ValueError):
+        batch_calc.calculate_many('/', [1], [0], zero_division='raise')
+    assert len(batch_calc.history.get_history()) == 2
+
+def test_calculate_many_invalid_operation(batch_calc):
+    """Test unknown operations abort the batch."""
+    with pytest.raises(ValueError):
+        batch_calc.calculate_many(['+', '^'], [1, 2], [3, 4])
+    assert len(batch_calc.history.get_history()) == 0
+
+def test_calculate_many_workers(batch_calc):
+    """Test chunked process-pool evaluation matches the serial result."""
+    operations = ['+', '/', '*'] * 10
+    xs = np.arange(30.0)
+    batch = batch_calc.calculate_many(operations, xs, xs % 3, workers=2, chunk_size=4)
+    serial = batch_calc.calculate_many(operations, xs, xs % 3)
+    assert np.array_equal(batch.results, serial.results, equal_nan=True)
+    assert np.array_equal(batch.errors, serial.errors)
+    history = batch_calc.history.get_history()
+    assert len(history) == 2 * int((~serial.errors).sum())
+
+def test_evaluate_power_without_plugins(batch_calc):
+    """Test ^ and ** work in expressions without the scientific plugin."""
+    assert 'pow' not in batch_calc.functions
+    assert batch_calc.evaluate("2^3") == 8
+    assert batch_calc.evaluate("2 ** x", {'x': 10}) == 1024
+    with pytest.raises(OverflowError):
+        batch_calc.evaluate("10 ^ 400")
@@ -0,0 +1,67 @@
+"""Test suite for the expression engine."""
+
+import math
+import pytest
+from calculator.core import Calculator
+from calculator.expression import CompiledExpression, parse
+from calculator.plugins import scientific
+
+@pytest.fixture
+def calc():
+    """Calculator with the scientific expression functions registered."""
+    calculator = Calculator()
+    scientific.register_operations(calculator)
+    return calculator
+
+@pytest.mark.parametrize("expression, expected", [
+    ("1 + 2 * 3", 7),
+    ("(1 + 2) * 3", 9),
+    ("8 / 4 / 2", 1),
+    ("-2 ^ 2", -4),
+    ("2 ^ 3 ^ 2", 512),
+    ("2 ** 3", 8),
+    ("sqrt(16) + pow(2, 10)", 1028),
+    ("1.5e2 - .5", 149.5),
+])
+def test_evaluate(calc, expression, expected):
+    """Test operator precedence, associativity and functions."""
+    assert calc.evaluate(expression) == expected
+
+def test_variables(calc):
+    """Test variables are bound at evaluation time."""
+    assert calc.evaluate("sqrt(x*x + y*y)", {'x': 3, 'y': 4}) == 5
+    assert calc.compile("a - b").variables == ['a', 'b']
+
+def test_compiled_expressions_are_cached(calc):
+    """Test an expression is compiled once per text."""
+    first = calc.compile("x + 1")
+    assert calc.compile("x + 1") is first
+    assert [first({'x': x}) for x in range(3)] == [1, 2, 3]
+    assert calc.expressions.stats()['hits'] == 1
+
+def test_evaluate_is_not_recorded(calc):
+    """Test expressions do not add calculations to history."""
+    before = calc.history.get_statistics()['total_calculations']
+    calc.evaluate("2 * 3")
+    assert calc.history.get_statistics()['total_calculations'] == before
+
+@pytest.mark.parametrize("expression, variables", [
+    ("1 / 0", None),
+    ("sqrt(-1)", None),
+    ("2 +", None),
+    ("(1 + 2", None),
+    ("1 $ 2", None),
+    ("unknown(1)", None),
+    ("pow(2)", None),
+    ("x + 1", {}),
+])
+def test_errors(calc, expression, variables):
+    """Test invalid expressions and failed evaluations raise ValueError."""
+    with pytest.raises(ValueError):
+        calc.evaluate(expression, variables)
+
+def test_parse_tree():
+    """Test the parser output for a small expression."""
+    assert parse("-a * 2") == ('binary', '*', ('neg', ('name', 'a')), ('number', 2.0))
+    assert CompiledExpression("max(1, 2)", {'max': max})() == 2
+    assert math.isclose(CompiledExpression("a/3", {})({'a': 1}), 1 / 3)
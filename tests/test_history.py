@@ -66,4 +66,156 @@ def test_persistence(history):
     
     new_history = CalculationHistory("test_history.csv")
     assert len(new_history.history) == 1
-    assert new_history.history.iloc[0]['operation'] == '+'
\ No newline at end of file
+    assert new_history.history.iloc[0]['operation'] == '+'
+
+def test_append_only_persistence(history):
+    """Test that new calculations are appended without rewriting the file."""
+    history.add_calculation('+', 2, 3, 5)
+    with open("test_history.csv") as f:
+        first = f.read()
+    history.add_calculation('*', 4, 5, 20)
+    with open("test_history.csv") as f:
+        second = f.read()
+    assert second.startswith(first)
+    assert second.count('\n') == first.count('\n') + 1
+    
+    new_history = CalculationHistory("test_history.csv")
+    assert list(new_history.history['operation']) == ['+', '*']
+    assert list(new_history.history['result']) == [5, 20]
+    assert new_history.history['timestamp'].equals(history.history['timestamp'])
+
+def test_compact(history):
+    """Test compaction rewrites the file from memory."""
+    history.add_calculation('+', 2, 3, 5)
+    history.add_calculation('-', 5, 3, 2)
+    history.compact()
+    
+    new_history = CalculationHistory("test_history.csv")
+    assert len(new_history.history) == 2
+    history.clear_history()
+    assert len(CalculationHistory("test_history.csv").history) == 0
+
+def test_float32_compact_keeps_full_precision(tmp_path):
+    """Test float32 history rewrites the file from its full-precision records."""
+    path = str(tmp_path / "history.csv")
+    history = CalculationHistory(path, value_dtype='float32', durability='on-exit', max_records=2)
+    history.add_calculation('+', 1, 1, 2)
+    history.add_calculation('/', 1, 3, 1 / 3)
+    history.add_calculation('*', 2, 0.1, 0.2)
+    history.compact()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 3
+    assert lines[1].endswith(',/,1.0,3.0,0.3333333333333333')
+    assert lines[2].endswith(',*,2.0,0.1,0.2')
+    assert list(CalculationHistory(path)._buffer.columns()['result']) == [1 / 3, 0.2]
+    exported = str(tmp_path / "export.jsonl")
+    assert history.export_history(exported, since='2000-01-01') == 2
+    target = CalculationHistory(str(tmp_path / "target.csv"))
+    target.import_history(exported)
+    assert list(target.history['result']) == [1 / 3, 0.2]
+    history.close()
+    with pytest.raises(ValueError):
+        CalculationHistory(path, value_dtype='float32', append_only=False)
+
+def test_history_ring_buffer():
+    """Test max_records keeps only the most recent calculations in memory."""
+    hist = CalculationHistory("test_history.csv", max_records=2)
+    try:
+        for i in range(4):
+            hist.add_calculation('+', i, 1, i + 1)
+        assert list(hist.get_history()['x']) == [2, 3]
+        assert len(CalculationHistory("test_history.csv").history) == 4
+    finally:
+        os.remove("test_history.csv")
+
+def test_statistics_rebuilt_on_load(history):
+    """Test statistics are rebuilt from the file and reset by clear."""
+    history.add_calculation('+', 2, 3, 5)
+    history.add_calculation('/', 8, 2, 4)
+    
+    reloaded = CalculationHistory("test_history.csv")
+    assert reloaded.get_statistics() == history.get_statistics()
+    stats = reloaded.get_statistics(extended=True)
+    assert stats['operation_means'] == {'+': 5, '/': 4}
+    
+    reloaded.clear_history()
+    assert reloaded.get_statistics()['total_calculations'] == 0
+
+def test_deferred_loading(history):
+    """Test only the tail is read at startup and the rest loads on demand."""
+    for i in range(10):
+        history.add_calculation('+', i, 1, i + 1)
+    
+    lazy = CalculationHistory("test_history.csv", tail_rows=3)
+    assert len(lazy._buffer) == 3
+    assert list(lazy.get_history(2)['x']) == [8, 9]
+    lazy.add_calculation('-', 10, 1, 9)
+    assert lazy.get_statistics()['total_calculations'] == 11
+    assert list(lazy.history['x']) == list(range(11))
+
+def test_query(history):
+    """Test indexed queries by operation, time range and result."""
+    history.add_calculations(['+', '/', '+', '*'], [1, 8, 3, 4], [1, 2, 3, 4], [2, 4, 6, 16])
+    assert list(history.query('+')['result']) == [2, 6]
+    frame = history.query(['+', '*'], conditions=[('result', '>', 3)], limit=5)
+    assert list(frame['result']) == [6, 16]
+    assert list(frame.index) == [2, 3]
+    assert len(history.query(since='2000-01-01', until='2000-01-02')) == 0
+    assert len(history.query(since='2000-01-01')) == 4
+
+def test_export_import(history, tmp_path):
+    """Test chunked export with filters and import of the exported files."""
+    for i in range(10):
+        history.add_calculation('+' if i % 2 else '/', i, 1, i)
+    lazy = CalculationHistory("test_history.csv", tail_rows=3)
+    csv_path = str(tmp_path / "export.csv")
+    jsonl_path = str(tmp_path / "export.jsonl")
+    assert lazy.export_history(csv_path, chunk_size=4) == 10
+    assert lazy.export_history(jsonl_path, chunk_size=4, operations='+',
+                               conditions=[('x', '>', 2)]) == 4
+    assert lazy._unloaded_end is not None
+    
+    target = CalculationHistory(str(tmp_path / "target.csv"))
+    assert target.import_history(jsonl_path, chunk_size=3) == 4
+    assert target.import_history(csv_path) == 10
+    assert list(target.history['x']) == [3, 5, 7, 9] + list(range(10))
+    assert list(target.history['timestamp'])[4:] == list(history.history['timestamp'])
+    assert target.get_statistics()['operations_count'] == {'+': 9, '/': 5}
+
+    # The import is out of timestamp order: time ranges use the time index
+    since = history.history['timestamp'].iloc[5]
+    assert not target._buffer.time_sorted
+    assert list(target.query(since=since)['x']) == [5, 7, 9, 5, 6, 7, 8, 9]
+    assert list(target.query('+', until=since)['x']) == [3, 1, 3]
+    target.add_calculation('*', 10, 1, 10)
+    assert list(target.query(since=since)['x']) == [5, 7, 9, 5, 6, 7, 8, 9, 10]
+
+def test_thread_safe_history(tmp_path):
+    """Stress test: many threads calculating at once lose no records."""
+    from concurrent.futures import ThreadPoolExecutor
+    from calculator.core import Calculator
+    path = str(tmp_path / "threads.csv")
+    history = CalculationHistory(path, thread_safe=True, batch_size=50)
+    calculator = Calculator(cache_size=16, history=history)
+    threads, calls = 8, 500
+
+    def work(thread):
+        for i in range(calls):
+            calculator.calculate('+' if i % 2 else '*', thread, i)
+        calculator.calculate_many('-', [thread] * 10, range(10))
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, range(threads)))
+    frame = history.history
+    assert len(frame) == threads * (calls + 10)
+    assert frame['timestamp'].is_monotonic_increasing
+    assert history.get_statistics()['operations_count'] == {
+        '+': threads * calls // 2, '*': threads * calls // 2, '-': threads * 10}
+    for thread in range(threads):
+        rows = frame[(frame['x'] == thread) & (frame['operation'] != '-')]
+        assert sorted(rows['y']) == list(range(calls))
+    history.close()
+    assert len(CalculationHistory(path).history) == threads * (calls + 10)
+    with pytest.raises(ValueError):
+        CalculationHistory(path, append_only=False, thread_safe=True)
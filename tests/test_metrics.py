@@ -0,0 +1,69 @@
+"""Test suite for the instrumentation registry."""
+
+import json
+import pytest
+from calculator.metrics import BUCKETS, Histogram, MetricsRegistry, instrumented, metrics
+
+@pytest.fixture
+def enabled_metrics():
+    """Enable the global registry for one test."""
+    previous = metrics.enabled
+    metrics.enabled = True
+    metrics.reset()
+    yield metrics
+    metrics.enabled = previous
+    metrics.reset()
+
+def test_histogram_quantiles():
+    """Test quantiles land on the bucket holding the rank."""
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.observe(2e-6)
+    for _ in range(10):
+        histogram.observe(0.5)
+    assert histogram.count == 100
+    assert 2e-6 <= histogram.quantile(0.5) <= 2e-6 * 10 ** 0.25
+    assert histogram.quantile(0.99) == 0.5
+    assert histogram.buckets[-1] == 0
+    histogram.observe(100)
+    assert histogram.buckets[-1] == 1
+
+def test_instrumented_records_only_when_enabled(enabled_metrics):
+    """Test the decorator records calls and errors while enabled."""
+    @instrumented('test.call')
+    def call(fail=False):
+        if fail:
+            raise ValueError("boom")
+        return 1
+
+    assert call() == 1
+    with pytest.raises(ValueError):
+        call(fail=True)
+    summary = enabled_metrics.to_dict()['metrics']['test.call']
+    assert (summary['count'], summary['errors']) == (2, 1)
+    enabled_metrics.enabled = False
+    call()
+    assert enabled_metrics.histograms['test.call'].count == 2
+
+def test_calculator_and_commands_instrumented(enabled_metrics, tmp_path, monkeypatch):
+    """Test calculate and REPL commands, including plugin ones, are timed."""
+    from calculator.repl import CalculatorREPL
+    monkeypatch.setenv('CALCULATOR_HISTORY_FILE', str(tmp_path / "history.csv"))
+    repl = CalculatorREPL()
+    repl.onecmd('add 1 2')
+    repl.onecmd('pow 2 3')
+    names = set(enabled_metrics.histograms)
+    assert {'calculate', 'command.add', 'command.pow', 'plugins.load'} <= names
+
+def test_export_formats(tmp_path):
+    """Test JSON and Prometheus exports."""
+    registry = MetricsRegistry(enabled=True)
+    registry.observe('calculate', 3e-6)
+    registry.export(str(tmp_path / "m.json"))
+    assert json.loads((tmp_path / "m.json").read_text())['metrics']['calculate']['count'] == 1
+    registry.export(str(tmp_path / "m.prom"), 'prometheus')
+    text = (tmp_path / "m.prom").read_text()
+    assert 'calculator_latency_seconds_bucket{name="calculate",le="+Inf"} 1' in text
+    assert text.count('calculator_latency_seconds_bucket{name="calculate"') == len(BUCKETS) + 1
+    with pytest.raises(ValueError):
+        registry.export(str(tmp_path / "m.xml"), 'xml')
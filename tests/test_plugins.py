@@ -2,6 +2,8 @@
 
 import pytest
 import math
+from calculator.core import Calculator
+from calculator.history import CalculationHistory
 from calculator.repl import CalculatorREPL
 from calculator.plugins import scientific
 
@@ -44,4 +46,55 @@ def test_negative_square_root():
     scientific.register_commands(repl)
     
     with pytest.raises(ValueError):
-        math.sqrt(-1)
\ No newline at end of file
+        math.sqrt(-1)
+
+def test_parse_values():
+    """Test array arguments: lists, inclusive ranges and linspace."""
+    assert list(scientific.parse_values("1 4,9")) == [1, 4, 9]
+    assert list(scientific.parse_values("0..3")) == [0, 1, 2, 3]
+    assert list(scientific.parse_values("1..0:-0.5")) == [1, 0.5, 0]
+    assert list(scientific.parse_values("linspace(0,1,3) 5")) == [0, 0.5, 1, 5]
+    for text in ["", "3..1", "0..1:0", "abc"]:
+        with pytest.raises(ValueError):
+            scientific.parse_values(text)
+
+def test_array_commands(tmp_path, monkeypatch, capsys):
+    """Test array sqrt/pow and reductions record their rows in bulk."""
+    monkeypatch.setenv('CALCULATOR_HISTORY_FILE', str(tmp_path / "history.csv"))
+    repl = CalculatorREPL()
+    repl.onecmd("sqrt 1 4 9 -1")
+    repl.onecmd("pow 2 0..3")
+    repl.onecmd("sum 1..100")
+    repl.onecmd("norm 3 4")
+    output = capsys.readouterr().out
+    assert "Results (4 values): [ 1.,  2.,  3., nan]" in output
+    assert "Result: 5050.0" in output and "Result: 5.0" in output
+    history = repl.calculator.history.history
+    assert list(history['operation']) == ['sqrt'] * 3 + ['pow'] * 4 + ['sum', 'norm']
+    assert list(history['result']) == [1, 2, 3, 1, 2, 4, 8, 5050, 5]
+    assert list(history['x'])[-2:] == [100, 2]
+
+def test_pow_overflow(tmp_path):
+    """Test vectorized pow flags overflow like math.pow instead of recording inf."""
+    calc = Calculator(history=CalculationHistory(str(tmp_path / "history.csv")))
+    scientific.register_operations(calc)
+    with pytest.raises(OverflowError):
+        calc.calculate('pow', 10, 400)
+    batch = calc.calculate_many('pow', [10, 0, 2], [400, -1, 3])
+    assert list(batch.errors) == [True, True, False]
+    assert list(calc.history.history['result']) == [8]
+    with pytest.raises(ValueError):
+        calc.calculate_many('pow', [10], [400], zero_division='raise')
+
+def test_reductions_go_through_calculator(tmp_path):
+    """Test reductions are registered with the calculator and recorded by Calculator.reduce."""
+    calc = Calculator(history=CalculationHistory(str(tmp_path / "history.csv")))
+    scientific.register_operations(calc)
+    assert set(calc.registry.reductions) == set(scientific.REDUCTIONS)
+    assert calc.reduce('sum', scientific.parse_values("1..4")) == 10
+    assert calc.reduce('norm', [3, 4]) == 5
+    with pytest.raises(ValueError):
+        calc.reduce('median', [1, 2])
+    history = calc.history.history
+    assert list(history['operation']) == ['sum', 'norm']
+    assert list(history['x']) == [4, 2] and list(history['result']) == [10, 5]
@@ -0,0 +1,90 @@
+"""Test suite for the shared memory registers."""
+
+import multiprocessing
+import numpy as np
+import pytest
+from calculator.registers import SharedRegisters, open_registers
+from calculator.repl import CalculatorREPL
+
+def _store_from_child(path):
+    """Store registers from another process."""
+    registers = SharedRegisters(path)
+    for i in range(100):
+        registers['counter'] = float(i)
+    registers['ones'] = np.ones(3)
+
+@pytest.fixture
+def registers(tmp_path):
+    """A small register file."""
+    registers = SharedRegisters(str(tmp_path / "registers.mem"), slots=8, data_bytes=1024)
+    yield registers
+    registers.close()
+
+def test_scalars_and_arrays(registers):
+    """Test storing, recalling and deleting scalars and arrays."""
+    registers['x'] = 1.5
+    registers['v'] = [1, 2, 3]
+    assert registers['x'] == 1.5
+    view = registers['v']
+    assert list(view) == [1, 2, 3] and not view.flags.writeable
+    registers['v'] = [7, 8]
+    assert list(view[:2]) == [7, 8]
+    assert list(registers.get_array('x')) == [1.5]
+    snapshot = registers.get_array('v', copy=True)
+    registers['v'] = np.arange(10.0)
+    assert list(snapshot) == [7, 8]
+    assert list(registers['v']) == list(range(10))
+    assert dict(registers).keys() == {'v', 'x'}
+    del registers['x']
+    assert 'x' not in registers and len(registers) == 1
+    with pytest.raises(KeyError):
+        registers['x']
+    registers['x'] = 2.0
+    assert registers['x'] == 2.0
+
+def test_limits(registers):
+    """Test name length, table and data area limits."""
+    with pytest.raises(ValueError):
+        registers['n' * 33] = 1.0
+    with pytest.raises(ValueError):
+        registers['big'] = np.zeros(200)
+    for i in range(8):
+        registers[f'r{i}'] = float(i)
+    with pytest.raises(ValueError):
+        registers['extra'] = 1.0
+    registers.clear()
+    assert len(registers) == 0
+    registers['big'] = np.zeros(128)
+
+def test_shared_between_processes(registers):
+    """Test values stored by another process are visible, and persist."""
+    process = multiprocessing.get_context('fork').Process(target=_store_from_child,
+                                                          args=(registers.path,))
+    process.start()
+    process.join()
+    assert registers['counter'] == 99.0
+    assert list(registers['ones']) == [1, 1, 1]
+    reopened = SharedRegisters(registers.path)
+    assert reopened.slots == 8 and reopened['counter'] == 99.0
+    reopened.close()
+
+def test_memory_plugin_uses_registers(tmp_path, monkeypatch, capsys):
+    """Test the memory commands use shared registers when configured."""
+    path = str(tmp_path / "registers.mem")
+    monkeypatch.setenv('CALCULATOR_HISTORY_FILE', str(tmp_path / "history.csv"))
+    monkeypatch.setenv('CALCULATOR_MEMORY_FILE', path)
+    monkeypatch.setenv('CALCULATOR_MEMORY_DATA_MB', '1')
+    repl = CalculatorREPL()
+    assert isinstance(repl.memory, SharedRegisters)
+    repl.onecmd("store a 3")
+    repl.onecmd("store v 1 2 3")
+    repl.onecmd("eval a * 2")
+    assert "Result: 6.0" in capsys.readouterr().out
+    other = open_registers()
+    assert other['a'] == 3.0 and list(other['v']) == [1, 2, 3]
+    other.close()
+    repl.onecmd(f"store {'n' * 100} 1")
+    output = capsys.readouterr().out
+    assert "Register names must be" in output and "Format" not in output
+    repl.onecmd("store a")
+    assert "Invalid input. Format: store NAME VALUE" in capsys.readouterr().out
@@ -0,0 +1,58 @@
+"""Test suite for the operation registry."""
+
+import io
+import math
+import numpy as np
+import pytest
+from calculator.batch import run_batch
+from calculator.core import Calculator
+from calculator.history import CalculationHistory
+from calculator.registry import OperationRegistry
+from calculator.repl import CalculatorREPL
+
+@pytest.fixture
+def calc(tmp_path):
+    """Calculator with a temporary history file."""
+    return Calculator(cache_size=8, history=CalculationHistory(str(tmp_path / "history.csv")))
+
+def test_register_updates_tables():
+    """Test registration fills every dispatch table."""
+    registry = OperationRegistry()
+    registry.register('neg', lambda x: -x, arity=1, command='negate')
+    assert registry.resolve('negate') == ('neg', 1) == registry.resolve('neg')
+    assert registry.operations['neg'](2.0, 0.0) == -2.0
+    assert list(registry.vector_operations['neg'](np.array([1.0, 2.0]), np.zeros(2))) == [-1, -2]
+    assert registry.functions['neg'](3.0) == -3.0
+    assert registry['neg'].usage == 'negate X'
+    assert registry.errors['neg'] == "Invalid operands for neg"
+    with pytest.raises(ValueError):
+        registry.resolve('missing')
+    with pytest.raises(ValueError):
+        registry.register('bad', abs, arity=3)
+
+def test_core_operations(calc):
+    """Test the core operations are registered with their commands."""
+    assert [operation.command for operation in calc.registry] == ['add', 'subtract', 'multiply', 'divide']
+    assert set(calc.operations) == {'+', '-', '*', '/'}
+    assert calc.functions == {}
+
+def test_plugin_operation_everywhere(calc, capsys):
+    """Test a registered operation works in calculate, bulk, batch and the REPL."""
+    calc.registry.register('hypot', math.hypot, description="Hypotenuse: hypot X Y")
+    assert calc.calculate('hypot', 3, 4) == 5.0
+    assert calc.calculate('hypot', 3, 4) == 5.0
+    assert calc.cache.stats()['hits'] == 1
+    assert list(calc.calculate_many('hypot', [6, 5], [8, 12]).results) == [10, 13]
+    output = io.StringIO()
+    assert run_batch(io.StringIO("hypot 1 0\nhypot 1\n"), output, calculator=calc) == (2, 1)
+    assert calc.evaluate("hypot(3, 4)") == 5.0
+    assert list(calc.history.history['operation']) == ['hypot'] * 5
+
+    repl = CalculatorREPL()
+    repl.calculator = calc
+    repl._install_operation_commands()
+    repl.onecmd("hypot 5 12")
+    repl.onecmd("hypot 5")
+    output = capsys.readouterr().out
+    assert "Result: 13.0" in output and "Format: hypot X Y" in output
+    assert CalculatorREPL.do_hypot.__doc__ == "Hypotenuse: hypot X Y"
@@ -0,0 +1,30 @@
+"""Test suite for the REPL."""
+
+import pytest
+from calculator.repl import CalculatorREPL, parse_history_query
+
+def test_parse_history_query():
+    """Test the history filter syntax."""
+    assert parse_history_query("10") == {'conditions': [], 'limit': 10}
+    query = parse_history_query("op=/,add since=2025-03-10 result>100 x<=2 limit=50")
+    assert query == {'operations': ['/', '+'], 'since': '2025-03-10', 'limit': 50,
+                     'conditions': [('result', '>', 100.0), ('x', '<=', 2.0)]}
+
+@pytest.mark.parametrize("arg", ["abc", "op>1", "color=red", "result>big"])
+def test_parse_history_query_errors(arg):
+    """Test invalid filters raise ValueError."""
+    with pytest.raises(ValueError):
+        parse_history_query(arg)
+
+def test_quit_reports_failed_flush(tmp_path, monkeypatch, capsys):
+    """Test quit reports a failure to save history and still exits."""
+    monkeypatch.setenv('CALCULATOR_HISTORY_FILE', str(tmp_path / "history.csv"))
+    repl = CalculatorREPL()
+    
+    def fail():
+        raise OSError("disk full")
+    
+    monkeypatch.setattr(repl.calculator.history, 'close', fail)
+    assert repl.onecmd("quit") is True
+    output = capsys.readouterr().out
+    assert "Error: could not save history: disk full" in output and "Goodbye!" in output
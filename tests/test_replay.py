@@ -0,0 +1,72 @@
+"""Test suite for history replay and verification."""
+
+import os
+import numpy as np
+import pytest
+from calculator.__main__ import run
+from calculator.core import Calculator
+from calculator.history import CalculationHistory
+from calculator.plugins import register_plugin_operations
+from calculator.replay import format_report, replay_blocks, replay_history
+from calculator.repl import CalculatorREPL
+from calculator.storage import chunks_to_block
+
+@pytest.fixture
+def calc(tmp_path):
+    """Calculator with plugin operations and a few recorded calculations."""
+    calculator = Calculator(history=CalculationHistory(str(tmp_path / "history.csv")))
+    register_plugin_operations(calculator)
+    calculator.calculate('+', 1, 2)
+    calculator.calculate('/', 1, 3)
+    calculator.calculate('pow', 2, 10)
+    calculator.calculate('sqrt', 2, 0)
+    calculator.history.add_calculation('sum', 3, 0, 6)
+    calculator.history.add_calculation('*', 3, 3, 10)
+    return calculator
+
+def test_replay_history(calc, tmp_path):
+    """Test replay flags wrong results, skips reductions and records nothing."""
+    size = os.path.getsize(calc.history.history_file)
+    report = replay_history(calc)
+    assert report.to_dict() == {'checked': 5, 'mismatched': 1, 'skipped': 1,
+                                'mismatches_by_operation': {'*': 1},
+                                'skipped_by_operation': {'sum': 1}}
+    frame = report.mismatch_frame()
+    assert list(frame.index) == [5] and list(frame['replayed']) == [9.0]
+    assert os.path.getsize(calc.history.history_file) == size
+    assert len(calc.history.history) == 6
+
+    exported = str(tmp_path / "export.jsonl")
+    calc.history.export_history(exported)
+    assert replay_history(calc, exported, chunk_size=2).to_dict() == report.to_dict()
+    assert replay_history(calc, calc.history.history_file, rtol=0.2).ok
+    assert "Mismatches: * (1)" in format_report(report)
+
+def test_replay_blocks_tolerance_and_limits(tmp_path):
+    """Test the tolerance, NaN results and the kept mismatch rows."""
+    count = 1000
+    xs = np.arange(count, dtype=np.float64)
+    results = xs + 1
+    results[::100] += 1e-6
+    block = chunks_to_block([(range(count), ['+'] * count, xs, np.ones(count), results),
+                             ([0], ['/'], [1.0], [0.0], [np.nan])])
+    calculator = Calculator(history=CalculationHistory(str(tmp_path / "history.csv")))
+    report = replay_blocks([block, block], calculator.vector_operations, max_rows=15)
+    assert report.checked == 2002 and report.mismatched == 20
+    assert len(report.mismatch_frame()) == 15
+    assert replay_blocks([block], calculator.vector_operations, rtol=1e-6).ok
+
+def test_replay_command_and_cli(calc, capsys, monkeypatch):
+    """Test the replay REPL command and the --replay flag."""
+    monkeypatch.setenv('CALCULATOR_HISTORY_FILE', calc.history.history_file)
+    repl = CalculatorREPL()
+    repl.calculator = calc
+    repl.onecmd("replay")
+    output = capsys.readouterr().out
+    assert "Replayed 5 calculation(s): 1 mismatch(es)" in output
+    assert "sum (1)" in output
+    repl.onecmd("replay a b")
+    assert "Format: replay" in capsys.readouterr().out
+    calc.history.flush()
+    assert run(['--replay']) == 1
+    assert run(['--replay', calc.history.history_file, '--rtol', '0.2']) == 0
@@ -0,0 +1,66 @@
+"""Test suite for the JSON-lines calculation server."""
+
+import json
+import asyncio
+import pytest
+from calculator.core import Calculator
+from calculator.history import CalculationHistory
+from calculator.plugins import register_plugin_operations
+from calculator.server import CalculationServer
+
+@pytest.fixture
+def server(tmp_path):
+    """Server around a calculator with a batched temporary history."""
+    calculator = Calculator(history=CalculationHistory(str(tmp_path / "history.csv"),
+                                                       durability='batched'))
+    register_plugin_operations(calculator)
+    yield CalculationServer(calculator)
+    calculator.history.close()
+
+def _exchange(server, requests, path=None):
+    """Pipeline request lines over one connection and return the responses."""
+    async def run():
+        listener = await server.start(port=0, path=path)
+        async with listener:
+            if path is None:
+                reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+            else:
+                reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b''.join(line + b'\n' for line in requests))
+            responses = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+            return responses
+    return asyncio.run(run())
+
+def test_pipelined_requests(server):
+    """Test many in-flight requests are answered in order with their ids."""
+    requests = [json.dumps({'id': i, 'operation': 'multiply', 'operands': [i, 2]}).encode()
+                for i in range(200)]
+    responses = _exchange(server, requests)
+    assert responses == [{'id': i, 'result': i * 2} for i in range(200)]
+    server.calculator.history.flush()
+    assert server.calculator.history.get_statistics()['total_calculations'] == 200
+
+def test_request_variants(server):
+    """Test symbols, plugin operations, expressions and request_id echoing."""
+    responses = _exchange(server, [
+        b'{"id": "a", "operation": "/", "operands": [1, 4]}',
+        b'{"request_id": "b", "operation": "sqrt", "operands": [9]}',
+        b'{"id": "c", "expression": "x ^ 2", "variables": {"x": 3}}',
+    ])
+    assert responses == [{'id': 'a', 'result': 0.25}, {'request_id': 'b', 'result': 3.0},
+                         {'id': 'c', 'result': 9.0}]
+
+def test_errors(server, tmp_path):
+    """Test bad requests get error responses without closing the connection."""
+    responses = _exchange(server, [
+        b'not json',
+        b'{"id": 1, "operation": "divide", "operands": [1, 0]}',
+        b'{"id": 2, "operation": "add", "operands": [1]}',
+        b'{"id": 3, "operation": "modulo", "operands": [1, 2]}',
+        b'{"id": 4, "operation": "add", "operands": [1, 2]}',
+    ], path=str(tmp_path / "calc.sock"))
+    assert responses[0]['id'] is None and 'error' in responses[0]
+    assert responses[1] == {'id': 1, 'error': 'Cannot divide by zero'}
+    assert 'error' in responses[2] and 'error' in responses[3]
+    assert responses[4] == {'id': 4, 'result': 3.0}
@@ -0,0 +1,68 @@
+"""Test suite for running calculation statistics."""
+
+import math
+import numpy as np
+import pytest
+from calculator.stats import RunningStats
+
+def _assert_same(first, second):
+    """Assert two statistics dicts match, allowing rounding differences."""
+    first, second = first.to_dict(extended=True), second.to_dict(extended=True)
+    assert first['operations_count'] == second['operations_count']
+    assert first['operation_means'] == pytest.approx(second['operation_means'])
+    for key in ['total_calculations', 'average_result', 'max_result',
+                'min_result', 'result_variance']:
+        assert first[key] == pytest.approx(second[key], nan_ok=True)
+
+def test_empty_statistics():
+    """Test aggregates of an empty history."""
+    stats = RunningStats().to_dict()
+    assert stats['total_calculations'] == 0
+    assert stats['operations_count'] == {}
+    assert math.isnan(stats['average_result'])
+
+def test_incremental_matches_numpy():
+    """Test incremental aggregates match a full recomputation."""
+    rng = np.random.default_rng(42)
+    values = rng.normal(100, 25, 1000)
+    stats = RunningStats()
+    for i, value in enumerate(values):
+        stats.add('+' if i % 3 else '*', float(value))
+    result = stats.to_dict(extended=True)
+    assert result['total_calculations'] == 1000
+    assert result['operations_count'] == {'+': 666, '*': 334}
+    assert result['average_result'] == pytest.approx(values.mean())
+    assert result['result_variance'] == pytest.approx(values.var(ddof=1))
+    assert result['max_result'] == values.max()
+    assert result['min_result'] == values.min()
+    assert result['operation_means']['*'] == pytest.approx(values[::3].mean())
+
+def test_add_many_matches_add():
+    """Test the vectorized update matches per-record updates."""
+    values = np.array([5.0, 7.0, 2.0, np.nan])
+    codes = np.array([0, 0, 1, 1])
+    bulk = RunningStats()
+    bulk.add_many(['+', '-'], codes, values)
+    single = RunningStats()
+    for code, value in zip(codes, values):
+        single.add(['+', '-'][code], float(value))
+    _assert_same(bulk, single)
+
+def test_merge():
+    """Test merging two sets of aggregates."""
+    first, second, both = RunningStats(), RunningStats(), RunningStats()
+    for value in [1.0, 2.0, 3.0]:
+        first.add('+', value)
+        both.add('+', value)
+    for value in [10.0, 20.0]:
+        second.add('/', value)
+        both.add('/', value)
+    first.merge(second)
+    _assert_same(first, both)
+
+def test_compensated_sum():
+    """Test the running sum does not lose small values next to large ones."""
+    stats = RunningStats()
+    for value in [1e16, 1.0, -1e16] * 10:
+        stats.add('+', value)
+    assert stats.mean == pytest.approx(10 / 30)
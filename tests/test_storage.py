@@ -0,0 +1,276 @@
+"""Test suite for the history file formats."""
+
+import multiprocessing
+import numpy as np
+import pytest
+from calculator.history import CalculationHistory
+from calculator.storage import (BinaryHistoryFile, CsvHistoryFile, HEADER_SIZE, RECORD_DTYPE,
+                                SegmentedHistoryFile, ShardedHistoryFile, chunks_to_block,
+                                convert_history, merge_blocks, open_history_file)
+
+def _block(count, start=0):
+    """Build a block of count sequential '+' and '/' records."""
+    values = list(range(start, start + count))
+    operations = ['+' if i % 2 else '/' for i in values]
+    return chunks_to_block([(values, operations, values, [1.0] * count, values)])
+
+def test_open_history_file_by_extension(tmp_path):
+    """Test the format is chosen from the file extension."""
+    assert isinstance(open_history_file(str(tmp_path / "h.csv")), CsvHistoryFile)
+    assert isinstance(open_history_file(str(tmp_path / "h.bin")), BinaryHistoryFile)
+    assert isinstance(open_history_file(str(tmp_path / "h.csv"), 'binary'), BinaryHistoryFile)
+    assert isinstance(open_history_file(str(tmp_path / "h.d")), SegmentedHistoryFile)
+    with pytest.raises(ValueError):
+        open_history_file(str(tmp_path / "h.csv"), 'xml')
+
+def test_binary_append_and_view(tmp_path):
+    """Test binary records round-trip through the memory map."""
+    storage = BinaryHistoryFile(str(tmp_path / "h.bin"))
+    storage.append(_block(3))
+    storage.append(chunks_to_block([([3], ['pow'], [2.0], [3.0], [8.0])]))
+    assert RECORD_DTYPE.itemsize == 33
+    assert storage.end() == 4
+    view = storage.view(2)
+    assert list(view.x) == [2, 2]
+    assert list(view.labels()) == ['/', 'pow']
+    reopened = BinaryHistoryFile(storage.path)
+    assert reopened.operation_names == ['+', '/', 'pow']
+    assert list(reopened.read(4).timestamp) == [0, 1, 2, 3]
+
+def test_binary_ignores_partial_record(tmp_path):
+    """Test a torn trailing record is ignored and overwritten on append."""
+    storage = BinaryHistoryFile(str(tmp_path / "h.bin"))
+    storage.append(_block(2))
+    with open(storage.path, 'ab') as f:
+        f.write(b'\x01' * 10)
+    assert storage.end() == 2
+    storage.append(_block(1, 2))
+    assert list(storage.view().x) == [0, 1, 2]
+    assert (tmp_path / "h.bin").stat().st_size == HEADER_SIZE + 3 * RECORD_DTYPE.itemsize
+
+def test_binary_rejects_other_files(tmp_path):
+    """Test a CSV file is not mistaken for binary history."""
+    path = tmp_path / "h.bin"
+    path.write_text("timestamp,operation,x,y,result\n" * 100)
+    with pytest.raises(ValueError):
+        BinaryHistoryFile(str(path)).operation_names
+
+def test_convert_round_trip(tmp_path):
+    """Test CSV -> binary -> CSV conversion preserves the records."""
+    csv_path, bin_path, back_path = (str(tmp_path / name) for name in ("a.csv", "b.bin", "c.csv"))
+    CsvHistoryFile(csv_path).append(_block(25))
+    assert convert_history(csv_path, bin_path, chunk_size=10) == 25
+    assert convert_history(bin_path, back_path, chunk_size=7) == 25
+    original = CsvHistoryFile(csv_path).read(CsvHistoryFile(csv_path).end())
+    converted = CsvHistoryFile(back_path).read(CsvHistoryFile(back_path).end())
+    for name in ('timestamp', 'x', 'y', 'result'):
+        assert np.array_equal(getattr(original, name), getattr(converted, name))
+    assert list(original.labels()) == list(converted.labels())
+
+def test_binary_history(tmp_path):
+    """Test CalculationHistory on a binary file, including deferred reads."""
+    path = str(tmp_path / "history.bin")
+    history = CalculationHistory(path)
+    for i in range(10):
+        history.add_calculation('+', i, 1, i + 1)
+    history.add_calculations('/', [8, 6], [2, 3], [4, 2])
+
+    lazy = CalculationHistory(path, tail_rows=3)
+    assert len(lazy._buffer) == 3
+    assert list(lazy.get_history(5)['x']) == [7, 8, 9, 8, 6]
+    assert len(lazy._buffer) == 3
+    stats = lazy.get_statistics()
+    assert stats == history.get_statistics()
+    assert lazy._unloaded_end is not None
+    assert list(lazy.history['x']) == list(range(10)) + [8, 6]
+    assert lazy.get_statistics() == stats
+
+    lazy.clear_history()
+    assert CalculationHistory(path).get_statistics()['total_calculations'] == 0
+
+def test_binary_history_rejects_long_operation_names(tmp_path):
+    """Test records the binary format cannot store never reach memory or statistics."""
+    history = CalculationHistory(str(tmp_path / "history.bin"), durability='on-exit')
+    history.add_calculation('+', 1, 2, 3)
+    with pytest.raises(ValueError):
+        history.add_calculation('hypotenuse', 3, 4, 5)
+    with pytest.raises(ValueError):
+        history.add_calculations(['+', 'hypotenuse'], [1, 3], [1, 4], [2, 5])
+    with pytest.raises(ValueError):
+        history.add_calculations('hypotenuse', [3], [4], [5])
+    assert list(history.history['operation']) == ['+']
+    assert history.get_statistics()['total_calculations'] == 1
+    jsonl_path = str(tmp_path / "import.jsonl")
+    with open(jsonl_path, 'w') as f:
+        f.write('{"timestamp": "2024-01-01 00:00:00", "operation": "hypotenuse", '
+                '"x": 3.0, "y": 4.0, "result": 5.0}\n')
+    with pytest.raises(ValueError, match="hypotenuse"):
+        history.import_history(jsonl_path)
+    assert len(history.history) == 1
+    assert history.get_statistics()['operations_count'] == {'+': 1}
+    history.close()
+    assert len(CalculationHistory(history.history_file).history) == 1
+
+def test_segmented_rotation_and_view(tmp_path):
+    """Test segments rotate by size and time and read back as one file."""
+    storage = SegmentedHistoryFile(str(tmp_path / "h.d"), segment_rows=4)
+    storage.append(_block(6))
+    storage.append(_block(5, start=6))
+    assert [segment.end() for segment in storage.segments()] == [4, 4, 3]
+    assert storage.end() == 11
+    assert list(storage.view(3, 9).x) == [3, 4, 5, 6, 7, 8]
+    assert list(storage.read(11).labels())[:3] == ['/', '+', '/']
+    assert [offset for offset, _ in storage.scan(2, since=5, until=7)] == [4, 6]
+
+    timed = SegmentedHistoryFile(str(tmp_path / "t.d"), segment_rows=100, segment_seconds=1e-8)
+    timed.append(_block(25))
+    assert [segment.end() for segment in timed.segments()] == [10, 10, 5]
+
+    storage.clear()
+    assert storage.end() == 0 and not storage.segments()
+
+def test_segmented_compact(tmp_path):
+    """Test compaction merges sealed segments and downsamples them."""
+    storage = SegmentedHistoryFile(str(tmp_path / "h.d"), segment_rows=4)
+    for start in range(0, 12, 2):
+        storage.segment_rows = 2
+        storage.append(_block(2, start=start))
+    storage.segment_rows = 4
+    assert len(storage.segments()) == 6
+    assert storage.compact() == 0
+    assert [segment.end() for segment in storage.segments()] == [4, 4, 2, 2]
+    assert list(storage.read(12).x) == list(range(12))
+    assert storage.compact(downsample=2) == 5
+    assert [segment.end() for segment in storage.segments()] == [4, 1, 2]
+    assert list(storage.read(storage.end()).x) == [0, 2, 4, 6, 8, 10, 11]
+    with pytest.raises(ValueError):
+        storage.compact(downsample=0)
+
+def test_segmented_history(tmp_path):
+    """Test CalculationHistory keeps bounded memory over segmented history."""
+    path = str(tmp_path / "history.d")
+    history = CalculationHistory(path, max_records=5)
+    history._storage.segment_rows = 4
+    for i in range(10):
+        history.add_calculation('+', i, 1, i + 1)
+    history.add_calculations('/', [8, 6], [2, 3], [4, 2])
+    assert len(history._buffer) == 5
+    assert len(history._storage.segments()) == 3
+    recent = history.get_history(8)
+    assert list(recent['x']) == [4, 5, 6, 7, 8, 9, 8, 6]
+    assert list(recent.index) == list(range(4, 12))
+    matches = history.query(conditions=[('x', '<', 3)])
+    assert list(matches['x']) == [0, 1, 2]
+    assert list(history.query('/', limit=1).index) == [11]
+
+    reopened = CalculationHistory(path, max_records=5, tail_rows=3)
+    stats = reopened.get_statistics()
+    assert stats['total_calculations'] == 12
+    assert stats['operations_count'] == {'+': 10, '/': 2}
+    full = reopened.history
+    assert list(full['x']) == list(range(10)) + [8, 6]
+    assert list(full.index) == list(range(12))
+    assert len(reopened._buffer) == 5
+    assert reopened.get_history().equals(reopened.get_history(120))
+    assert list(reopened.query('+', since=None, limit=2)['x']) == [8, 9]
+    assert reopened.get_statistics() == stats
+
+    reopened._storage.segment_rows = 4
+    assert reopened.compact(downsample=2) == 4
+    assert reopened.get_statistics()['total_calculations'] == 8
+    with pytest.raises(ValueError):
+        CalculationHistory(str(tmp_path / "history.bin")).compact(downsample=2)
+    reopened.clear_history()
+    assert not reopened._storage.segments()
+
+def _write_shard(path, worker, count):
+    """Record calculations from another process into sharded history."""
+    history = CalculationHistory(path, sharded=True, durability='batched', batch_size=7)
+    for i in range(count):
+        history.add_calculation('+', worker, i, worker + i)
+    history.close()
+
+def test_merge_blocks():
+    """Test the k-way merge orders records from differently chunked streams."""
+    streams = [[_block(3, 0), _block(3, 9)], [_block(1, 2), _block(4, 4), _block(2, 20)], []]
+    merged = list(merge_blocks(streams))
+    timestamps = np.concatenate([block.timestamp for block in merged])
+    assert list(timestamps) == [0, 1, 2, 2, 4, 5, 6, 7, 9, 10, 11, 20, 21]
+    assert all(block.size for block in merged)
+
+@pytest.mark.parametrize('name', ['h.csv', 'h.bin'])
+def test_sharded_history_processes(tmp_path, name):
+    """Test processes sharing a history lose nothing and compaction folds their shards."""
+    path = str(tmp_path / name)
+    CalculationHistory(path).add_calculations('-', [0, 0], [0, 0], [0, 0])
+    reader = CalculationHistory(path, sharded=True, tail_rows=5)
+    reader.add_calculation('*', 1, 1, 1)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_write_shard, args=(path, worker, 40)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    storage = reader._storage
+    assert len(storage.shard_paths()) == 5
+    assert reader.get_statistics()['operations_count'] == {'-': 2, '*': 1, '+': 160}
+    frame = reader.history
+    assert len(frame) == 163 and frame['timestamp'].is_monotonic_increasing
+    assert len(reader.get_history(limit=10)) == 10
+    
+    assert storage.compact() == 4
+    assert len(storage.shard_paths()) == 1
+    assert len(CalculationHistory(path).history) == 162
+    reader.add_calculation('/', 4, 2, 2)
+    assert reader.compact() == 0 and storage.shard_paths() == []
+    merged = CalculationHistory(path).history
+    assert len(merged) == 164 and merged['timestamp'].is_monotonic_increasing
+    reader.close()
+
+def test_sharded_history_options(tmp_path):
+    """Test sharded history rejects segmented storage and full rewrites."""
+    with pytest.raises(ValueError):
+        ShardedHistoryFile(str(tmp_path / "h.d"))
+    with pytest.raises(ValueError):
+        CalculationHistory(str(tmp_path / "h.csv"), sharded=True, append_only=False)
+    history = CalculationHistory(str(tmp_path / "h.csv"), sharded=True)
+    history.add_calculation('+', 1, 2, 3)
+    history.clear_history()
+    assert len(history.history) == 0 and history._storage.shard_paths() == []
+
+def test_sharded_rewrite_with_live_writer(tmp_path):
+    """Test sharded history is not cleared while another writer holds its shard."""
+    path = str(tmp_path / "h.csv")
+    history = CalculationHistory(path, sharded=True)
+    history.add_calculation('+', 1, 2, 3)
+    writer = CalculationHistory(path, sharded=True)
+    writer.add_calculation('*', 2, 3, 6)
+    writer._writer.flush()
+    with pytest.raises(ValueError):
+        history.clear_history()
+    with pytest.raises(ValueError, match="still being written"):
+        history._storage.rewrite(_block(1))
+    assert len(history.history) == 2 and len(history._storage.shard_paths()) == 2
+    writer.close()
+    history.clear_history()
+    assert len(history.history) == 0 and history._storage.shard_paths() == []
+    history.close()
+
+def test_sharded_background_compaction(tmp_path):
+    """Test the background thread folds the shards of closed writers."""
+    import time
+    path = str(tmp_path / "h.csv")
+    reader = CalculationHistory(path, sharded=True, compact_interval=0.02)
+    writer = CalculationHistory(path, sharded=True)
+    writer.add_calculation('+', 1, 2, 3)
+    time.sleep(0.1)
+    assert len(reader._storage.shard_paths()) == 1
+    writer.close()
+    for _ in range(100):
+        if not reader._storage.shard_paths():
+            break
+        time.sleep(0.02)
+    assert reader._storage.shard_paths() == []
+    assert len(CalculationHistory(path).history) == 1
+    assert len(reader.history) == 1
+    reader.close()
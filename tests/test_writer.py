@@ -0,0 +1,93 @@
+"""Test suite for write-behind history persistence."""
+
+import os
+import time
+import pytest
+from calculator.history import CalculationHistory
+from calculator.writer import WriteBehindWriter
+
+@pytest.fixture
+def history_file():
+    """Fixture providing a history file path that is removed afterwards."""
+    yield "test_writer_history.csv"
+    if os.path.exists("test_writer_history.csv"):
+        os.remove("test_writer_history.csv")
+
+def test_invalid_durability():
+    """Test unknown durability levels are rejected."""
+    with pytest.raises(ValueError):
+        WriteBehindWriter(lambda batch: None, durability='never')
+
+def test_sync_writes_immediately():
+    """Test sync durability writes each record on submit."""
+    batches = []
+    writer = WriteBehindWriter(batches.append, durability='sync')
+    writer.submit(1)
+    writer.submit(2)
+    assert batches == [[1], [2]]
+
+def test_batched_flushes_full_batches():
+    """Test batched durability writes once the batch size is reached."""
+    batches = []
+    writer = WriteBehindWriter(batches.append, durability='batched',
+                               batch_size=3, flush_interval=60)
+    for i in range(3):
+        writer.submit(i)
+    deadline = time.time() + 5
+    while not batches and time.time() < deadline:
+        time.sleep(0.01)
+    assert batches == [[0, 1, 2]]
+    writer.close()
+
+def test_on_exit_writes_on_close():
+    """Test on-exit durability only writes when closed."""
+    batches = []
+    writer = WriteBehindWriter(batches.append, durability='on-exit')
+    writer.submit(1)
+    writer.submit(2)
+    assert batches == []
+    assert writer.pending == 2
+    writer.close()
+    assert batches == [[1, 2]]
+
+def test_failed_batches_are_set_aside():
+    """Test a failing write is reported to the caller and not retried."""
+    attempts = []
+
+    def fail(batch):
+        attempts.append(batch)
+        raise OSError("disk full")
+
+    writer = WriteBehindWriter(fail, durability='batched', batch_size=2, flush_interval=60)
+    writer.submit(1)
+    writer.submit(2)
+    deadline = time.time() + 5
+    while not writer.failed and time.time() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(OSError):
+        writer.flush()
+    writer.submit(3)
+    with pytest.raises(OSError):
+        writer.close()
+    assert attempts == [[1, 2], [3]]
+    assert writer.failed == [1, 2, 3] and writer.pending == 0
+    writer.flush()
+
+def test_history_close_persists_buffered_records(history_file):
+    """Test buffered history records reach the file on close."""
+    history = CalculationHistory(history_file, durability='on-exit')
+    history.add_calculation('+', 2, 3, 5)
+    history.add_calculation('*', 2, 3, 6)
+    assert not os.path.exists(history_file)
+    history.close()
+
+    reloaded = CalculationHistory(history_file)
+    assert list(reloaded.history['result']) == [5, 6]
+
+def test_clear_discards_buffered_records(history_file):
+    """Test clearing history drops records that were not written yet."""
+    history = CalculationHistory(history_file, durability='on-exit')
+    history.add_calculation('+', 2, 3, 5)
+    history.clear_history()
+    history.close()
+    assert len(CalculationHistory(history_file).history) == 0